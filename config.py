@@ -16,6 +16,12 @@ AUTHORIZED_USER_IDS = [GANTI_DENGAN_USER_ID_ANDA]
 # Masukkan nilai yang Anda dapat dari my.telegram.org
 API_ID = 12345678 # GANTI DENGAN API_ID ANDA (harus integer, bukan string)
 API_HASH = "GANTI_DENGAN_API_HASH_ANDA"
+TELETHON_SESSION = "telegram_user_session"   # Nama file sesi (.session)
+UPLOAD_CONCURRENCY = 2                       # Batas upload bersamaan lewat client Telethon
+UPLOAD_CONNECTIONS = 4                       # Koneksi paralel per upload file besar (1 = nonaktif)
+PARALLEL_UPLOAD_THRESHOLD = 20 * 1024 * 1024 # File sebesar ini ke atas diunggah paralel
+UPLOAD_READ_AHEAD = 8                        # Jumlah part (512 KB) yang dibaca di depan
+TELEGRAM_MAX_FILE_SIZE = 2000 * 1024 * 1024  # Batas file Telegram (akun Premium: 4000 MB); file lebih besar dipecah
 
 # --- URL DASAR UNTUK SUMBER BUILD ---
 OPENWRT_DOWNLOAD_URL = "https://downloads.openwrt.org"
@@ -50,8 +56,60 @@ DEFAULT_CONFIGS = {
 }
 
 # --- Pengaturan Lainnya ---
+# Penjadwal edit pesan: jarak minimum antar edit untuk satu pesan, dan jeda
+# global antar panggilan edit ke API Telegram (detik).
+EDIT_MIN_INTERVAL = 3.0
+EDIT_GLOBAL_INTERVAL = 0.05
+# Jumlah build yang boleh berjalan bersamaan. Build ke Image Builder yang sama
+# tetap dijalankan bergantian.
+MAX_CONCURRENT_BUILDS = 2
+# Jumlah koneksi paralel (range request) saat mengunduh Image Builder.
+DOWNLOAD_SEGMENTS = 4
+# Jika True, Image Builder dialirkan langsung ke xz/zstd -T0 lalu tar tanpa
+# menyimpan arsip ke disk. Jatuh kembali ke unduh+ekstrak biasa bila gagal.
+IB_STREAM_EXTRACT = True
+# Cache metadata rilis (daftar versi/target/subtarget/Image Builder) di disk.
+# TTL per jenis dalam detik; entri basi tetap dipakai sambil diperbarui di latar belakang.
+METADATA_CACHE_DIR = "cache/metadata"
+METADATA_CACHE_TTL = {
+    "versions": 6 * 3600,
+    "targets": 24 * 3600,
+    "subtargets": 24 * 3600,
+    "imagebuilder": 6 * 3600,
+    "sha256sums": 6 * 3600,
+    "profiles": 24 * 3600,
+}
+# Indeks ringkas per rilis (semua target/subtarget -> URL, ukuran, sha256 Image Builder)
+# yang di-crawl di latar belakang saat versi dipilih.
+RELEASE_INDEX_DIR = "cache/release_index"
+RELEASE_INDEX_TTL = 24 * 3600
+RELEASE_INDEX_CONCURRENCY = 8    # Jumlah request paralel saat crawl
+# Indeks profil perangkat per direktori Image Builder (pengganti `make info` tiap kali).
+PROFILE_INDEX_DIR = "cache/profiles"
+# Proxy/mirror lokal untuk feed paket opkg. repositories.conf Image Builder diarahkan ke sini;
+# indeks Packages di-cache dengan TTL, file .ipk disimpan berdasarkan sha256 dengan kuota (LRU).
+FEED_PROXY_ENABLED = True
+FEED_PROXY_HOST = "127.0.0.1"
+FEED_PROXY_PORT = 8790
+FEED_CACHE_DIR = "cache/feeds"
+FEED_INDEX_TTL = 6 * 3600
+FEED_CACHE_QUOTA = 4 * 1024 * 1024 * 1024   # 4 GB
+# Sebelum `make image`, dependensi paket diunduh paralel ke cache opkg Image Builder (dl/).
+PACKAGE_PREFETCH = True
+PREFETCH_CONCURRENCY = 8
+# Database paket (nama/provides/depends) dari indeks feed, untuk validasi CUSTOM_PACKAGES sebelum build.
+PACKAGE_DB_PATH = "cache/packages.db"
+PACKAGE_DB_TTL = 6 * 3600
+# Jumlah thread untuk meng-hash (sha256) artefak build secara paralel.
+HASH_WORKERS = 4
+
 BUILD_LOG_PATH = "build.log"
-HISTORY_DB_PATH = "history.json"
+BUILD_LOG_DIR = "logs"
+BUILD_LOG_COMPRESS = True        # Log per-build disimpan sebagai .log.zst
+BUILD_LOG_RETENTION_DAYS = 30    # Log yang lebih tua dari ini dihapus otomatis
+BUILD_LOG_MAX_FILES = 100        # Batas jumlah file log yang disimpan
+HISTORY_DB_PATH = "history.db"          # Histori build (SQLite, mode WAL)
+HISTORY_JSON_PATH = "history.json"      # Format lama, dimigrasikan otomatis sekali
 TEMP_MESSAGE_DURATION = 15
 CONFIRMATION_PHRASE = "hapus semua data build saya"
 
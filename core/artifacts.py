@@ -0,0 +1,68 @@
+# core/artifacts.py
+
+import logging
+import os
+
+from .checksum import parse_sha256sums
+
+logger = logging.getLogger(__name__)
+
+FIRMWARE_EXTENSIONS = (".img.gz", ".img", ".bin", ".trx", ".vdi", ".vmdk", ".qcow2")
+# Toleransi mtime terhadap waktu mulai job (resolusi timestamp filesystem).
+MTIME_SLACK = 2.0
+
+
+def _scan_files(path: str, depth: int = 0):
+    """os.scandir hingga `depth` tingkat subdirektori; tidak pernah menyentuh bagian lain pohon build."""
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(): yield entry
+                elif depth > 0 and entry.is_dir(follow_symlinks=False): yield from _scan_files(entry.path, depth - 1)
+    except FileNotFoundError:
+        return
+
+
+def _read_manifest(path: str) -> dict:
+    """File `.manifest` Image Builder (`paket - versi` per baris) -> {paket: versi}."""
+    packages = {}
+    with open(path, 'r', errors='ignore') as f:
+        for line in f:
+            name, sep, version = line.strip().partition(" - ")
+            if sep: packages[name] = version
+    return packages
+
+
+def output_dirs(build_dir: str, mode: str, config: dict):
+    """Lokasi keluaran yang diketahui: bin/targets/<target>/<subtarget> untuk IB, `out/` untuk Amlogic."""
+    if mode != 'official': return [(build_dir, 1)]
+    targets_dir = os.path.join(build_dir, "bin", "targets")
+    exact = os.path.join(targets_dir, config.get("TARGET", ""), config.get("SUBTARGET", ""))
+    if config.get("TARGET") and os.path.isdir(exact): return [(exact, 0)]
+    return [(targets_dir, 2)]
+
+
+def collect_artifacts(build_dir: str, mode: str, config: dict, since: float = None) -> dict:
+    """
+    Mengumpulkan artefak build hanya dari direktori keluaran yang diketahui. File yang lebih
+    tua dari `since` (sisa build sebelumnya) dilewati. Mengembalikan
+    {files, manifest: {paket: versi}, sha256sums: {nama_file: hash}}.
+    """
+    files, manifest, checksums, stale = [], {}, {}, 0
+    for path, depth in output_dirs(build_dir, mode, config):
+        for entry in _scan_files(path, depth):
+            fresh = since is None or entry.stat().st_mtime >= since - MTIME_SLACK
+            if entry.name.endswith(FIRMWARE_EXTENSIONS):
+                if fresh: files.append(entry.path)
+                else: stale += 1
+            elif not fresh: continue
+            elif entry.name.endswith(".manifest"):
+                try: manifest.update(_read_manifest(entry.path))
+                except IOError as e: logger.warning(f"Gagal membaca manifest {entry.path}: {e}")
+            elif entry.name == "sha256sums":
+                try:
+                    with open(entry.path, 'r', errors='ignore') as f: checksums.update(parse_sha256sums(f.read()))
+                except IOError as e: logger.warning(f"Gagal membaca {entry.path}: {e}")
+    if stale: logger.info(f"{stale} file firmware lama di {build_dir} dilewati (lebih tua dari awal job).")
+    names = {os.path.basename(f) for f in files}
+    return {"files": sorted(files), "manifest": manifest, "sha256sums": {n: h for n, h in checksums.items() if n in names}}
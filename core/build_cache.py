@@ -0,0 +1,100 @@
+# core/build_cache.py
+
+import hashlib
+import json
+import os
+
+from .checksum import sha256_file
+
+# Daftar .ipk bawaan Image Builder, ditulis tepat setelah ekstraksi (lihat record_stock_packages).
+STOCK_IPK_FILE = ".stock-ipk.json"
+
+# Kunci konfigurasi yang memengaruhi hasil build, per mode.
+_OFFICIAL_KEYS = ("BUILD_SOURCE", "VERSION", "TARGET", "SUBTARGET", "DEVICE_PROFILE", "ROOTFS_SIZE")
+_AMLOGIC_KEYS = ("ROOTFS_URL", "BOARD", "ROOTFS_SIZE", "KERNEL_VERSION", "KERNEL_TAG", "KERNEL_AUTO_UPDATE", "BUILDER_NAME")
+
+
+def _tree_files(root: str, suffix: str = ""):
+    """Path relatif semua file di bawah `root` yang berakhiran `suffix` (kosong bila direktori tidak ada)."""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(suffix): yield os.path.relpath(os.path.join(dirpath, name), root)
+
+
+def _tree_digests(root: str, suffix: str = "", skip=()) -> dict:
+    """{path relatif: sha256} untuk semua file di bawah `root` kecuali yang ada di `skip`."""
+    return {rel: sha256_file(os.path.join(root, rel)) for rel in _tree_files(root, suffix) if rel not in skip}
+
+
+def package_files(ib_dir: str) -> set:
+    """Semua .ipk di `packages/` Image Builder (path relatif)."""
+    return set(_tree_files(os.path.join(ib_dir, "packages"), ".ipk"))
+
+
+def record_stock_packages(ib_dir: str, preexisting=()):
+    """
+    Mencatat .ipk bawaan Image Builder tepat setelah ekstraksi. File yang sudah ada sebelum
+    ekstraksi (unggahan /upload_ipk ke direktori yang belum diekstrak) tidak dihitung bawaan.
+    """
+    stock = sorted(package_files(ib_dir) - set(preexisting))
+    with open(os.path.join(ib_dir, STOCK_IPK_FILE), 'w') as f: json.dump(stock, f)
+
+
+def _stock_packages(ib_dir: str) -> set:
+    path = os.path.join(ib_dir, STOCK_IPK_FILE)
+    if not os.path.exists(path): return set()  # IB lama tanpa catatan: semua .ipk ikut di-hash
+    try:
+        with open(path, 'r') as f: return set(json.load(f))
+    except (json.JSONDecodeError, IOError): return set()
+
+
+def is_cacheable(config: dict, mode: str) -> bool:
+    """
+    False bila input yang sama bisa menghasilkan image berbeda: Amlogic dengan kernel auto-update
+    atau RootFS dari URL "latest" (isinya berganti tanpa URL berubah).
+    """
+    if mode == 'official': return True
+    if config.get("KERNEL_AUTO_UPDATE"): return False
+    return bool(config.get("local_rootfs_path")) or "latest" not in str(config.get("ROOTFS_URL") or "").lower()
+
+
+def _file_stat(path: str):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def build_fingerprint(config: dict, mode: str, ib_dir: str = None) -> str:
+    """
+    sha256 dari bentuk kanonik semua input build: konfigurasi yang relevan, daftar paket
+    (urutan diabaikan), custom repo untuk arsitektur ini, serta isi .ipk tambahan pengguna
+    (bukan bawaan IB) dan `files/` (skrip uci-defaults) di direktori Image Builder.
+    Dipanggil setelah Image Builder siap agar hasilnya sama untuk IB baru maupun lama.
+    None bila build tidak boleh di-cache (lihat is_cacheable).
+    """
+    if not is_cacheable(config, mode): return None
+    if mode == 'official':
+        inputs = {k: str(config.get(k) or "").strip() for k in _OFFICIAL_KEYS}
+        inputs["packages"] = sorted(set(str(config.get("CUSTOM_PACKAGES") or "").split()))
+        arch_key = f"{config.get('BUILD_SOURCE', 'openwrt')}_{config.get('TARGET')}_{config.get('SUBTARGET') or 'default'}"
+        inputs["repos"] = [r.strip() for r in config.get("CUSTOM_REPOS", {}).get(arch_key, "").splitlines() if r.strip()]
+        if ib_dir:
+            inputs["ib"] = os.path.basename(os.path.normpath(ib_dir))
+            inputs["ipk"] = _tree_digests(os.path.join(ib_dir, "packages"), ".ipk", skip=_stock_packages(ib_dir))
+            inputs["files"] = _tree_digests(os.path.join(ib_dir, "files"))
+    else:
+        inputs = {k: str(config.get(k) if config.get(k) is not None else "").strip() for k in _AMLOGIC_KEYS}
+        local_rootfs = config.get("local_rootfs_path")
+        if local_rootfs:
+            # RootFS lokal bisa ratusan MB; identitas nama+ukuran+mtime sudah cukup membedakan
+            inputs["local_rootfs"] = [os.path.basename(local_rootfs)] + (_file_stat(local_rootfs) if os.path.exists(local_rootfs) else [])
+    canonical = json.dumps({"mode": mode, "inputs": inputs}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def snapshot_files(paths) -> dict:
+    """{path: [ukuran, mtime_ns]} untuk memastikan artefak ter-cache belum ditimpa build lain."""
+    return {p: _file_stat(p) for p in paths if os.path.exists(p)}
+
+
+def files_unchanged(snapshot: dict) -> bool:
+    return bool(snapshot) and all(os.path.exists(p) and _file_stat(p) == sig for p, sig in snapshot.items())
@@ -4,18 +4,28 @@ import os
 import asyncio
 import logging
 import time
-import glob
 import re
 import shutil
+import uuid
+import httpx
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from telegram.error import RetryAfter, BadRequest
+from telegram.error import BadRequest, TelegramError
 
 import config
-from config import OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL, AML_BUILD_SCRIPT_DIR, AML_BUILD_SCRIPT_REPO, BUILD_LOG_PATH
-from .openwrt_api import find_imagebuilder_url_and_name, get_device_profiles
-from .uploader import upload_file_for_forwarding
-from .history_manager import add_build_entry
+from config import OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL, AML_BUILD_SCRIPT_DIR, AML_BUILD_SCRIPT_REPO, BUILD_LOG_DIR, BUILD_LOG_COMPRESS, IB_STREAM_EXTRACT, PACKAGE_PREFETCH
+from .openwrt_api import find_imagebuilder_url_and_name, get_device_profiles, get_target_profiles, fetch_sha256sums
+from .downloader import download_file, stream_extract, DownloadError
+from .log_capture import LogCapture, prune_build_logs
+from .edit_scheduler import edit_scheduler
+from .uploader import upload_file_for_forwarding, uploader_service, resolve_destination
+from .history_manager import record_build_log, add_build_entry, history_repo, update_build_entry, get_upload_ref, save_upload_ref, drop_upload_ref, get_cached_build, save_cached_build, drop_cached_build
+from .checksum import sha256_file_async, fingerprint_files, verify_sha256sums
+from .artifacts import collect_artifacts
+from .feed_proxy import feed_proxy
+from .package_feeds import prefetch_packages
+from .profile_index import get_profile_index
+from .build_cache import build_fingerprint, snapshot_files, files_unchanged, package_files, record_stock_packages
 from handlers.utils import send_temporary_message
 
 logger = logging.getLogger(__name__)
@@ -24,47 +34,170 @@ LOG_UPDATE_INTERVAL = 3.0
 NO_OUTPUT_TIMEOUT = 900
 FILES_PER_PAGE = 5
 
-class BuildManager:
-    def __init__(self):
-        self.status = "Idle"
+FINAL_STATUSES = ("Success", "Failed", "Cancelled", "Awaiting Profile")
+
+class BuildJob:
+    """Satu permintaan build di dalam antrean BuildManager."""
+    def __init__(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, build_config: dict, mode: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.context = context
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.config = build_config
+        self.mode = mode
+        self.status = "Queued"
         self.process = None
-        self.is_starting_build = False
-    
-    async def cancel_current_build(self):
-        if self.process and self.status == "Building...":
+        self.task = None  # Task run_build_task, dibatalkan oleh cancel_job selama persiapan
+        self.log = None
+        self.log_path = os.path.join(BUILD_LOG_DIR, f"build-{self.id}.log")
+        self.created_at = time.time()
+        self.started_at = None
+        self.make_started_at = None  # Tepat sebelum make/remake dijalankan (setelah lock direktori didapat)
+        self.finished_at = None
+        self.fingerprint = None
+
+    @property
+    def is_active(self):
+        return self.status not in FINAL_STATUSES
+
+    def describe(self):
+        if self.mode == 'official': detail = self.config.get('DEVICE_PROFILE') or 'N/A'
+        else: detail = self.config.get('BOARD') or 'N/A'
+        return f"{self.mode.title()} ({detail})"
+
+class BuildManager:
+    def __init__(self, max_workers: int = config.MAX_CONCURRENT_BUILDS):
+        self.max_workers = max(1, int(max_workers))
+        self.jobs = {}
+        self.queue = None
+        self.workers = []
+        self._dir_locks = {}
+        self._inflight = {}
+
+    # --- Antrean & Worker ---
+
+    def _ensure_workers(self):
+        if self.queue is None: self.queue = asyncio.Queue()
+        self.workers = [w for w in self.workers if not w.done()]
+        while len(self.workers) < self.max_workers:
+            self.workers.append(asyncio.create_task(self._worker(len(self.workers) + 1)))
+
+    async def _worker(self, worker_no: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status != "Queued": continue  # Dibatalkan saat masih di antrean
+                logger.info(f"Worker #{worker_no} mengambil job {job.id} ({job.describe()}).")
+                job.task = asyncio.create_task(self.run_build_task(job))
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    if job.status != "Cancelled": raise  # Worker sendiri yang dihentikan
+            except Exception as e:
+                logger.error(f"Worker #{worker_no} gagal menjalankan job {job.id}: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def submit_build(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, build_config: dict, mode: str) -> BuildJob:
+        """Memasukkan build ke antrean dan mengembalikan objek job-nya."""
+        self._ensure_workers()
+        job = BuildJob(context, chat_id, user_id, dict(build_config), mode)
+        self.jobs[job.id] = job
+        self.queue.put_nowait(job)
+        self._prune_finished_jobs()
+        logger.info(f"Job {job.id} ({job.describe()}) masuk antrean, posisi {self.queue_position(job.id)}.")
+        return job
+
+    def _prune_finished_jobs(self, keep: int = 20):
+        finished = sorted((j for j in self.jobs.values() if not j.is_active), key=lambda j: j.created_at)
+        for job in finished[:-keep] if len(finished) > keep else []:
+            self.jobs.pop(job.id, None)
+
+    def _dir_lock(self, path: str) -> asyncio.Lock:
+        """Satu direktori kerja (IB / skrip Amlogic) hanya boleh dipakai satu job sekaligus."""
+        key = os.path.abspath(path)
+        if key not in self._dir_locks: self._dir_locks[key] = asyncio.Lock()
+        return self._dir_locks[key]
+
+    def get_job(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def active_jobs(self, chat_id: int = None):
+        jobs = [j for j in self.jobs.values() if j.is_active and (chat_id is None or j.chat_id == chat_id)]
+        return sorted(jobs, key=lambda j: j.created_at)
+
+    def queued_jobs(self):
+        return sorted((j for j in self.jobs.values() if j.status == "Queued"), key=lambda j: j.created_at)
+
+    def queue_position(self, job_id: str):
+        """Posisi job di antrean (1 = berikutnya), atau None jika tidak sedang antre."""
+        for i, job in enumerate(self.queued_jobs()):
+            if job.id == job_id: return i + 1
+        return None
+
+    def latest_job(self, chat_id: int = None):
+        jobs = [j for j in self.jobs.values() if chat_id is None or j.chat_id == chat_id]
+        return max(jobs, key=lambda j: j.created_at) if jobs else None
+
+    def is_building(self):
+        return any(j.status == "Building..." for j in self.jobs.values())
+
+    async def cancel_job(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if not job or not job.is_active: return False
+        if job.status == "Queued":
+            job.status = "Cancelled"; job.finished_at = time.time()
+            logger.info(f"Job {job.id} dibatalkan saat masih di antrean.")
+            return True
+        running_process = job.process and job.process.returncode is None
+        job.status = "Cancelled"; job.finished_at = time.time()
+        if running_process:
             try:
-                self.process.terminate()
-                await self.process.wait()
-                self.status = "Cancelled"
-                self.process = None
-                return True
+                job.process.terminate()
+                await job.process.wait()
             except ProcessLookupError:
-                self.process = None
-                self.status = "Idle"
-                return False
-        return False
+                pass
+        elif job.task and not job.task.done():
+            # Masih mengunduh / menyiapkan IB: hentikan pekerjaannya, bukan hanya mengganti status
+            job.task.cancel()
+        return True
 
-    async def run_build_task(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, build_config: dict, mode: str):
-        self.status = f"Preparing {mode} build..."
-        status_message = await context.bot.send_message(chat_id, f"⏳ Mempersiapkan build mode: {mode.title()}...")
+    async def run_build_task(self, job: BuildJob):
+        context, chat_id, mode = job.context, job.chat_id, job.mode
+        job.status = f"Preparing {mode} build..."; job.started_at = time.time()
+        status_message = None
         try:
+            status_message = await context.bot.send_message(chat_id, f"⏳ [`{job.id}`] Mempersiapkan build mode: {mode.title()}...", parse_mode='Markdown')
             if mode == 'official':
-                await self._run_official_build(context, chat_id, build_config, status_message)
+                await self._run_official_build(job, status_message)
             elif mode == 'amlogic':
-                await self._run_amlogic_remake(context, chat_id, build_config, status_message)
+                await self._run_amlogic_remake(job, status_message)
             else:
                 raise ValueError(f"Mode build tidak dikenal: {mode}")
         except Exception as e:
-            logger.error(f"Terjadi error tak terduga dalam run_build_task (mode: {mode}): {e}", exc_info=True)
+            if job.status == "Cancelled":
+                logger.info(f"Job {job.id} berhenti karena dibatalkan.")
+            else:
+                logger.error(f"Terjadi error tak terduga dalam run_build_task (job: {job.id}, mode: {mode}): {e}", exc_info=True)
+                if status_message:
+                    edit_scheduler.discard(status_message)
+                    try: await status_message.delete()
+                    except: pass
+                await send_temporary_message(context, chat_id, f"❌ [{job.id}] Terjadi error kritis pada proses build: {e}")
+                job.status = "Failed"
+        except asyncio.CancelledError:
+            if job.status != "Cancelled": raise
+            logger.info(f"Job {job.id} dihentikan saat persiapan karena dibatalkan.")
             if status_message:
-                try: await status_message.delete()
-                except: pass
-            await send_temporary_message(context, chat_id, f"❌ Terjadi error kritis pada proses build: {e}")
-            self.status = "Failed"
+                try: await edit_scheduler.edit_now(status_message, f"🛑 Build `{job.id}` dibatalkan.", parse_mode='Markdown')
+                except TelegramError: pass
         finally:
-            logger.info(f"Build task selesai dengan status akhir: {self.status}")
-            if self.status not in ["Success", "Failed", "Cancelled", "Awaiting Profile"]:
-                self.status = "Idle"
+            job.process = None; job.finished_at = time.time()
+            if job.status not in FINAL_STATUSES:
+                job.status = "Failed"
+            if job.log_path and os.path.exists(job.log_path):
+                await asyncio.to_thread(record_build_log, job.id, job.chat_id, job.status, job.log_path)
+            logger.info(f"Build job {job.id} selesai dengan status akhir: {job.status}")
 
     async def _apply_customizations(self, ib_dir: str, config: dict, context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         source = config.get('BUILD_SOURCE', 'openwrt')
@@ -79,13 +212,18 @@ class BuildManager:
         if not os.path.exists(template_repo_conf_path):
             logger.warning("File template repositories.conf tidak ditemukan, tidak bisa menerapkan kustomisasi.")
             return
-        with open(template_repo_conf_path, 'r') as f_template:
+        # Kustomisasi selalu dibangun dari salinan asli agar repo/proxy tidak menumpuk antar build
+        pristine_repo_conf_path = template_repo_conf_path + ".orig"
+        if not os.path.exists(pristine_repo_conf_path): shutil.copyfile(template_repo_conf_path, pristine_repo_conf_path)
+        with open(pristine_repo_conf_path, 'r') as f_template:
             content = f_template.read()
-        original_content = content; modified_content = content
+        with open(template_repo_conf_path, 'r') as f_current:
+            original_content = f_current.read()
+        modified_content = content
         if custom_repos_for_arch:
             modified_content += "\n# --- Custom Repositories by Bot ---\n"
             package_arch = "all"
-            match = re.search(r'packages/([\w.-]+)/base', original_content)
+            match = re.search(r'packages/([\w.-]+)/base', content)
             if match: package_arch = match.group(1); logger.info(f"Arsitektur paket terdeteksi: {package_arch}")
             else:
                 package_arch = f"{target}/{subtarget}" if subtarget else target
@@ -96,6 +234,7 @@ class BuildManager:
                     repo_name = f"custom_repo_{i+1}"
                     modified_content += f"src/gz {repo_name} {repo_url_final}\n"
             modified_content = re.sub(r"^\s*option\s+check_signature.*$", "# option check_signature", modified_content, flags=re.MULTILINE)
+        modified_content = feed_proxy.rewrite_repositories(modified_content)
         if modified_content != original_content:
             try:
                 # Membuat backup sebelum menimpa
@@ -103,7 +242,7 @@ class BuildManager:
                 with open(template_repo_conf_path, "w") as f_final:
                     f_final.write(modified_content)
                 logger.info(f"File {template_repo_conf_path} berhasil dimodifikasi secara langsung.")
-                await send_temporary_message(context, chat_id, "ℹ️ Info: Custom repo diterapkan pada repositories.conf.")
+                if custom_repos_for_arch: await send_temporary_message(context, chat_id, "ℹ️ Info: Custom repo diterapkan pada repositories.conf.")
             except Exception as e:
                 logger.error(f"Gagal memodifikasi repositories.conf: {e}")
                 await send_temporary_message(context, chat_id, "❌ Gagal menerapkan custom repo.")
@@ -129,37 +268,180 @@ class BuildManager:
             logger.error(f"Gagal update .config rootfs: {e}")
             return False
 
-    async def _run_official_build(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, config: dict, status_message):
+    async def _run_official_build(self, job: BuildJob, status_message):
+        config = job.config
         source = config.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
         full_url, ib_filename = await find_imagebuilder_url_and_name(config["VERSION"], config["TARGET"], config["SUBTARGET"], base_url)
         if not full_url: raise ValueError("Tidak dapat menemukan file Image Builder dari sumber yang dipilih.")
         ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", "")
-        if not os.path.isdir(ib_dir):
-            if not os.path.exists(ib_filename):
-                await status_message.edit_text(f"📥 Mengunduh `{ib_filename}`...", parse_mode='Markdown')
-                download_proc = await asyncio.create_subprocess_shell(f"wget -q --show-progress {full_url} -O {ib_filename}")
-                await download_proc.wait()
-            await status_message.edit_text(f"📦 Mengekstrak `{ib_filename}`...", parse_mode='Markdown')
-            extract_command = f"tar --use-compress-program=zstd -xf {ib_filename}" if ib_filename.endswith(".tar.zst") else f"tar -xf {ib_filename}"
-            extract_proc = await asyncio.create_subprocess_shell(extract_command)
-            await extract_proc.wait()
-            if os.path.exists(ib_filename): os.remove(ib_filename)
+        lock = self._dir_lock(ib_dir)
+        if lock.locked(): await edit_scheduler.edit_now(status_message, f"⏳ [`{job.id}`] Menunggu job lain yang memakai `{ib_dir}`...", parse_mode='Markdown')
+        async with lock:
+            if job.status == "Cancelled": return
+            if not await self._ensure_image_builder(job, status_message, full_url, ib_filename, ib_dir): return
+            # Fingerprint dihitung setelah IB siap dan di dalam lock: isi packages/ & files/ sudah final
+            job.fingerprint = await asyncio.to_thread(build_fingerprint, config, job.mode, ib_dir)
+            await self._build_once(job, status_message, lambda: self._build_with_image_builder(job, status_message, ib_dir))
+
+    async def _ask_profile_fix(self, job: BuildJob, status_message, valid_profiles):
+        job.status = "Awaiting Profile"
+        keyboard = [[InlineKeyboardButton(p, callback_data=f"build_fix_profile_{p}")] for p in valid_profiles[:20]]
+        await edit_scheduler.edit_now(status_message, f"⚠️ **Profil `{job.config['DEVICE_PROFILE']}` tidak valid!**\n\nPilih profil yang benar:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+    async def _ensure_image_builder(self, job: BuildJob, status_message, full_url: str, ib_filename: str, ib_dir: str) -> bool:
+        """Menyiapkan IB bila belum ada lalu memvalidasi profil. False bila pengguna diminta memilih profil lain."""
+        config = job.config
+        if not os.path.exists(os.path.join(ib_dir, "Makefile")):  # packages/ saja bisa sudah ada dari /upload_ipk
+            # Validasi profil lewat profiles.json dulu agar salah ketik tidak memicu unduhan besar
+            source = config.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
+            valid_profiles = await get_target_profiles(config["VERSION"], config["TARGET"], config["SUBTARGET"], base_url)
+            if valid_profiles and config["DEVICE_PROFILE"] not in valid_profiles:
+                await self._ask_profile_fix(job, status_message, valid_profiles); return False
+            uploaded = package_files(ib_dir)  # .ipk yang diunggah sebelum IB diekstrak bukan paket bawaan
+            await self._prepare_image_builder(job, status_message, full_url, ib_filename, ib_dir)
+            await asyncio.to_thread(record_stock_packages, ib_dir, uploaded)
         valid_profiles = await get_device_profiles(ib_dir)
+        if valid_profiles is None: raise RuntimeError("Gagal membaca daftar profil dari Image Builder.")
         if config["DEVICE_PROFILE"] not in valid_profiles:
-            self.status = "Awaiting Profile"
-            keyboard = [[InlineKeyboardButton(p, callback_data=f"build_fix_profile_{p}")] for p in valid_profiles[:20]]
-            await status_message.edit_text(f"⚠️ **Profil `{config['DEVICE_PROFILE']}` tidak valid!**\n\nPilih profil yang benar:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown'); return
+            await self._ask_profile_fix(job, status_message, valid_profiles); return False
+        return True
+
+    async def _build_with_image_builder(self, job: BuildJob, status_message, ib_dir: str):
+        context, chat_id, config = job.context, job.chat_id, job.config
         await self._apply_customizations(ib_dir, config, context, chat_id)
         if await self._update_rootfs_config(ib_dir, str(config.get("ROOTFS_SIZE", "")).strip()):
             await send_temporary_message(context, chat_id, f"💡 Info: Ukuran RootFS kustom diterapkan.")
-        self.status = "Building..."
+        if job.status == "Cancelled": return
+        if PACKAGE_PREFETCH: await self._prefetch_packages(job, status_message, ib_dir)
+        if job.status == "Cancelled": return
+        job.status = "Building..."
         command = (f"make -C {ib_dir} image PROFILE='{config['DEVICE_PROFILE']}' PACKAGES='{config['CUSTOM_PACKAGES']}' V=s")
-        await self._execute_and_stream_log(context, chat_id, command, config, ib_dir, status_message, 'official')
+        await self._execute_and_stream_log(job, command, ib_dir, status_message)
+
+    async def _prefetch_packages(self, job: BuildJob, status_message, ib_dir: str):
+        """Mengunduh closure dependensi paket secara paralel sebelum make. Kegagalan hanya dicatat; make tetap jalan."""
+        index = await get_profile_index(ib_dir) or {}
+        profile = index.get("profiles", {}).get(job.config["DEVICE_PROFILE"], {})
+        profile_packages = index.get("default_packages", []) + profile.get("packages", [])
+        async def progress(done, total):
+            edit_scheduler.request_edit(status_message, f"📦 [`{job.id}`] Prefetch paket {done}/{total}...", parse_mode='Markdown')
+        await edit_scheduler.edit_now(status_message, f"📦 [`{job.id}`] Menyelesaikan dependensi paket...", parse_mode='Markdown')
+        try:
+            summary = await prefetch_packages(ib_dir, job.config.get('CUSTOM_PACKAGES', ''), profile_packages, progress)
+        except Exception as e:
+            logger.warning(f"[{job.id}] Prefetch paket dilewati: {e}"); return
+        if summary and summary["downloaded"]:
+            await send_temporary_message(job.context, job.chat_id,
+                f"⚡ Prefetch: {summary['downloaded']} paket ({summary['bytes'] / 1048576:.1f} MB) diunduh paralel, hemat ~{summary['saved']:.0f} dtk.")
+
+    async def _prepare_image_builder(self, job: BuildJob, status_message, full_url: str, ib_filename: str, ib_dir: str):
+        """Mengunduh dan mengekstrak Image Builder, lewat pipeline streaming bila memungkinkan."""
+        checksums = await fetch_sha256sums(full_url.rsplit('/', 1)[0])
+        expected_sha256 = checksums.get(ib_filename)
+        if not expected_sha256: logger.warning(f"Hash sha256 untuk {ib_filename} tidak ditemukan, unduhan tidak diverifikasi.")
+        started = time.time()
+        if IB_STREAM_EXTRACT and not os.path.exists(ib_filename) and not os.path.exists(ib_filename + ".part"):
+            async def stream_progress(current, total, decompressed):
+                percent = f"{current * 100 / total:.1f}%" if total else f"{current / 1048576:.0f} MB"
+                speed = current / max(time.time() - started, 0.001) / 1048576
+                edit_scheduler.request_edit(status_message, f"📥 Unduh: {percent} ({speed:.1f} MB/s)\n📦 Ekstrak: {decompressed / 1048576:.0f} MB\n`{ib_filename}`", parse_mode='Markdown')
+            try:
+                await edit_scheduler.edit_now(status_message, f"📥 Mengunduh & mengekstrak `{ib_filename}`...", parse_mode='Markdown')
+                await stream_extract(full_url, ib_filename, expected_sha256=expected_sha256, progress_callback=stream_progress)
+                logger.info(f"[{job.id}] Image Builder siap via pipeline streaming dalam {time.time() - started:.1f} dtk.")
+                return
+            except asyncio.CancelledError:
+                shutil.rmtree(ib_dir, ignore_errors=True); raise  # Ekstraksi setengah jalan tidak boleh dipakai build berikutnya
+            except (DownloadError, httpx.HTTPError, OSError) as e:
+                logger.warning(f"[{job.id}] Pipeline streaming gagal ({e}), beralih ke unduh lalu ekstrak.")
+                shutil.rmtree(ib_dir, ignore_errors=True)
+                started = time.time()
+        if not os.path.exists(ib_filename):
+            await self._download_image_builder(status_message, full_url, ib_filename, expected_sha256)
+        download_done = time.time()
+        await edit_scheduler.edit_now(status_message, f"📦 Mengekstrak `{ib_filename}`...", parse_mode='Markdown')
+        extract_command = f"tar --use-compress-program=zstd -xf {ib_filename}" if ib_filename.endswith(".tar.zst") else f"tar -xf {ib_filename}"
+        extract_proc = await asyncio.create_subprocess_shell(extract_command)
+        try:
+            await extract_proc.wait()
+        except asyncio.CancelledError:
+            extract_proc.kill(); await extract_proc.wait()
+            shutil.rmtree(ib_dir, ignore_errors=True); raise
+        if os.path.exists(ib_filename): os.remove(ib_filename)
+        if extract_proc.returncode != 0:
+            shutil.rmtree(ib_dir, ignore_errors=True)
+            raise Exception(f"Gagal mengekstrak {ib_filename} (kode {extract_proc.returncode}).")
+        logger.info(f"[{job.id}] Image Builder siap via unduh+ekstrak: unduh {download_done - started:.1f} dtk, ekstrak {time.time() - download_done:.1f} dtk.")
+
+    async def _download_image_builder(self, status_message, full_url: str, ib_filename: str, expected_sha256: str = None):
+        await edit_scheduler.edit_now(status_message, f"📥 Mengunduh `{ib_filename}`...", parse_mode='Markdown')
+        started = time.time()
+
+        async def progress_callback(current, total):
+            speed = current / max(time.time() - started, 0.001) / 1048576
+            edit_scheduler.request_edit(status_message, f"📥 Mengunduh `{ib_filename}`: {current * 100 / total:.1f}% ({speed:.1f} MB/s)", parse_mode='Markdown')
+
+        try:
+            await download_file(full_url, ib_filename, expected_sha256=expected_sha256, progress_callback=progress_callback)
+        except (DownloadError, httpx.HTTPError) as e:
+            raise Exception(f"Gagal mengunduh Image Builder: {e}") from e
+
+    async def _run_amlogic_remake(self, job: BuildJob, status_message):
+        job.fingerprint = await asyncio.to_thread(build_fingerprint, job.config, job.mode)
+        async def run():
+            lock = self._dir_lock(AML_BUILD_SCRIPT_DIR)
+            if lock.locked(): await edit_scheduler.edit_now(status_message, f"⏳ [{job.id}] Menunggu Amlogic Remake lain selesai...")
+            async with lock:
+                if job.status == "Cancelled": return
+                await self._remake_with_amlogic_script(job, status_message)
+        await self._build_once(job, status_message, run)
+
+    # --- Cache hasil build ---
 
-    async def _run_amlogic_remake(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, config: dict, status_message):
-        await status_message.edit_text("⚙️ Mempersiapkan Amlogic Remake...")
+    async def _build_once(self, job: BuildJob, status_message, run):
+        """
+        Menjalankan `run` kecuali hasil untuk fingerprint input job sudah ada di cache. Job identik
+        yang sedang berjalan tidak diulang: job ini menunggu hasilnya lalu memakai cache tersebut.
+        """
+        if not job.fingerprint:
+            await run(); return  # Build yang tidak bisa di-cache
+        while True:
+            if await self._serve_cached_build(job, status_message): return
+            pending = self._inflight.get(job.fingerprint)
+            if pending is None: break
+            owner_id, done = pending
+            await edit_scheduler.edit_now(status_message, f"🔗 [`{job.id}`] Build identik sedang dikerjakan job `{owner_id}`, menunggu hasilnya...", parse_mode='Markdown')
+            job.status = f"Menunggu {owner_id}"
+            await asyncio.shield(done)
+            if job.status == "Cancelled": return
+        done = asyncio.get_running_loop().create_future()
+        self._inflight[job.fingerprint] = (job.id, done)
+        try:
+            await run()
+        finally:
+            self._inflight.pop(job.fingerprint, None); done.set_result(None)
+
+    async def _serve_cached_build(self, job: BuildJob, status_message) -> bool:
+        cached = get_cached_build(job.fingerprint) if job.fingerprint else None
+        if not cached: return False
+        build_id, snapshot = cached
+        entry = history_repo.get(build_id)
+        if entry is None or not files_unchanged(snapshot):
+            # Entri dihapus atau artefak sudah ditimpa build lain di direktori keluaran yang sama
+            drop_cached_build(job.fingerprint)
+            logger.info(f"[{job.id}] Cache build {build_id} tidak valid lagi, build dijalankan ulang.")
+            return False
+        job.status = "Success"
+        logger.info(f"[{job.id}] Input identik dengan build {entry.get('job_id', build_id)}, hasil diambil dari cache.")
+        note = f"♻️ Input identik dengan build `{entry.get('job_id', build_id)}`, hasil diambil dari cache.\n"
+        await self._show_build_result(job, build_id, history_repo.sorted_file_paths(build_id), status_message, note)
+        return True
+
+    async def _remake_with_amlogic_script(self, job: BuildJob, status_message):
+        config = job.config
+        await edit_scheduler.edit_now(status_message, "⚙️ Mempersiapkan Amlogic Remake...")
         if not os.path.isdir(AML_BUILD_SCRIPT_DIR):
-            await status_message.edit_text(f"📥 Melakukan clone repo skrip build Amlogic...")
+            await edit_scheduler.edit_now(status_message, f"📥 Melakukan clone repo skrip build Amlogic...")
             clone_proc = await asyncio.create_subprocess_shell(f"git clone --depth=1 {AML_BUILD_SCRIPT_REPO}")
             await clone_proc.wait()
             if clone_proc.returncode != 0: raise Exception("Gagal clone repositori skrip Amlogic.")
@@ -177,12 +459,12 @@ class BuildManager:
         # Tentukan nama file yang akan digunakan
         if rootfs_source_path:
             temp_rootfs_filename = os.path.basename(rootfs_source_path)
-            await status_message.edit_text(f"ℹ️ Menggunakan RootFS lokal dari `{temp_rootfs_filename}`...")
+            await edit_scheduler.edit_now(status_message, f"ℹ️ Menggunakan RootFS lokal dari `{temp_rootfs_filename}`...")
             # Salin file lokal, jangan pindahkan, agar file asli tetap ada
             shutil.copy(rootfs_source_path, temp_rootfs_filename)
         else:
             temp_rootfs_filename = os.path.basename(rootfs_url)
-            await status_message.edit_text(f"📥 Mengunduh RootFS dari `{rootfs_url}`...")
+            await edit_scheduler.edit_now(status_message, f"📥 Mengunduh RootFS dari `{rootfs_url}`...")
             download_proc = await asyncio.create_subprocess_shell(f"wget -q --show-progress {rootfs_url} -O {temp_rootfs_filename}")
             await download_proc.wait()
             if download_proc.returncode != 0: raise Exception("Gagal mengunduh RootFS.")
@@ -194,7 +476,8 @@ class BuildManager:
         shutil.move(temp_rootfs_filename, final_rootfs_path)
         logger.info(f"RootFS ditempatkan di: {final_rootfs_path}")
 
-        self.status = "Building..."
+        if job.status == "Cancelled": return
+        job.status = "Building..."
         size_arg = ""; rootfs_size = str(config.get("ROOTFS_SIZE", "")).strip()
         if rootfs_size.isdigit() and int(rootfs_size) > 0: size_arg = f"-s {rootfs_size}"
         kernel_version = config.get("KERNEL_VERSION", ""); kernel_tag = config.get("KERNEL_TAG", "stable")
@@ -206,83 +489,270 @@ class BuildManager:
         command_parts = ["cd", AML_BUILD_SCRIPT_DIR, "&&", "sudo", "./remake", board_arg, kernel_arg, size_arg, builder_arg, autoupdate_arg]
         command = " ".join(filter(None, command_parts))
         output_dir = os.path.join(AML_BUILD_SCRIPT_DIR, 'out')
-        await self._execute_and_stream_log(context, chat_id, command, config, output_dir, status_message, 'amlogic')
+        await self._execute_and_stream_log(job, command, output_dir, status_message)
 
-    async def _execute_and_stream_log(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, command: str, config: dict, build_dir: str, status_message, mode: str):
-        await status_message.edit_text(f"🚀 Memulai eksekusi...\n`{command}`", parse_mode='Markdown')
-        self.process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
-        log_content_bytes = b''; last_update_time, last_output_time = time.time(), time.time(); last_displayed_log = ""
-        while self.process.returncode is None:
-            try:
-                chunk = await asyncio.wait_for(self.process.stdout.read(2048), timeout=1.0)
-                if chunk: last_output_time = time.time(); log_content_bytes += chunk
-                else:
-                    await asyncio.sleep(0.5)
-                    if self.process.stdout.at_eof(): break
-            except asyncio.TimeoutError: pass
-            if (time.time() - last_output_time) > NO_OUTPUT_TIMEOUT:
-                await self.cancel_current_build(); await send_temporary_message(context, chat_id, "❌ Build dibatalkan otomatis karena tidak ada output (macet)."); return
-            if (time.time() - last_update_time) > LOG_UPDATE_INTERVAL:
-                decoded_log = log_content_bytes.decode('utf-8', errors='ignore')
-                display_log = decoded_log[-2000:]
-                if display_log.strip() and display_log != last_displayed_log:
-                    try:
-                        await status_message.edit_text(f"```\n{display_log}\n```", parse_mode='Markdown')
+    async def _execute_and_stream_log(self, job: BuildJob, command: str, build_dir: str, status_message):
+        context, chat_id = job.context, job.chat_id
+        await edit_scheduler.edit_now(status_message, f"🚀 [`{job.id}`] Memulai eksekusi...\n`{command}`", parse_mode='Markdown')
+        prune_build_logs(keep_paths=[j.log_path for j in self.active_jobs()])
+        # Sink log dibuka sebelum proses dijalankan: bila zstd gagal, tidak ada proses build yang yatim
+        job.log = log = LogCapture(job.log_path, compress=BUILD_LOG_COMPRESS); job.log_path = log.log_path
+        job.make_started_at = time.time()
+        try:
+            job.process = process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        except BaseException:
+            await log.aclose(); raise
+        last_update_time, last_output_time = time.time(), time.time(); last_displayed_log = ""
+        try:
+            while process.returncode is None:
+                try:
+                    chunk = await asyncio.wait_for(process.stdout.read(65536), timeout=1.0)
+                    if chunk: last_output_time = time.time(); log.feed(chunk)
+                    else:
+                        await asyncio.sleep(0.5)
+                        if process.stdout.at_eof(): break
+                except asyncio.TimeoutError: pass
+                if (time.time() - last_output_time) > NO_OUTPUT_TIMEOUT:
+                    await self.cancel_job(job.id); await send_temporary_message(context, chat_id, f"❌ [{job.id}] Build dibatalkan otomatis karena tidak ada output (macet)."); return
+                if (time.time() - last_update_time) > LOG_UPDATE_INTERVAL:
+                    log.flush()
+                    display_log = log.tail(2000)
+                    if display_log.strip() and display_log != last_displayed_log:
+                        edit_scheduler.request_edit(status_message, f"```\n{display_log}\n```", parse_mode='Markdown')
                         last_displayed_log = display_log
-                    except (RetryAfter, BadRequest) as e: logger.warning(f"Gagal update log: {e}"); await asyncio.sleep(5)
                     last_update_time = time.time()
-        await self.process.wait()
-        if self.process.returncode == 0:
-            self.status = "Success"
-            await self.handle_successful_build(context, chat_id, config, build_dir, status_message, mode)
+            await process.wait()
+        finally:
+            await log.aclose()
+        if job.status == "Cancelled":
+            try: await edit_scheduler.edit_now(status_message, f"🛑 Build `{job.id}` dibatalkan.", parse_mode='Markdown')
+            except BadRequest: pass
+            return
+        if process.returncode == 0:
+            job.status = "Success"
+            await self.handle_successful_build(job, build_dir, status_message)
         else:
-            final_log = log_content_bytes.decode('utf-8', errors='ignore')
-            display_log = "..." + final_log[-3800:] if len(final_log) > 3800 else final_log
-            raise Exception(f"Proses build gagal dengan kode error {self.process.returncode}.\n\nLog Akhir:\n{display_log}")
-
-    async def handle_successful_build(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, config: dict, build_dir: str, status_message, mode: str):
-        search_path = os.path.join(build_dir, '**/*')
-        VALID_EXTENSIONS = (".img.gz", ".img", ".bin", ".trx", ".vdi", ".vmdk", ".qcow2")
-        all_files = glob.glob(search_path, recursive=True)
-        firmware_files = sorted([f for f in all_files if os.path.isfile(f) and f.endswith(VALID_EXTENSIONS)])
+            display_log = log.tail(3800)
+            if log.total_bytes > len(display_log.encode('utf-8')): display_log = "..." + display_log
+            raise Exception(f"Proses build gagal dengan kode error {process.returncode}.\n\nLog Akhir:\n{display_log}")
+
+    async def handle_successful_build(self, job: BuildJob, build_dir: str, status_message):
+        config, mode = job.config, job.mode
+        artifacts = await asyncio.to_thread(collect_artifacts, build_dir, mode, config, job.make_started_at)
+        firmware_files = artifacts["files"]
         if not firmware_files:
-            await status_message.edit_text("🤔 Gagal menemukan file firmware yang dihasilkan meskipun build sukses."); return
+            await edit_scheduler.edit_now(status_message, "🤔 Gagal menemukan file firmware yang dihasilkan meskipun build sukses."); return
         entry_data = config.copy(); entry_data['build_mode'] = mode
         entry_data['version'] = config.get('VERSION', 'Amlogic')
-        new_entry_id = add_build_entry(config_data=entry_data, firmware_files=firmware_files, ib_dir=(build_dir if mode == 'official' else AML_BUILD_SCRIPT_DIR))
+        if artifacts["manifest"]: entry_data['manifest'] = artifacts["manifest"]
+        if artifacts["sha256sums"]: entry_data['sha256sums'] = artifacts["sha256sums"]
+        await edit_scheduler.edit_now(status_message, f"🔎 [`{job.id}`] Menghitung sha256 {len(firmware_files)} file...", parse_mode='Markdown')
+        started = time.time()
+        fingerprints = await fingerprint_files(firmware_files)
+        entry_data['sha256'] = {name: fp["sha256"] for name, fp in fingerprints.items()}
+        entry_data['file_stats'] = {name: [fp["size"], fp["mtime_ns"]] for name, fp in fingerprints.items()}
+        mismatched = verify_sha256sums(fingerprints, artifacts["sha256sums"])
+        if mismatched:
+            entry_data['checksum_mismatch'] = mismatched
+            logger.warning(f"[{job.id}] sha256 tidak cocok dengan sha256sums Image Builder: {', '.join(mismatched)}")
+        logger.info(f"[{job.id}] {len(firmware_files)} artefak di-hash dalam {time.time() - started:.1f} dtk ({len(artifacts['sha256sums'])} dicek silang dengan sha256sums).")
+        new_entry_id = add_build_entry(config_data=entry_data, firmware_files=firmware_files, ib_dir=(build_dir if mode == 'official' else AML_BUILD_SCRIPT_DIR), log_file=job.log_path, job_id=job.id)
         if not new_entry_id:
-            await status_message.edit_text("❌ Gagal menyimpan catatan build ke histori."); return
+            await edit_scheduler.edit_now(status_message, "❌ Gagal menyimpan catatan build ke histori."); return
+        if job.fingerprint: save_cached_build(job.fingerprint, new_entry_id, snapshot_files(firmware_files))
+        warning = f"⚠️ sha256 tidak cocok dengan `sha256sums`: {', '.join(mismatched)}\n" if mismatched else ""
+        await self._show_build_result(job, new_entry_id, firmware_files, status_message, warning)
+
+    async def _show_build_result(self, job: BuildJob, new_entry_id: str, firmware_files, status_message, note: str = ""):
+        mode = job.mode
         total_pages = -(-len(firmware_files) // FILES_PER_PAGE)
         paginated_files = firmware_files[:FILES_PER_PAGE]
         keyboard = [[InlineKeyboardButton(os.path.basename(f), callback_data=f"upload_choice_{new_entry_id}_{i}")] for i, f in enumerate(paginated_files)]
         nav_row = []
         if total_pages > 1: nav_row.append(InlineKeyboardButton("Berikutnya »", callback_data=f"build_page_{new_entry_id}_1"))
         if nav_row: keyboard.append(nav_row)
+        if len(firmware_files) > 1: keyboard.append([InlineKeyboardButton("📦 Upload Semua", callback_data=f"upload_all_{new_entry_id}")])
         if mode == 'official' and any("rootfs" in f for f in firmware_files):
              keyboard.append([InlineKeyboardButton("➡️ Lanjutkan ke Amlogic Remake", callback_data=f"chain_relic_{new_entry_id}")])
-        await status_message.edit_text(
-            f"✅ **Build Selesai!** (Halaman 1/{total_pages})\n\nDisimpan ke `/arsip`.\n👇 Pilih file untuk diunggah:",
+        if note: note = "\n" + note
+        await edit_scheduler.edit_now(status_message, 
+            f"✅ **Build `{job.id}` Selesai!** (Halaman 1/{total_pages})\n{note}\nDisimpan ke `/arsip`.\n👇 Pilih file untuk diunggah:",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
     
-    async def perform_upload(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, file_path: str, status_message):
+    async def _artifact_sha256(self, file_path: str, build_id: str = None):
+        """
+        sha256 artefak: diambil dari entri histori bila sudah pernah dihitung dan (ukuran, mtime_ns)
+        file masih sama. Jika belum ada atau file berubah (mis. ditimpa build berikutnya dengan ukuran
+        sama), dihitung ulang lalu disimpan.
+        """
+        file_name = os.path.basename(file_path)
+        entry = history_repo.get(build_id) if build_id else None
+        stat = snapshot_files([file_path]).get(file_path)
+        if entry is not None and file_name in entry.get('sha256', {}):
+            recorded = (entry.get('file_stats') or {}).get(file_name)
+            if recorded and files_unchanged({file_path: recorded}): return entry['sha256'][file_name]
+            logger.warning(f"{file_name} berubah sejak build {build_id} (atau belum tercatat), sha256 dihitung ulang.")
+        digest = await sha256_file_async(file_path)
+        if entry is not None:
+            # Dibaca ulang setelah await karena beberapa hash bisa dihitung bersamaan
+            entry = history_repo.get(build_id) or entry
+            checksums = dict(entry.get('sha256') or {}); checksums[file_name] = digest
+            file_stats = dict(entry.get('file_stats') or {}); file_stats[file_name] = stat
+            update_build_entry(build_id, sha256=checksums, file_stats=file_stats)
+        return digest
+
+    async def _send_cached_ref(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, ref: dict):
+        """Mengembalikan pesan yang terkirim, atau None bila referensi sudah tidak bisa dipakai."""
+        if ref.get('file_id'):
+            try: return await context.bot.send_document(chat_id=chat_id, document=ref['file_id'], caption=ref.get('caption'))
+            except TelegramError as e: logger.info(f"file_id cache tidak valid lagi: {e}")
+        if ref.get('chat_id') and ref.get('message_id'):
+            try: return await context.bot.forward_message(chat_id=chat_id, from_chat_id=ref['chat_id'], message_id=ref['message_id'])
+            except TelegramError as e: logger.info(f"Pesan cache {ref['chat_id']}/{ref['message_id']} tidak bisa di-forward: {e}")
+        return None
+
+    async def _send_cached_upload(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, ref: dict) -> bool:
+        """
+        Mengirim ulang media yang sudah pernah diunggah (file_id bot, lalu forward). False bila referensi kedaluwarsa.
+        Bagian yang sudah terkirim dihapus lagi saat bagian berikutnya gagal, agar unggah ulang tidak menggandakannya.
+        """
+        sent = []
+        for part_ref in ref.get('parts', [ref]):
+            message = await self._send_cached_ref(context, chat_id, part_ref)
+            if message is None:
+                if sent:
+                    try: await context.bot.delete_messages(chat_id=chat_id, message_ids=[m.message_id for m in sent])
+                    except TelegramError as e: logger.warning(f"Gagal menghapus {len(sent)} bagian cache yang sudah terkirim: {e}")
+                return False
+            sent.append(message)
+        return True
+
+    async def _send_artifact_albums(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, build_id: str, entry: dict, target_entity, paths, status_message):
+        await edit_scheduler.edit_now(status_message, f"🔎 Menghitung checksum {len(paths)} file...", reply_markup=None)
+        digests = await asyncio.gather(*(self._artifact_sha256(p, build_id) for p in paths))
+        media = [None] * len(paths)
+        refs = [get_upload_ref(d) for d in digests]
+        by_chat = {}
+        for i, ref in enumerate(refs):
+            if ref and ref.get('chat_id') and ref.get('message_id'): by_chat.setdefault(ref['chat_id'], []).append(i)
+        for source_chat, indexes in by_chat.items():
+            for i, cached in zip(indexes, await uploader_service.get_media(source_chat, [refs[i]['message_id'] for i in indexes])): media[i] = cached
+        pending = [i for i, m in enumerate(media) if m is None]
+        sizes = {i: os.path.getsize(paths[i]) for i in pending}; done = dict.fromkeys(pending, 0)
+        total_mb = sum(sizes.values()) / (1024 * 1024); finished = 0; last_report = 0.0
+
+        def report(force=False):
+            nonlocal last_report
+            if not force and time.time() - last_report < 2.0: return
+            last_report = time.time(); done_mb = sum(done.values()) / (1024 * 1024)
+            percent = done_mb / total_mb * 100 if total_mb else 100
+            edit_scheduler.request_edit(status_message, f"📤 Upload semua: {finished}/{len(pending)} file, {percent:.1f}% ({done_mb:.0f}/{total_mb:.0f} MB), {len(paths) - len(pending)} dari cache")
+
+        async def upload(i):
+            nonlocal finished
+            def progress(current, _total): done[i] = current; report()
+            media[i] = await uploader_service.upload_only(paths[i], progress_callback=progress)
+            done[i] = sizes[i]; finished += 1; report(force=True)
+
+        report(force=True)
+        tasks = [asyncio.create_task(upload(i)) for i in pending]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Satu upload gagal (atau perintah dibatalkan): upload lain dihentikan agar tidak terus berjalan
+            for task in tasks: task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        names = [os.path.basename(p) for p in paths]
+        header = f"📦 Build {entry.get('job_id', build_id)}: {entry.get('version', '')} {entry.get('profile') or entry.get('BOARD', '')}".strip()
+        checksum_list = "\n".join(f"{d}  {n}" for d, n in zip(digests, names))
+        caption = f"{header}\n\nsha256:\n{checksum_list}"
+        separate_checksums = len(caption) > 1024 or len(paths) > 10
+        if len(caption) > 1024: caption = f"{header}\n\nDaftar sha256 dikirim terpisah."
+        await edit_scheduler.edit_now(status_message, f"📨 Mengirim {len(paths)} file sebagai album...")
+        for start in range(0, len(paths), 10):
+            chunk = range(start, min(start + 10, len(paths)))
+            captions = [caption if start == 0 else f"{header} (lanjutan)"] + [""] * (len(chunk) - 1)
+            messages = await uploader_service.send_album(target_entity, [media[i] for i in chunk], captions)
+            await context.bot.forward_messages(chat_id=chat_id, from_chat_id=messages[0].chat_id, message_ids=[m.id for m in messages])
+            uploads = dict(entry.get('uploads', {}))
+            for i, message in zip(chunk, messages):
+                # Digabung dengan referensi lama agar file_id / parts yang sudah ada tidak hilang
+                ref = dict(get_upload_ref(digests[i]) or {}, chat_id=message.chat_id, message_id=message.id)
+                save_upload_ref(digests[i], names[i], os.path.getsize(paths[i]), ref)
+                uploads[names[i]] = dict(uploads.get(names[i]) or {}, chat_id=message.chat_id, message_id=message.id, sha256=digests[i])
+            update_build_entry(build_id, uploads=uploads)
+        if separate_checksums:
+            await context.bot.send_message(chat_id, f"sha256 build {entry.get('job_id', build_id)}:\n```\n{checksum_list}\n```", parse_mode='Markdown')
+        await edit_scheduler.edit_now(status_message, f"✅ {len(paths)} file terkirim ({len(paths) - len(pending)} dari cache).")
+
+    async def perform_upload_all(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, build_id: str, status_message):
+        """
+        Mengirim semua artefak sebuah build sebagai album (maks. 10 per album) dengan satu caption
+        berisi daftar sha256. File yang belum ada di cache diunggah bersamaan (dibatasi
+        UPLOAD_CONCURRENCY) dengan satu baris progres gabungan; yang sudah pernah diunggah dipakai ulang.
+        """
+        entry = history_repo.get(build_id)
+        if not entry: await edit_scheduler.edit_now(status_message, "❌ Error: Catatan build tidak ditemukan."); return
+        from handlers.settings_handler import get_config
+        config_full = get_config(context)
+        leech_dest = config_full.get(config_full.get('active_build_mode', 'official'), {}).get("LEECH_DESTINATION_ID", "me")
+        try: target_entity, _ = resolve_destination(leech_dest)
+        except ValueError: await edit_scheduler.edit_now(status_message, f"❌ ID Tujuan Leech tidak valid: {leech_dest}"); return
+        paths = [p for p in history_repo.sorted_file_paths(build_id) if os.path.exists(p)]
+        oversized = [p for p in paths if os.path.getsize(p) > config.TELEGRAM_MAX_FILE_SIZE]
+        paths = [p for p in paths if p not in oversized]
+        if not paths and not oversized: await edit_scheduler.edit_now(status_message, "❌ Error: File fisik tidak ditemukan.", reply_markup=None); return
+        try:
+            if paths: await self._send_artifact_albums(context, chat_id, build_id, entry, target_entity, paths, status_message)
+        except Exception as e:
+            logger.error(f"Upload semua untuk build {build_id} gagal: {e}", exc_info=True)
+            await edit_scheduler.edit_now(status_message, f"❌ Upload semua gagal: {e}")
+            return
+        for path in oversized:
+            message = await context.bot.send_message(chat_id, f"📤 Menyiapkan `{os.path.basename(path)}` (di atas batas Telegram)...", parse_mode='Markdown')
+            await self.perform_upload(context, chat_id, path, message, build_id=build_id)
+
+    async def perform_upload(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, file_path: str, status_message, build_id: str = None):
         try:
             from handlers.settings_handler import get_config
             config_full = get_config(context)
             active_mode = config_full.get('active_build_mode', 'official')
             config = config_full.get(active_mode, {})
             leech_dest = config.get("LEECH_DESTINATION_ID", "me")
-            await status_message.edit_text(f"📤 Mengunggah `{os.path.basename(file_path)}`...", parse_mode='Markdown', reply_markup=None)
-            uploaded_message = await upload_file_for_forwarding(file_path=file_path, destination_id=leech_dest, status_message=status_message)
-            if uploaded_message:
+            file_name = os.path.basename(file_path)
+            await edit_scheduler.edit_now(status_message, f"🔎 Memeriksa cache upload `{file_name}`...", parse_mode='Markdown', reply_markup=None)
+            digest = await self._artifact_sha256(file_path, build_id)
+            ref = get_upload_ref(digest)
+            if ref:
+                if await self._send_cached_upload(context, chat_id, ref):
+                    logger.info(f"Upload {file_name} dilayani dari cache (sha256 {digest[:12]}).")
+                    edit_scheduler.discard(status_message)
+                    await status_message.delete(); return
+                drop_upload_ref(digest)
+            await edit_scheduler.edit_now(status_message, f"📤 Mengunggah `{file_name}`...", parse_mode='Markdown')
+            uploaded_messages = await upload_file_for_forwarding(file_path=file_path, destination_id=leech_dest, status_message=status_message)
+            if uploaded_messages:
                 try:
-                    await context.bot.forward_message(chat_id=chat_id, from_chat_id=uploaded_message.chat_id, message_id=uploaded_message.id)
+                    refs = []
+                    for uploaded_message in uploaded_messages:
+                        forwarded = await context.bot.forward_message(chat_id=chat_id, from_chat_id=uploaded_message.chat_id, message_id=uploaded_message.id)
+                        refs.append({"chat_id": uploaded_message.chat_id, "message_id": uploaded_message.id,
+                                     "file_id": forwarded.document.file_id if forwarded.document else None, "caption": forwarded.caption})
+                    ref = refs[0] if len(refs) == 1 else {"parts": refs}
+                    save_upload_ref(digest, file_name, os.path.getsize(file_path), ref)
+                    entry = history_repo.get(build_id) if build_id else None
+                    if entry is not None:
+                        uploads = dict(entry.get('uploads', {})); uploads[file_name] = dict(ref, sha256=digest)
+                        update_build_entry(build_id, uploads=uploads)
+                    edit_scheduler.discard(status_message)
                     await status_message.delete()
                 except Exception as e:
-                    await status_message.edit_text(f"❌ Gagal me-forward file.\nError: {e}")
+                    await edit_scheduler.edit_now(status_message, f"❌ Gagal me-forward file.\nError: {e}")
         except Exception as e:
             await send_temporary_message(context, chat_id, f"Terjadi kesalahan saat mengirim file: {e}")
             if status_message: 
+                edit_scheduler.discard(status_message)
                 try: await status_message.delete()
                 except: pass
 
@@ -0,0 +1,56 @@
+# core/checksum.py
+
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from config import HASH_WORKERS
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Pool khusus hashing; hashlib melepas GIL saat memproses chunk besar sehingga file di-hash paralel.
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="sha256")
+
+
+def sha256_file(path: str) -> str:
+    """sha256 sebuah file, dibaca bertahap agar memori tetap kecil."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE): digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def sha256_file_async(path: str) -> str:
+    """Seperti sha256_file, tetapi dijalankan di thread agar event loop tidak tertahan."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, sha256_file, path)
+
+
+def _fingerprint(path: str):
+    st = os.stat(path)  # Diambil sebelum hashing: file yang ditimpa selama hashing akan terdeteksi berubah
+    return sha256_file(path), st.st_size, st.st_mtime_ns
+
+
+async def fingerprint_files(paths) -> dict:
+    """
+    Meng-hash banyak file sekaligus di thread pool (memori per file dibatasi HASH_CHUNK_SIZE).
+    Mengembalikan {nama_file: {"sha256": ..., "size": ..., "mtime_ns": ...}}.
+    """
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(loop.run_in_executor(_executor, _fingerprint, p) for p in paths))
+    return {os.path.basename(p): {"sha256": digest, "size": size, "mtime_ns": mtime_ns} for p, (digest, size, mtime_ns) in zip(paths, results)}
+
+
+def verify_sha256sums(fingerprints: dict, expected: dict):
+    """Nama file yang hash-nya tidak cocok dengan sha256sums Image Builder (file tanpa entri dilewati)."""
+    return sorted(name for name, fp in fingerprints.items() if name in expected and expected[name] != fp["sha256"])
+
+
+def parse_sha256sums(text: str) -> dict:
+    """Mem-parsing isi file `sha256sums` (format `hash *nama`) menjadi {nama_file: hash}."""
+    checksums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and len(parts[0]) == 64:
+            checksums[parts[1].lstrip('*')] = parts[0].lower()
+    return checksums
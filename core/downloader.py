@@ -0,0 +1,322 @@
+# core/downloader.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+STATE_SAVE_INTERVAL = 8 * 1024 * 1024
+PROGRESS_INTERVAL = 2.0
+SEGMENT_RETRIES = 3
+
+
+class DownloadError(Exception):
+    """Unduhan gagal atau hash tidak cocok dengan sha256sums."""
+
+
+class _Segment:
+    def __init__(self, index: int, start: int, end: int, done: int = 0):
+        self.index = index
+        self.start = start
+        self.end = end  # inklusif, sesuai header Range
+        self.done = done
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+    @property
+    def finished(self):
+        return self.done >= self.length
+
+
+class _HashFrontier:
+    """
+    Menghitung sha256 secara berurutan sambil segmen-segmen diunduh paralel.
+
+    Byte dari segmen yang sedang berada di "frontier" di-hash langsung dari stream
+    jaringan. Segmen yang selesai lebih dulu hanya dibaca ulang dari page cache saat
+    frontier mencapainya, sehingga tidak ada pass hash kedua setelah unduhan selesai.
+    """
+    def __init__(self, part_path: str, segments: list):
+        self.part_path = part_path
+        self.segments = segments
+        self.hasher = hashlib.sha256()
+        self.current = 0
+        self.offset = 0
+        self._lock = asyncio.Lock()
+
+    def feed(self, segment: _Segment, pos: int, chunk: bytes):
+        if self._lock.locked() or segment.index != self.current or pos != self.offset: return
+        self.hasher.update(chunk)
+        self.offset += len(chunk)
+
+    def _hash_range(self, start: int, length: int):
+        with open(self.part_path, 'rb') as f:
+            f.seek(start)
+            while length > 0:
+                data = f.read(min(CHUNK_SIZE, length))
+                if not data: raise DownloadError("File .part lebih pendek dari progres yang tercatat.")
+                self.hasher.update(data); length -= len(data)
+
+    async def advance(self):
+        async with self._lock:
+            while self.current < len(self.segments):
+                segment = self.segments[self.current]
+                if self.offset < segment.done:
+                    done = segment.done
+                    await asyncio.to_thread(self._hash_range, segment.start + self.offset, done - self.offset)
+                    self.offset = done
+                    continue
+                if segment.finished:
+                    self.current += 1; self.offset = 0
+                    continue
+                break
+
+    @property
+    def complete(self):
+        return self.current >= len(self.segments)
+
+
+def _load_state(state_path: str, url: str, total: int):
+    if not os.path.exists(state_path): return None
+    try:
+        with open(state_path, 'r') as f: state = json.load(f)
+        if state.get('url') != url or state.get('total') != total: return None
+        return [_Segment(i, s, e, d) for i, (s, e, d) in enumerate(state['segments'])]
+    except (json.JSONDecodeError, IOError, KeyError, ValueError) as e:
+        logger.warning(f"State unduhan {state_path} rusak, memulai ulang: {e}")
+        return None
+
+
+def _save_state(state_path: str, url: str, total: int, segments: list):
+    try:
+        with open(state_path, 'w') as f:
+            json.dump({"url": url, "total": total, "segments": [[s.start, s.end, s.done] for s in segments]}, f)
+    except IOError as e:
+        logger.warning(f"Gagal menyimpan state unduhan {state_path}: {e}")
+
+
+def _split_segments(total: int, count: int):
+    count = max(1, min(count, total // MIN_SEGMENT_SIZE or 1))
+    size = -(-total // count)
+    return [_Segment(i, start, min(start + size, total) - 1) for i, start in enumerate(range(0, total, size))]
+
+
+def _cleanup(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            try: os.remove(path)
+            except OSError as e: logger.warning(f"Gagal menghapus {path}: {e}")
+
+
+async def _probe(client: httpx.AsyncClient, url: str):
+    """Mengembalikan (ukuran, dukung_range) dari server."""
+    response = await client.head(url)
+    response.raise_for_status()
+    total = int(response.headers.get('content-length', 0) or 0)
+    accepts_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+    return total, accepts_ranges
+
+
+async def _write_at(fd: int, chunk: bytes, offset: int):
+    """os.pwrite di thread. Bila dibatalkan, tulisan yang sedang berjalan tetap ditunggu agar fd tidak ditutup di tengahnya."""
+    write = asyncio.ensure_future(asyncio.to_thread(os.pwrite, fd, chunk, offset))
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        await asyncio.wait([write]); raise
+
+
+async def _download_segment(client, url, fd, segment: _Segment, frontier: _HashFrontier, on_progress, save_state):
+    for attempt in range(1, SEGMENT_RETRIES + 1):
+        if segment.finished: return
+        headers = {"Range": f"bytes={segment.start + segment.done}-{segment.end}"}
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                if response.status_code != 206 and segment.start + segment.done > 0:
+                    raise DownloadError("Server mengabaikan header Range.")
+                unsaved = 0
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    chunk = chunk[:segment.length - segment.done]
+                    if not chunk: break
+                    pos = segment.done
+                    await _write_at(fd, chunk, segment.start + pos)
+                    segment.done += len(chunk); unsaved += len(chunk)
+                    frontier.feed(segment, pos, chunk)
+                    await on_progress()
+                    if unsaved >= STATE_SAVE_INTERVAL: save_state(); unsaved = 0
+            if segment.finished:
+                save_state(); await frontier.advance()
+                return
+            raise DownloadError(f"Segmen #{segment.index} terputus sebelum selesai.")
+        except (httpx.HTTPError, DownloadError) as e:
+            save_state()
+            if attempt == SEGMENT_RETRIES: raise DownloadError(f"Segmen #{segment.index} gagal setelah {attempt} percobaan: {e}") from e
+            logger.warning(f"Segmen #{segment.index} error ({e}), mencoba lagi ({attempt}/{SEGMENT_RETRIES})...")
+            await asyncio.sleep(2 * attempt)
+
+
+async def download_file(url: str, dest_path: str, expected_sha256: str = None, segments: int = config.DOWNLOAD_SEGMENTS, progress_callback=None) -> str:
+    """
+    Mengunduh `url` ke `dest_path` dengan beberapa range request paralel.
+
+    Progres disimpan di `<dest>.part` + `<dest>.part.json` sehingga unduhan yang
+    terputus bisa dilanjutkan. Hash sha256 dihitung selama byte mengalir dan
+    dicocokkan dengan `expected_sha256` (jika ada). Mengembalikan hex digest.
+    """
+    part_path = dest_path + ".part"; state_path = part_path + ".json"
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=60.0), follow_redirects=True) as client:
+        total, accepts_ranges = await _probe(client, url)
+        if not total or not accepts_ranges:
+            logger.info(f"Server tidak mendukung range untuk {url}, mengunduh dengan satu koneksi.")
+            return await _download_single(client, url, dest_path, expected_sha256)
+        segment_list = _load_state(state_path, url, total) if os.path.exists(part_path) else None
+        if segment_list:
+            logger.info(f"Melanjutkan unduhan {os.path.basename(dest_path)} dari {sum(s.done for s in segment_list)} byte.")
+        else:
+            segment_list = _split_segments(total, segments)
+
+        if not any(s.done for s in segment_list): _cleanup(part_path)
+        save_state = lambda: _save_state(state_path, url, total, segment_list)
+        frontier = _HashFrontier(part_path, segment_list)
+        last_report = 0.0; started = time.time()
+
+        async def on_progress():
+            nonlocal last_report
+            if progress_callback is None or time.time() - last_report < PROGRESS_INTERVAL: return
+            last_report = time.time()
+            try: await progress_callback(sum(s.done for s in segment_list), total)
+            except Exception as e: logger.debug(f"Progress callback unduhan error: {e}")
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, total)
+            await frontier.advance()  # Hash ulang bagian yang sudah ada saat resume
+            tasks = [asyncio.create_task(_download_segment(client, url, fd, s, frontier, on_progress, save_state)) for s in segment_list if not s.finished]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Segmen lain harus benar-benar berhenti sebelum fd ditutup (nomor fd bisa dipakai ulang kernel)
+                for task in tasks: task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            await frontier.advance()
+        finally:
+            os.close(fd)
+            save_state()
+
+    if not frontier.complete: raise DownloadError("Unduhan belum lengkap.")
+    digest = frontier.hasher.hexdigest()
+    elapsed = max(time.time() - started, 0.001)
+    logger.info(f"Unduhan {os.path.basename(dest_path)} selesai: {total / 1048576:.1f} MB dalam {elapsed:.1f} dtk ({total / 1048576 / elapsed:.1f} MB/s, {len(segment_list)} segmen).")
+    if expected_sha256 and digest != expected_sha256.lower():
+        _cleanup(part_path, state_path)
+        raise DownloadError(f"Checksum sha256 tidak cocok untuk {os.path.basename(dest_path)} (diharapkan {expected_sha256}, didapat {digest}).")
+    os.replace(part_path, dest_path); _cleanup(state_path)
+    return digest
+
+
+async def _download_single(client: httpx.AsyncClient, url: str, dest_path: str, expected_sha256: str = None) -> str:
+    """Fallback satu koneksi tanpa resume untuk server yang tidak mendukung range request."""
+    part_path = dest_path + ".part"; hasher = hashlib.sha256()
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb') as f:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                f.write(chunk); hasher.update(chunk)
+    digest = hasher.hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        _cleanup(part_path)
+        raise DownloadError(f"Checksum sha256 tidak cocok untuk {os.path.basename(dest_path)}.")
+    os.replace(part_path, dest_path)
+    return digest
+
+
+async def stream_extract(url: str, archive_name: str, expected_sha256: str = None, extract_dir: str = ".", progress_callback=None) -> str:
+    """
+    Mengalirkan arsip .tar.xz/.tar.zst langsung dari HTTP ke dekompresor multi-thread
+    (xz/zstd -T0) lalu ke `tar -x`, tanpa menyimpan arsip ke disk.
+
+    `progress_callback(diunduh, total, didekompresi)` dipanggil per PROGRESS_INTERVAL.
+    Hash sha256 dihitung dari stream terkompresi; jika tidak cocok, DownloadError
+    dilempar dan pemanggil wajib membuang hasil ekstraksi. Mengembalikan hex digest.
+    """
+    decompressor = ["zstd", "-T0", "-dc"] if archive_name.endswith(".tar.zst") else ["xz", "-T0", "-dc"]
+    hasher = hashlib.sha256(); downloaded = decompressed = total = 0
+    last_report = 0.0; started = time.time()
+
+    async def report():
+        nonlocal last_report
+        if progress_callback is None or time.time() - last_report < PROGRESS_INTERVAL: return
+        last_report = time.time()
+        try: await progress_callback(downloaded, total, decompressed)
+        except Exception as e: logger.debug(f"Progress callback ekstraksi error: {e}")
+
+    decomp_proc = await asyncio.create_subprocess_exec(*decompressor, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    tar_proc = await asyncio.create_subprocess_exec("tar", "-xf", "-", "-C", extract_dir, stdin=asyncio.subprocess.PIPE)
+
+    async def feed_network(client: httpx.AsyncClient):
+        nonlocal downloaded, total
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                total = int(response.headers.get('content-length', 0) or 0)
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    hasher.update(chunk); downloaded += len(chunk)
+                    decomp_proc.stdin.write(chunk)
+                    await decomp_proc.stdin.drain()
+                    await report()
+        finally:
+            decomp_proc.stdin.close()
+
+    async def relay_to_tar():
+        nonlocal decompressed
+        try:
+            while True:
+                data = await decomp_proc.stdout.read(CHUNK_SIZE)
+                if not data: break
+                decompressed += len(data)
+                tar_proc.stdin.write(data)
+                await tar_proc.stdin.drain()
+        finally:
+            tar_proc.stdin.close()
+
+    tasks = []
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=60.0), follow_redirects=True) as client:
+            tasks = [asyncio.create_task(feed_network(client)), asyncio.create_task(relay_to_tar())]
+            await asyncio.gather(*tasks)
+        await asyncio.gather(decomp_proc.wait(), tar_proc.wait())
+    except BaseException:
+        # Satu sisi gagal: sisi lain dihentikan dan dekompresor/tar dibunuh lalu ditunggu agar tidak jadi zombie
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for proc in (decomp_proc, tar_proc):
+            if proc.returncode is None:
+                try: proc.kill()
+                except ProcessLookupError: pass
+        # communicate() juga menguras stdout dekompresor; wait() saja macet bila pipanya tidak pernah dibaca sampai EOF
+        await asyncio.shield(asyncio.gather(decomp_proc.communicate(), tar_proc.communicate(), return_exceptions=True))
+        raise
+    if decomp_proc.returncode != 0 or tar_proc.returncode != 0:
+        raise DownloadError(f"Pipeline ekstraksi gagal ({decompressor[0]}: {decomp_proc.returncode}, tar: {tar_proc.returncode}).")
+
+    digest = hasher.hexdigest()
+    elapsed = max(time.time() - started, 0.001)
+    logger.info(f"Stream-extract {archive_name} selesai: {downloaded / 1048576:.1f} MB terkompresi -> {decompressed / 1048576:.1f} MB "
+                f"dalam {elapsed:.1f} dtk ({downloaded / 1048576 / elapsed:.1f} MB/s jaringan).")
+    if expected_sha256 and digest != expected_sha256.lower():
+        raise DownloadError(f"Checksum sha256 tidak cocok untuk {archive_name} (diharapkan {expected_sha256}, didapat {digest}).")
+    return digest
@@ -0,0 +1,141 @@
+# core/edit_scheduler.py
+
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter, BadRequest, TelegramError
+
+from config import EDIT_MIN_INTERVAL, EDIT_GLOBAL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class EditScheduler:
+    """
+    Penjadwal tunggal untuk semua edit pesan progres (log build, unduhan, upload).
+
+    Edit yang tertunda digabung per pesan (hanya konten terbaru yang dikirim), tiap
+    pesan diedit paling sering sekali per `min_interval`, dan `RetryAfter` dari server
+    menghentikan SEMUA edit sampai jeda yang diminta berakhir.
+    """
+    def __init__(self, min_interval: float = EDIT_MIN_INTERVAL, global_interval: float = EDIT_GLOBAL_INTERVAL):
+        self.min_interval = min_interval
+        self.global_interval = global_interval
+        self._pending = {}
+        self._last_sent = {}
+        self._locks = {}
+        self._generations = {}  # Dinaikkan oleh edit_now; edit terjadwal dari generasi lama tidak boleh menimpa edit final
+        self._paused_until = 0.0
+        self._task = None
+        self.stats = {"requested": 0, "sent": 0, "dropped": 0, "retry_after": 0, "errors": 0}
+
+    @staticmethod
+    def _key(message):
+        return (message.chat_id, message.message_id)
+
+    def _lock(self, key) -> asyncio.Lock:
+        if key not in self._locks: self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def status_line(self):
+        paused = max(0.0, self._paused_until - time.monotonic())
+        line = f"Edit antre: {self.queue_depth}, terkirim: {self.stats['sent']}, digabung: {self.stats['dropped']}, flood-wait: {self.stats['retry_after']}"
+        return line + (f" (jeda {paused:.0f} dtk)" if paused else "")
+
+    def request_edit(self, message, text: str, **kwargs):
+        """Menjadwalkan edit tanpa menunggu. Konten lama yang belum terkirim untuk pesan ini dibuang."""
+        if message is None: return
+        key = self._key(message); self.stats["requested"] += 1
+        if key in self._pending: self.stats["dropped"] += 1
+        self._pending[key] = (message, text, kwargs, self._generations.get(key, 0))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def discard(self, message):
+        """Membuang edit tertunda untuk pesan (misalnya sebelum pesan dihapus)."""
+        if message is not None and self._pending.pop(self._key(message), None): self.stats["dropped"] += 1
+
+    async def edit_now(self, message, text: str, **kwargs):
+        """Edit final yang wajib terkirim: membuang progres tertunda dan menunggu jeda flood global."""
+        self.discard(message)
+        key = self._key(message)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        async with self._lock(key):
+            for _ in range(3):
+                await self._wait_for_pause()
+                try:
+                    result = await message.edit_text(text, **kwargs)
+                    self.stats["sent"] += 1; self._last_sent[key] = time.monotonic()
+                    return result
+                except RetryAfter as e:
+                    self._pause(e)
+                except BadRequest as e:
+                    if "not modified" in str(e).lower(): return None
+                    raise
+        logger.warning(f"Edit final untuk pesan {key} gagal setelah beberapa flood-wait.")
+        return None
+
+    def _pause(self, error: RetryAfter):
+        self.stats["retry_after"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + _retry_seconds(error))
+        logger.warning(f"Flood limit Telegram: semua edit dijeda {_retry_seconds(error):.0f} dtk.")
+
+    async def _wait_for_pause(self):
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def _next_ready(self, now: float):
+        """Mengembalikan (key, waktu_tunggu) untuk pesan tertunda yang paling cepat siap."""
+        best_key, best_wait = None, None
+        for key in self._pending:
+            wait = self._last_sent.get(key, 0.0) + self.min_interval - now
+            if wait <= 0: return key, 0.0
+            if best_wait is None or wait < best_wait: best_key, best_wait = key, wait
+        return best_key, best_wait
+
+    async def _run(self):
+        while self._pending:
+            await self._wait_for_pause()
+            key, wait = self._next_ready(time.monotonic())
+            if key is None: break
+            if wait > 0:
+                await asyncio.sleep(min(wait, self.min_interval)); continue
+            message, text, kwargs, generation = self._pending.pop(key)
+            async with self._lock(key):
+                if generation != self._generations.get(key, 0):
+                    # edit_now sudah (atau sedang) mengirim teks final: progres ini sudah basi
+                    self.stats["dropped"] += 1; continue
+                try:
+                    await message.edit_text(text, **kwargs)
+                    self.stats["sent"] += 1
+                except RetryAfter as e:
+                    self._pause(e)
+                    self._pending.setdefault(key, (message, text, kwargs, generation))
+                except BadRequest as e:
+                    if "not modified" not in str(e).lower():
+                        self.stats["errors"] += 1; logger.warning(f"Edit terjadwal untuk {key} gagal: {e}")
+                except TelegramError as e:
+                    self.stats["errors"] += 1; logger.warning(f"Edit terjadwal untuk {key} gagal: {e}")
+                self._last_sent[key] = time.monotonic()
+            self._prune()
+            await asyncio.sleep(self.global_interval)
+
+    def _prune(self, max_age: float = 300.0):
+        cutoff = time.monotonic() - max_age
+        for key in [k for k, t in self._last_sent.items() if t < cutoff and k not in self._pending]:
+            self._last_sent.pop(key, None); self._generations.pop(key, None)
+            lock = self._locks.get(key)
+            if lock and not lock.locked(): self._locks.pop(key, None)
+
+
+edit_scheduler = EditScheduler()
@@ -0,0 +1,255 @@
+# core/feed_proxy.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote
+
+import httpx
+
+from config import FEED_PROXY_HOST, FEED_PROXY_PORT, FEED_CACHE_DIR, FEED_INDEX_TTL, FEED_CACHE_QUOTA
+from .http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# File indeks feed opkg; selalu di-cache bersama (satu direktori) agar Packages & Packages.sig tetap cocok.
+INDEX_FILES = ("Packages", "Packages.gz", "Packages.sig", "Packages.manifest", "Packages.asc")
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_SRC_LINE = re.compile(r'^(\s*src(?:/gz)?\s+\S+\s+)(https?)://(\S+)(.*)$', re.MULTILINE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    is_index INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_urls_sha256 ON urls (sha256);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs (last_used);
+"""
+
+
+class FeedCache:
+    """Penyimpanan feed: indeks Packages dengan TTL, .ipk content-addressed (sha256), kuota disk + LRU."""
+    def __init__(self, root: str = FEED_CACHE_DIR, quota: int = FEED_CACHE_QUOTA, index_ttl: int = FEED_INDEX_TTL):
+        self.root = root; self.quota = quota; self.index_ttl = index_ttl
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._url_locks = {}
+        self.stats = {"hits": 0, "misses": 0, "bytes_served": 0, "bytes_fetched": 0, "evicted": 0}
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, "feeds.db"), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _execute(self, sql: str, params=()):
+        with self._db_lock: return self._db().execute(sql, params).fetchall()
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    @staticmethod
+    def is_index(url: str) -> bool:
+        return url.rsplit('/', 1)[-1] in INDEX_FILES
+
+    def lookup(self, url: str):
+        """Path blob untuk `url` bila ada dan (untuk indeks) belum melewati TTL, selain itu None."""
+        rows = self._execute("SELECT sha256, is_index, fetched_at FROM urls WHERE url = ?", (url,))
+        if not rows: return None
+        sha256, is_index, fetched_at = rows[0]
+        if is_index and time.time() - fetched_at > self.index_ttl: return None
+        path = self.blob_path(sha256)
+        if not os.path.exists(path): return None
+        self._execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+        return path
+
+    def _open_tmp(self, url: str):
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        tmp_path = os.path.join(self.root, "tmp", f"{os.getpid()}-{id(url)}-{time.monotonic_ns()}")
+        return tmp_path, open(tmp_path, 'wb')
+
+    def _store(self, url: str, tmp_path: str, sha256: str, size: int) -> str:
+        """Memindahkan file sementara ke blob-nya lalu mencatat URL & blob di database, kemudian menegakkan kuota."""
+        path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        now = time.time(); is_index = self.is_index(url)
+        if is_index and url.endswith("Packages.gz"):
+            # Indeks baru: file tanda tangan/indeks lain di direktori yang sama harus diambil ulang juga
+            self._execute("DELETE FROM urls WHERE is_index = 1 AND url LIKE ? AND url != ?", (url.rsplit('/', 1)[0] + "/Packages%", url))
+        self._execute("INSERT OR REPLACE INTO urls (url, sha256, is_index, fetched_at) VALUES (?, ?, ?, ?)", (url, sha256, int(is_index), now))
+        self._execute("INSERT OR REPLACE INTO blobs (sha256, size, last_used) VALUES (?, ?, ?)", (sha256, size, now))
+        self.enforce_quota()
+        return path
+
+    @staticmethod
+    def _remove_tmp(tmp_path: str):
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    async def fetch(self, url: str):
+        """
+        Mengunduh `url` ke blob (sha256 dihitung sambil streaming). Mengembalikan path blob, atau status HTTP
+        upstream bila gagal. Semua I/O disk dan SQLite dijalankan di thread agar event loop tetap melayani opkg.
+        """
+        digest = hashlib.sha256(); size = 0
+        tmp_path, f = await asyncio.to_thread(self._open_tmp, url)
+
+        def write(chunk: bytes):
+            f.write(chunk); digest.update(chunk)
+
+        try:
+            try:
+                async with get_client(url).stream("GET", url) as response:
+                    if response.status_code != 200: return response.status_code
+                    async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                        await asyncio.to_thread(write, chunk); size += len(chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            path = await asyncio.to_thread(self._store, url, tmp_path, digest.hexdigest(), size)
+        finally:
+            await asyncio.to_thread(self._remove_tmp, tmp_path)
+        self.stats["bytes_fetched"] += size
+        return path
+
+    async def get(self, url: str):
+        """Path blob untuk `url` dari cache atau upstream; satu unduhan per URL meski diminta bersamaan."""
+        path = await asyncio.to_thread(self.lookup, url)
+        if path: self.stats["hits"] += 1; return path
+        lock = self._url_locks.setdefault(url, asyncio.Lock())
+        try:
+            async with lock:
+                path = await asyncio.to_thread(self.lookup, url)
+                if path: self.stats["hits"] += 1; return path
+                self.stats["misses"] += 1
+                return await self.fetch(url)
+        finally:
+            # Peminta yang masih menunggu memegang lock yang sama; yang datang belakangan langsung kena cache
+            if self._url_locks.get(url) is lock: del self._url_locks[url]
+
+    def enforce_quota(self):
+        """Menghapus blob yang paling lama tidak dipakai hingga total ukuran di bawah kuota."""
+        total = self._execute("SELECT COALESCE(SUM(size), 0) FROM blobs")[0][0]
+        if total <= self.quota: return
+        for sha256, size in self._execute("SELECT sha256, size FROM blobs ORDER BY last_used ASC"):
+            if total <= self.quota: break
+            path = self.blob_path(sha256)
+            if os.path.exists(path): os.remove(path)
+            self._execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self._execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            total -= size; self.stats["evicted"] += 1
+        logger.info(f"Kuota cache feed: {self.stats['evicted']} blob dihapus (LRU), sisa {total / 1048576:.0f} MB.")
+
+    def usage(self):
+        count, total = self._execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs")[0]
+        return count, total
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None: self._conn.close(); self._conn = None
+
+
+class FeedProxy:
+    """
+    Server HTTP lokal kecil untuk opkg di Image Builder. Path `/<skema>/<host>/<path>` dipetakan
+    ke `<skema>://<host>/<path>` dan dilayani dari FeedCache.
+    """
+    def __init__(self, cache: FeedCache, host: str = FEED_PROXY_HOST, port: int = FEED_PROXY_PORT):
+        self.cache = cache; self.host = host; self.port = port
+        self.server = None
+        self.allowed_hosts = set()  # Hanya host feed dari repositories.conf yang boleh diteruskan
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}" if self.server else None
+
+    async def start(self):
+        if self.server: return
+        try:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"Proxy feed paket aktif di {self.base_url}.")
+        except OSError as e:
+            logger.error(f"Gagal menjalankan proxy feed di {self.host}:{self.port}, repositories.conf tidak diubah: {e}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close(); await self.server.wait_closed(); self.server = None
+        self.cache.close()
+
+    def upstream_url(self, path: str):
+        parts = unquote(path.split('?', 1)[0]).lstrip('/').split('/', 2)
+        if len(parts) < 3 or parts[0] not in ("http", "https") or parts[1] not in self.allowed_hosts: return None
+        return f"{parts[0]}://{parts[1]}/{parts[2]}"
+
+    def rewrite_repositories(self, content: str) -> str:
+        """Mengarahkan baris `src/gz` http(s) di repositories.conf ke proxy (idempoten)."""
+        if not self.base_url: return content
+        def rewrite(m):
+            if f"{m.group(2)}://{m.group(3)}".startswith(self.base_url + "/"): return m.group(0)
+            self.allowed_hosts.add(m.group(3).split('/', 1)[0])
+            return f"{m.group(1)}{self.base_url}/{m.group(2)}/{m.group(3)}{m.group(4)}"
+        return _SRC_LINE.sub(rewrite, content)
+
+    async def _respond(self, writer, status: int, reason: str, body: bytes = b""):
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""): pass
+            if len(request_line) < 2 or request_line[0] not in ("GET", "HEAD"):
+                await self._respond(writer, 405, "Method Not Allowed"); return
+            url = self.upstream_url(request_line[1])
+            if not url:
+                await self._respond(writer, 400, "Bad Request"); return
+            try:
+                result = await self.cache.get(url)
+            except httpx.HTTPError as e:
+                logger.warning(f"Proxy feed: gagal mengambil {url}: {e}")
+                await self._respond(writer, 502, "Bad Gateway"); return
+            if isinstance(result, int):
+                await self._respond(writer, result, "Upstream Error"); return
+            try:
+                f = await asyncio.to_thread(open, result, 'rb')
+            except FileNotFoundError:
+                await self._respond(writer, 404, "Not Found"); return  # Blob baru saja dihapus oleh kuota
+            try:
+                size = os.fstat(f.fileno()).st_size
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {size}\r\nContent-Type: application/octet-stream\r\nConnection: close\r\n\r\n".encode())
+                if request_line[0] == "GET":
+                    # sendfile() di kernel bila didukung, selain itu loop membaca file per chunk di executor
+                    await asyncio.get_running_loop().sendfile(writer.transport, f)
+                    self.cache.stats["bytes_served"] += size
+                await writer.drain()
+            finally:
+                f.close()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Proxy feed: error saat melayani request: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    def status_line(self) -> str:
+        if not self.base_url: return "Proxy feed: nonaktif"
+        count, total = self.cache.usage(); s = self.cache.stats
+        return (f"Proxy feed: {count} file ({total / 1048576:.0f}/{self.cache.quota / 1048576:.0f} MB), "
+                f"hit {s['hits']}, miss {s['misses']}, diunduh {s['bytes_fetched'] / 1048576:.1f} MB, dilayani {s['bytes_served'] / 1048576:.1f} MB")
+
+
+feed_proxy = FeedProxy(FeedCache())
@@ -3,37 +3,223 @@
 import json
 import logging
 import os
+import sqlite3
+import threading
 import time
 import uuid
 import shutil
 
-from config import HISTORY_DB_PATH
+from config import HISTORY_DB_PATH, HISTORY_JSON_PATH
+from .profile_index import invalidate as invalidate_profile_index
 
 logger = logging.getLogger(__name__)
 
-def load_history():
-    if not os.path.exists(HISTORY_DB_PATH):
-        return []
+# Kolom yang diangkat dari entri agar bisa diindeks; entri lengkap tetap disimpan sebagai JSON.
+_COLUMNS = ("id", "job_id", "timestamp", "build_mode", "version", "target", "subtarget", "profile", "ib_dir", "log_file")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id TEXT PRIMARY KEY,
+    job_id TEXT,
+    timestamp INTEGER NOT NULL,
+    build_mode TEXT,
+    version TEXT,
+    target TEXT,
+    subtarget TEXT,
+    profile TEXT,
+    ib_dir TEXT,
+    log_file TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_builds_timestamp ON builds (timestamp);
+CREATE INDEX IF NOT EXISTS idx_builds_job_id ON builds (job_id);
+CREATE INDEX IF NOT EXISTS idx_builds_ib_dir ON builds (ib_dir);
+CREATE INDEX IF NOT EXISTS idx_builds_target ON builds (target, subtarget);
+CREATE INDEX IF NOT EXISTS idx_builds_profile ON builds (profile);
+CREATE TABLE IF NOT EXISTS upload_cache (
+    sha256 TEXT PRIMARY KEY,
+    file_name TEXT,
+    size INTEGER,
+    data TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS build_logs (
+    job_id TEXT PRIMARY KEY,
+    chat_id INTEGER,
+    status TEXT NOT NULL,
+    log_file TEXT NOT NULL,
+    finished_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_build_logs_chat ON build_logs (chat_id, finished_at);
+CREATE TABLE IF NOT EXISTS build_cache (
+    fingerprint TEXT PRIMARY KEY,
+    build_id TEXT NOT NULL,
+    files TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+"""
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(HISTORY_DB_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(_SCHEMA)
+        _migrate_json(_conn)
+    return _conn
+
+
+def close_history_db():
+    global _conn
+    with _lock:
+        if _conn is not None: _conn.close(); _conn = None
+
+
+def _insert(conn, entry: dict):
+    row = [entry.get(c) for c in _COLUMNS] + [json.dumps(entry)]
+    conn.execute(f"INSERT OR REPLACE INTO builds ({', '.join(_COLUMNS)}, data) VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})", row)
+
+
+def _migrate_json(conn):
+    """Impor satu kali dari history.json lama; file lama diganti nama menjadi .bak setelah berhasil."""
+    json_path = HISTORY_JSON_PATH
+    if not os.path.exists(json_path): return
     try:
-        with open(HISTORY_DB_PATH, 'r') as f:
-            return json.load(f)
+        with open(json_path, 'r') as f: entries = json.load(f)
     except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Gagal membaca history.json: {e}. Mengembalikan list kosong.")
-        return []
+        logger.error(f"Gagal membaca {json_path} untuk migrasi: {e}")
+        return
+    conn.execute("BEGIN")
+    try:
+        # history.json menyimpan entri terbaru di depan, jadi impor dari belakang agar urutan rowid sama
+        for entry in reversed(entries):
+            if entry.get('id'): _insert(conn, dict(entry, timestamp=entry.get('timestamp', 0)))
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        conn.execute("ROLLBACK")
+        logger.error(f"Migrasi {json_path} ke SQLite gagal: {e}")
+        return
+    os.replace(json_path, json_path + ".bak")
+    logger.info(f"Migrasi histori: {len(entries)} entri dari {json_path} dipindah ke {HISTORY_DB_PATH}.")
+
+
+def _query(sql: str, params=()):
+    with _lock:
+        return [json.loads(row[0]) for row in _connect().execute(sql, params)]
+
+
+def list_history(offset: int = 0, limit: int = -1):
+    """Entri histori terbaru lebih dulu, dengan paginasi offset/limit."""
+    # OFFSET dijalankan di subquery yang cukup membaca indeks timestamp, baru kemudian data JSON diambil
+    return _query(
+        "SELECT data FROM builds WHERE rowid IN (SELECT rowid FROM builds ORDER BY timestamp DESC, rowid DESC LIMIT ? OFFSET ?) "
+        "ORDER BY timestamp DESC, rowid DESC", (limit, offset))
+
 
-def save_history(history_data):
+def count_history():
+    with _lock:
+        return _connect().execute("SELECT COUNT(*) FROM builds").fetchone()[0]
+
+
+def load_history():
+    return list_history()
+
+
+def find_entries(**filters):
+    """Mencari entri berdasarkan kolom terindeks, mis. find_entries(ib_dir=...) atau find_entries(target=..., profile=...)."""
+    unknown = set(filters) - set(_COLUMNS)
+    if unknown: raise ValueError(f"Kolom histori tidak dikenal: {', '.join(unknown)}")
+    where = " AND ".join(f"{c} = ?" for c in filters) or "1"
+    return _query(f"SELECT data FROM builds WHERE {where} ORDER BY timestamp DESC, rowid DESC", tuple(filters.values()))
+
+
+def latest_build_entry(with_log: bool = False):
+    rows = _query(f"SELECT data FROM builds {'WHERE log_file IS NOT NULL' if with_log else ''} ORDER BY timestamp DESC, rowid DESC LIMIT 1")
+    return rows[0] if rows else None
+
+
+def clear_history():
+    with _lock:
+        _connect().execute("DELETE FROM builds")
+        _connect().execute("DELETE FROM upload_cache")
+        _connect().execute("DELETE FROM build_cache")
+        _connect().execute("DELETE FROM build_logs")
+    history_repo.invalidate()
+
+
+def update_build_entry(build_id, **fields):
+    """Memperbarui field entri histori (mis. checksum / referensi upload) di database dan cache."""
+    entry = history_repo.get(build_id)
+    if entry is None: return False
+    entry.update(fields)
     try:
-        with open(HISTORY_DB_PATH, 'w') as f:
-            json.dump(history_data, f, indent=4)
+        with _lock: _insert(_connect(), entry)
         return True
-    except IOError as e:
-        logger.error(f"Gagal menyimpan history.json: {e}")
+    except sqlite3.Error as e:
+        logger.error(f"Gagal memperbarui entri histori {build_id}: {e}")
         return False
 
-def add_build_entry(config_data, firmware_files, ib_dir):
+
+def get_upload_ref(sha256: str):
+    """Referensi pesan Telegram untuk artefak dengan hash ini, dari build mana pun."""
+    with _lock:
+        row = _connect().execute("SELECT data FROM upload_cache WHERE sha256 = ?", (sha256,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_upload_ref(sha256: str, file_name: str, size: int, ref: dict):
+    with _lock:
+        _connect().execute("INSERT OR REPLACE INTO upload_cache (sha256, file_name, size, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                           (sha256, file_name, size, json.dumps(ref), int(time.time())))
+
+
+def drop_upload_ref(sha256: str):
+    with _lock:
+        _connect().execute("DELETE FROM upload_cache WHERE sha256 = ?", (sha256,))
+
+
+def get_cached_build(fingerprint: str):
+    """(build_id, {path: [size, mtime_ns]}) untuk build dengan fingerprint input ini, atau None."""
+    with _lock:
+        row = _connect().execute("SELECT build_id, files FROM build_cache WHERE fingerprint = ?", (fingerprint,)).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+def save_cached_build(fingerprint: str, build_id: str, files: dict):
+    with _lock:
+        _connect().execute("INSERT OR REPLACE INTO build_cache (fingerprint, build_id, files, created_at) VALUES (?, ?, ?, ?)",
+                           (fingerprint, build_id, json.dumps(files), int(time.time())))
+
+
+def record_build_log(job_id: str, chat_id: int, status: str, log_file: str):
+    """Mencatat log setiap job yang selesai (termasuk gagal/dibatalkan) agar /getlog tetap bisa setelah restart."""
+    try:
+        with _lock:
+            _connect().execute("INSERT OR REPLACE INTO build_logs (job_id, chat_id, status, log_file, finished_at) VALUES (?, ?, ?, ?, ?)",
+                               (job_id, chat_id, status, log_file, int(time.time())))
+    except sqlite3.Error as e:
+        logger.error(f"Gagal mencatat log job {job_id}: {e}")
+
+
+def get_build_log(job_id: str = None, chat_id: int = None):
+    """{job_id, status, log_file} untuk job tertentu, atau job terakhir di chat bila job_id kosong."""
+    sql = "SELECT job_id, status, log_file FROM build_logs " + ("WHERE job_id = ?" if job_id else "WHERE chat_id = ? ORDER BY finished_at DESC, rowid DESC LIMIT 1")
+    with _lock: row = _connect().execute(sql, (job_id or chat_id,)).fetchone()
+    return {"job_id": row[0], "status": row[1], "log_file": row[2]} if row else None
+
+
+def drop_cached_build(fingerprint: str):
+    with _lock:
+        _connect().execute("DELETE FROM build_cache WHERE fingerprint = ?", (fingerprint,))
+
+
+def add_build_entry(config_data, firmware_files, ib_dir, log_file=None, job_id=None):
     """Menambahkan entri baru ke dalam database histori menggunakan dictionary config."""
-    history = load_history()
-    
     files_to_store = {os.path.basename(path): path for path in firmware_files}
     new_entry_id = str(uuid.uuid4())
     
@@ -61,24 +247,38 @@ def add_build_entry(config_data, firmware_files, ib_dir):
 
         # Data umum
         "firmware_files": files_to_store,
-        "ib_dir": ib_dir
+        "manifest": config_data.get('manifest'),         # {paket: versi} dari .manifest Image Builder
+        "sha256sums": config_data.get('sha256sums'),     # Hash dari file sha256sums Image Builder
+        "sha256": config_data.get('sha256'),             # {nama_file: sha256} hasil fingerprint setelah build
+        "file_stats": config_data.get('file_stats'),     # {nama_file: [ukuran byte, mtime_ns]} saat sha256 dihitung
+        "checksum_mismatch": config_data.get('checksum_mismatch'),
+        "ib_dir": ib_dir,
+        "job_id": job_id,
+        "log_file": log_file
     }
     
     # Membersihkan entri dari kunci yang nilainya None atau kosong
     final_entry = {k: v for k, v in new_entry.items() if v is not None and v != ""}
 
-    history.insert(0, final_entry)
-    
-    if save_history(history):
+    try:
+        with _lock: _insert(_connect(), final_entry)
+        history_repo.on_added(final_entry)
         return new_entry_id
-    return None
+    except sqlite3.Error as e:
+        logger.error(f"Gagal menyimpan entri histori: {e}")
+        return None
+
+def find_build_entry(build_id):
+    """Mencari entri berdasarkan ID histori atau ID job build."""
+    return history_repo.get(build_id)
 
 def remove_build_entry(build_id):
-    history = load_history()
-    entry_to_delete = next((entry for entry in history if entry.get('id') == build_id), None)
+    rows = _query("SELECT data FROM builds WHERE id = ?", (build_id,))
+    entry_to_delete = rows[0] if rows else None
     if not entry_to_delete:
         return False
-    files_to_delete = entry_to_delete.get('firmware_files', {}).values()
+    files_to_delete = list(entry_to_delete.get('firmware_files', {}).values())
+    if entry_to_delete.get('log_file'): files_to_delete.append(entry_to_delete['log_file'])
     for f_path in files_to_delete:
         if os.path.exists(f_path):
             try:
@@ -86,8 +286,10 @@ def remove_build_entry(build_id):
                 logger.info(f"Menghapus file hasil compile: {f_path}")
             except OSError as e:
                 logger.error(f"Gagal menghapus file {f_path}: {e}")
-    history_after_deletion = [entry for entry in history if entry.get('id') != build_id]
-    save_history(history_after_deletion)
+    with _lock:
+        _connect().execute("DELETE FROM builds WHERE id = ?", (build_id,))
+        _connect().execute("DELETE FROM build_cache WHERE build_id = ?", (build_id,))
+    history_repo.on_removed(build_id)
     logger.info(f"Entri build dengan ID {build_id} berhasil dihapus dari histori.")
     return True
 
@@ -95,15 +297,83 @@ def remove_ib_directory_and_entries(ib_dir_to_delete):
     if os.path.isdir(ib_dir_to_delete):
         try:
             shutil.rmtree(ib_dir_to_delete)
+            invalidate_profile_index(ib_dir_to_delete)
             logger.info(f"Menghapus direktori Image Builder: {ib_dir_to_delete}")
         except OSError as e:
             logger.error(f"Gagal menghapus direktori {ib_dir_to_delete}: {e}")
             return False
-    history = load_history()
-    history_after_deletion = [
-        entry for entry in history 
-        if entry.get('ib_dir') != ib_dir_to_delete
-    ]
-    save_history(history_after_deletion)
+    with _lock:
+        _connect().execute("DELETE FROM build_cache WHERE build_id IN (SELECT id FROM builds WHERE ib_dir = ?)", (ib_dir_to_delete,))
+        _connect().execute("DELETE FROM builds WHERE ib_dir = ?", (ib_dir_to_delete,))
+    history_repo.invalidate()
     logger.info(f"Semua entri histori yang terkait dengan {ib_dir_to_delete} telah dihapus.")
     return True
+
+
+class HistoryRepository:
+    """
+    Salinan histori di memori untuk handler callback (arsip, upload, paginasi, chain).
+
+    Dimuat sekali dari database, lalu diperbarui langsung oleh add/remove; operasi massal
+    (hapus per direktori IB, hapus semua) cukup membuang cache agar dimuat ulang saat dibutuhkan.
+    Daftar file tiap entri sudah diurutkan sehingga indeks tombol selalu konsisten.
+    """
+    def __init__(self):
+        self._entries = None
+        self._order = None
+        self._job_ids = {}
+        self._files = {}
+
+    def _ensure_loaded(self):
+        if self._entries is not None: return
+        started = time.perf_counter()
+        entries = list_history()
+        self._entries = {e['id']: e for e in entries}
+        self._order = [e['id'] for e in entries]
+        self._job_ids = {e['job_id']: e['id'] for e in entries if e.get('job_id')}
+        self._files = {}
+        logger.info(f"Cache histori dimuat: {len(entries)} entri dalam {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    def invalidate(self):
+        self._entries = self._order = None
+        self._job_ids = {}; self._files = {}
+
+    def on_added(self, entry: dict):
+        if self._entries is None: return
+        self._entries[entry['id']] = entry; self._order.insert(0, entry['id'])
+        if entry.get('job_id'): self._job_ids[entry['job_id']] = entry['id']
+
+    def on_removed(self, build_id: str):
+        if self._entries is None: return
+        entry = self._entries.pop(build_id, None)
+        if entry is None: return
+        self._order.remove(build_id); self._files.pop(build_id, None)
+        if entry.get('job_id'): self._job_ids.pop(entry['job_id'], None)
+
+    def get(self, build_id: str):
+        """Entri berdasarkan ID histori atau ID job build."""
+        self._ensure_loaded()
+        return self._entries.get(build_id) or self._entries.get(self._job_ids.get(build_id))
+
+    def _sorted_files(self, build_id: str):
+        if build_id not in self._files:
+            files = (self.get(build_id) or {}).get('firmware_files', {})
+            self._files[build_id] = (sorted(files), sorted(files.values()))
+        return self._files[build_id]
+
+    def sorted_filenames(self, build_id: str):
+        return self._sorted_files(build_id)[0]
+
+    def sorted_file_paths(self, build_id: str):
+        return self._sorted_files(build_id)[1]
+
+    def page(self, offset: int, limit: int):
+        self._ensure_loaded()
+        return [self._entries[i] for i in self._order[offset:offset + limit]]
+
+    def count(self):
+        self._ensure_loaded()
+        return len(self._order)
+
+
+history_repo = HistoryRepository()
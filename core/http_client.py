@@ -0,0 +1,87 @@
+# core/http_client.py
+
+import logging
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL
+
+try:
+    import h2  # noqa: F401  (opsional, dari httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Satu client per host unduhan, dipakai ulang untuk semua scraping metadata rilis.
+_clients = {}
+_latency = {}
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(30.0),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=120.0),
+        follow_redirects=True,
+    )
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """Mengambil client ter-pool untuk host dari `url` (dibuat otomatis bila belum ada)."""
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _clients[host] = _new_client()
+        logger.info(f"HTTP client baru untuk {host} (HTTP/2: {'ya' if HTTP2_AVAILABLE else 'tidak'}).")
+    return client
+
+
+def _record(host: str, elapsed: float, ok: bool):
+    stats = _latency.setdefault(host, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+    stats["count"] += 1; stats["total"] += elapsed; stats["last"] = elapsed
+    stats["max"] = max(stats["max"], elapsed)
+    if not ok: stats["errors"] += 1
+
+
+async def fetch(url: str, **kwargs) -> httpx.Response:
+    """GET lewat client ter-pool sambil mencatat latensi per host. Status selain 2xx/304 dilempar sebagai error."""
+    host = _host(url); started = time.perf_counter(); ok = False
+    try:
+        response = await get_client(url).get(url, **kwargs)
+        if response.status_code != 304: response.raise_for_status()
+        ok = True
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        _record(host, elapsed, ok)
+        logger.debug(f"GET {url} selesai dalam {elapsed * 1000:.0f} ms (ok={ok}).")
+
+
+def latency_summary() -> str:
+    """Ringkasan latensi jaringan per host untuk panel /status."""
+    lines = []
+    for host, s in sorted(_latency.items()):
+        avg = s["total"] / s["count"] * 1000 if s["count"] else 0
+        lines.append(f"{host}: {s['count']} req, rata2 {avg:.0f} ms, maks {s['max'] * 1000:.0f} ms, error {s['errors']}")
+    return "\n".join(lines)
+
+
+async def init_http_clients():
+    """Dipanggil saat Application start agar koneksi siap sebelum menu pertama dibuka."""
+    for base_url in (OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL):
+        get_client(base_url)
+
+
+async def close_http_clients():
+    for host, client in list(_clients.items()):
+        try: await client.aclose()
+        except Exception as e: logger.warning(f"Gagal menutup HTTP client {host}: {e}")
+    _clients.clear()
@@ -0,0 +1,70 @@
+# core/index_parser.py
+
+import asyncio
+import html as html_lib
+import re
+from collections import namedtuple
+
+# Satu baris dari halaman autoindex. `size` dalam byte (None untuk direktori / "-"),
+# `date` adalah teks tanggal apa adanya dari server.
+IndexEntry = namedtuple("IndexEntry", ["href", "name", "size", "date"])
+
+# Di atas ukuran ini parsing dipindah ke thread agar event loop tidak tertahan.
+OFFLOAD_THRESHOLD = 64 * 1024
+
+_ANCHOR = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\']*)["\'][^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]*>')
+_SIZE = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?$', re.IGNORECASE)
+_NGINX_DETAILS = re.compile(r"^(.*\d{2}:\d{2}(?::\d{2})?)\s{2,}(\S+)$", re.DOTALL)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str):
+    """'7.4 MB' / '7.4M' / '7.4 MiB' / '123456' -> byte. '-' atau teks lain -> None."""
+    match = _SIZE.match(text.strip())
+    if not match: return None
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def _parse_details(tail: str):
+    """Mengambil ukuran & tanggal dari teks setelah </a> hingga anchor berikutnya."""
+    size = date = None
+    for fragment in _TAG.split(tail):
+        fragment = html_lib.unescape(fragment).strip()
+        if not fragment or fragment in ("-", "/"): continue
+        if size is None and (parsed := parse_size(fragment)) is not None:
+            size = parsed; continue
+        # Format nginx: "05-Apr-2024 20:12    123456" dalam satu fragmen
+        nginx = _NGINX_DETAILS.match(fragment)
+        if nginx:
+            fragment = nginx.group(1)
+            if size is None: size = parse_size(nginx.group(2))
+        if date is None: date = fragment
+    return size, date
+
+
+def _entry(page: str, match, tail_end: int) -> IndexEntry:
+    size, date = _parse_details(page[match.end():tail_end])
+    href = html_lib.unescape(match.group(1))
+    name = html_lib.unescape(_TAG.sub('', match.group(2))).strip()
+    return IndexEntry(href, name, size, date)
+
+
+def iter_index(page: str):
+    """Mengekstrak link (beserta ukuran & tanggal) dari halaman daftar direktori OpenWrt/ImmortalWrt satu per satu."""
+    previous = None
+    for match in _ANCHOR.finditer(page):
+        if previous is not None: yield _entry(page, previous, match.start())
+        previous = match
+    if previous is not None: yield _entry(page, previous, len(page))
+
+
+def parse_index(page: str):
+    return list(iter_index(page))
+
+
+async def parse_index_async(page: str):
+    """Seperti parse_index, tetapi halaman besar diparsing di thread terpisah."""
+    if len(page) > OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(parse_index, page)
+    return parse_index(page)
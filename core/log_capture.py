@@ -0,0 +1,141 @@
+# core/log_capture.py
+
+import asyncio
+import codecs
+import gzip
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+
+from config import BUILD_LOG_DIR, BUILD_LOG_RETENTION_DAYS, BUILD_LOG_MAX_FILES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAIL_CHARS = 8192
+LOG_EXTENSIONS = (".log", ".log.zst", ".log.gz")
+
+
+class _ZstdSink:
+    """
+    Menulis stream ke file .zst lewat binary `zstd` (sudah jadi prasyarat untuk IB .tar.zst).
+    Pipa ke zstd hanya ditulis oleh thread sendiri; write() cukup memasukkan ke antrean sehingga
+    event loop tidak ikut tertahan bila zstd lambat membaca.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._proc = subprocess.Popen(["zstd", "-q", "-f", "-3", "-o", path], stdin=subprocess.PIPE, bufsize=0)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._pump, name="zstd-log", daemon=True); self._thread.start()
+
+    def _pump(self):
+        broken = False
+        while (data := self._queue.get()) is not None:
+            if broken: continue  # Tetap dikuras agar antrean tidak menumpuk
+            try: self._proc.stdin.write(data)
+            except OSError as e: broken = True; logger.warning(f"Pipa zstd untuk {self.path} putus, sisa log tidak tersimpan: {e}")
+        try: self._proc.stdin.close()
+        except OSError: pass
+        self._proc.wait()
+
+    def write(self, data: bytes):
+        self._queue.put(data)
+
+    def flush(self):
+        pass  # Thread menulis tanpa buffer (bufsize=0) begitu data masuk antrean
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _open_sink(log_path: str, compress: bool):
+    """Mengembalikan (sink, path_akhir). zstd jika tersedia, gzip sebagai fallback."""
+    if compress and shutil.which("zstd"):
+        path = log_path + ".zst"; return _ZstdSink(path), path
+    if compress:
+        path = log_path + ".gz"; return gzip.open(path, 'ab'), path
+    return open(log_path, 'ab'), log_path
+
+
+class LogCapture:
+    """
+    Menampung output proses build.
+
+    Seluruh stream ditulis ke `log_path` (append-only, opsional dikompresi zstd), sedangkan di memori
+    hanya disimpan ekor log yang sudah di-decode secara inkremental dengan ukuran tetap
+    untuk tampilan Telegram dan pesan error.
+    """
+    def __init__(self, log_path: str = None, tail_chars: int = DEFAULT_TAIL_CHARS, compress: bool = False):
+        self.log_path = log_path
+        self.tail_chars = tail_chars
+        self.total_bytes = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self._pieces = deque()
+        self._tail_len = 0
+        self._file = None
+        if log_path:
+            log_dir = os.path.dirname(log_path)
+            if log_dir: os.makedirs(log_dir, exist_ok=True)
+            self._file, self.log_path = _open_sink(log_path, compress)
+
+    def feed(self, chunk: bytes):
+        if not chunk: return
+        self.total_bytes += len(chunk)
+        if self._file: self._file.write(chunk)
+        text = self._decoder.decode(chunk)
+        if not text: return
+        if len(text) > self.tail_chars: text = text[-self.tail_chars:]
+        self._pieces.append(text); self._tail_len += len(text)
+        while self._tail_len - len(self._pieces[0]) >= self.tail_chars:
+            self._tail_len -= len(self._pieces.popleft())
+
+    def tail(self, max_chars: int = None) -> str:
+        text = "".join(self._pieces)
+        if len(text) > self.tail_chars:
+            text = text[-self.tail_chars:]
+            self._pieces = deque([text]); self._tail_len = len(text)
+        return text[-max_chars:] if max_chars else text
+
+    def flush(self):
+        if self._file: self._file.flush()
+
+    def close(self):
+        rest = self._decoder.decode(b'', final=True)
+        if rest: self._pieces.append(rest); self._tail_len += len(rest)
+        if self._file:
+            try: self._file.close()
+            except OSError as e: logger.warning(f"Gagal menutup file log {self.log_path}: {e}")
+            self._file = None
+
+    async def aclose(self):
+        """close() di thread: menunggu zstd selesai menulis tanpa menahan event loop."""
+        await asyncio.to_thread(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def prune_build_logs(keep_paths=(), log_dir: str = BUILD_LOG_DIR, retention_days: int = BUILD_LOG_RETENTION_DAYS, max_files: int = BUILD_LOG_MAX_FILES):
+    """Menghapus log build yang kedaluwarsa atau melebihi kuota jumlah file."""
+    if not os.path.isdir(log_dir): return 0
+    keep = {os.path.abspath(p) for p in keep_paths if p}
+    entries = []
+    for entry in os.scandir(log_dir):
+        if entry.is_file() and entry.name.endswith(LOG_EXTENSIONS) and os.path.abspath(entry.path) not in keep:
+            entries.append((entry.stat().st_mtime, entry.path))
+    entries.sort(reverse=True)
+    cutoff = time.time() - retention_days * 86400
+    to_delete = [path for i, (mtime, path) in enumerate(entries) if mtime < cutoff or i >= max_files]
+    for path in to_delete:
+        try: os.remove(path)
+        except OSError as e: logger.warning(f"Gagal menghapus log lama {path}: {e}")
+    if to_delete: logger.info(f"Rotasi log: {len(to_delete)} file log lama dihapus.")
+    return len(to_delete)
@@ -0,0 +1,106 @@
+# core/metadata_cache.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from config import METADATA_CACHE_DIR, METADATA_CACHE_TTL
+from .http_client import fetch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 6 * 3600
+
+# Cache di memori di atas cache disk, agar hit tidak perlu membaca file.
+_memory = {}
+_revalidating = {}
+
+
+def _cache_path(url: str) -> str:
+    return os.path.join(METADATA_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+
+def _load(url: str):
+    if url in _memory: return _memory[url]
+    path = _cache_path(url)
+    if not os.path.exists(path): return None
+    try:
+        with open(path, 'r') as f: entry = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.warning(f"Entri cache {path} rusak, diabaikan: {e}")
+        return None
+    _memory[url] = entry
+    return entry
+
+
+def _store(url: str, entry: dict):
+    _memory[url] = entry
+    try:
+        os.makedirs(METADATA_CACHE_DIR, exist_ok=True)
+        path = _cache_path(url); tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f: json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        logger.warning(f"Gagal menulis cache metadata untuk {url}: {e}")
+
+
+async def _refresh(url: str, kind: str, entry: dict = None) -> dict:
+    """GET kondisional (ETag / If-Modified-Since). 304 hanya memperbarui waktu fetch."""
+    headers = {}
+    if entry:
+        if entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+    response = await fetch(url, headers=headers)
+    if response.status_code == 304 and entry:
+        entry = dict(entry, fetched_at=time.time())
+        logger.debug(f"Cache {kind} untuk {url} masih valid (304).")
+    else:
+        entry = {
+            "url": url, "kind": kind, "fetched_at": time.time(), "body": response.text,
+            "etag": response.headers.get('etag'), "last_modified": response.headers.get('last-modified'),
+        }
+    _store(url, entry)
+    return entry
+
+
+async def _background_refresh(url: str, kind: str, entry: dict):
+    try:
+        await _refresh(url, kind, entry)
+    except httpx.HTTPError as e:
+        logger.warning(f"Revalidasi latar belakang {url} gagal, tetap memakai data lama: {e}")
+    finally:
+        _revalidating.pop(url, None)
+
+
+async def get_text(url: str, kind: str) -> str:
+    """
+    Mengembalikan isi `url` dari cache metadata.
+
+    Entri segar (umur < TTL per jenis) langsung dikembalikan. Entri basi juga langsung
+    dikembalikan sementara revalidasi berjalan di latar belakang (stale-while-revalidate).
+    Hanya cache miss yang menunggu jaringan; error jaringan pada miss diteruskan ke pemanggil.
+    """
+    entry = _load(url)
+    if entry is None:
+        return (await _refresh(url, kind))['body']
+    ttl = METADATA_CACHE_TTL.get(kind, DEFAULT_TTL)
+    if time.time() - entry.get('fetched_at', 0) > ttl and url not in _revalidating:
+        _revalidating[url] = asyncio.create_task(_background_refresh(url, kind, entry))
+    return entry['body']
+
+
+def invalidate(url: str = None):
+    """Membuang satu entri (atau seluruh cache bila `url` None)."""
+    urls = [url] if url else list(_memory.keys())
+    for u in urls: _memory.pop(u, None)
+    if url:
+        path = _cache_path(url)
+        if os.path.exists(path): os.remove(path)
+    elif os.path.isdir(METADATA_CACHE_DIR):
+        for name in os.listdir(METADATA_CACHE_DIR):
+            os.remove(os.path.join(METADATA_CACHE_DIR, name))
@@ -2,40 +2,35 @@
 
 import os
 import logging
+import json
 import re
 from collections import defaultdict
-import asyncio
 
 import httpx
-from bs4 import BeautifulSoup
+
+from .metadata_cache import get_text
+from .index_parser import parse_index_async
+from .profile_index import get_profile_index
+from .checksum import parse_sha256sums
 
 logger = logging.getLogger(__name__)
 
-# Cache sekarang perlu membedakan sumber
-version_cache = {}
-target_cache = {}
+# Pattern untuk openwrt-imagebuilder atau immortalwrt-imagebuilder
+IB_PATTERN = re.compile(r'^(openwrt|immortalwrt)-imagebuilder-.*(\.tar\.xz|\.tar\.zst)$')
 
 
 async def scrape_openwrt_versions(base_url: str):
-    """Mengambil dan meng-cache versi dari base_url yang diberikan."""
-    global version_cache
-    # Gunakan base_url sebagai kunci cache
-    if base_url in version_cache:
-        return version_cache[base_url]
-    
+    """Mengambil versi dari base_url yang diberikan (lewat cache metadata)."""
     versions = defaultdict(list)
     url = f"{base_url}/releases/"
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        html = await get_text(url, "versions")
         
-        soup = BeautifulSoup(response.text, 'lxml')
         # Pattern yang lebih umum untuk mencakup OpenWrt & ImmortalWrt
         version_pattern = re.compile(r'^\d{2}\.\d{2}(\.\d+)?(-rc\d)?.*\/$')
         
-        for link in soup.find_all('a'):
-            href = link.get('href')
+        for entry in await parse_index_async(html):
+            href = entry.href
             if href and version_pattern.match(href):
                 version_str = href.strip('/')
                 major_series = ".".join(version_str.split('.')[:2])
@@ -44,10 +39,9 @@ async def scrape_openwrt_versions(base_url: str):
         for key in versions:
             versions[key].sort(key=lambda v: list(map(int, re.findall(r'\d+', v))), reverse=True)
             
-        # Simpan ke cache menggunakan base_url sebagai kunci
-        version_cache[base_url] = dict(sorted(versions.items(), reverse=True))
-        logger.info(f"Berhasil mengambil dan mem-cache {len(version_cache[base_url])} seri rilis dari {base_url}.")
-        return version_cache[base_url]
+        result = dict(sorted(versions.items(), reverse=True))
+        logger.info(f"Berhasil mengambil {len(result)} seri rilis dari {base_url}.")
+        return result
         
     except (httpx.RequestError, httpx.TimeoutException) as e:
         logger.error(f"Gagal mengambil daftar versi dari {url}: {e}")
@@ -55,26 +49,18 @@ async def scrape_openwrt_versions(base_url: str):
 
 async def scrape_targets_for_version(version: str, base_url: str):
     """Mengambil target untuk versi spesifik dari base_url."""
-    cache_key = f"{base_url}_{version}"
-    if cache_key in target_cache:
-        return target_cache[cache_key]
-        
     targets = []
     url = f"{base_url}/releases/{version}/targets/"
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        html = await get_text(url, "targets")
             
-        soup = BeautifulSoup(response.text, 'lxml')
-        for link in soup.find_all('a'):
-            href = link.get('href')
+        for entry in await parse_index_async(html):
+            href = entry.href
             if href.endswith('/') and not href.startswith('?') and '..' not in href:
                 target_name = href.strip('/')
                 if target_name and 'sha256sums' not in target_name:
                     targets.append(target_name)
                     
-        target_cache[cache_key] = sorted(targets)
         logger.info(f"Berhasil mengambil {len(targets)} target untuk v{version} dari {base_url}.")
         return sorted(targets)
         
@@ -87,13 +73,10 @@ async def scrape_subtargets_for_target(version: str, target: str, base_url: str)
     subtargets = []
     url = f"{base_url}/releases/{version}/targets/{target}/"
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        html = await get_text(url, "subtargets")
             
-        soup = BeautifulSoup(response.text, 'lxml')
-        for link in soup.find_all('a'):
-            href = link.get('href')
+        for entry in await parse_index_async(html):
+            href = entry.href
             if href.endswith('/') and not href.startswith('?'):
                 subtarget_name = href.strip('/')
                 if subtarget_name and subtarget_name != '..':
@@ -113,18 +96,12 @@ async def find_imagebuilder_url_and_name(version: str, target: str, subtarget: s
     full_base_url = "/".join(filter(None, path_parts)) + "/"
     
     try:
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            response = await client.get(full_base_url)
-            response.raise_for_status()
+        html = await get_text(full_base_url, "imagebuilder")
             
-        soup = BeautifulSoup(response.text, 'lxml')
-        # Pattern untuk openwrt-imagebuilder atau immortalwrt-imagebuilder
-        ib_pattern = re.compile(r'^(openwrt|immortalwrt)-imagebuilder-.*(\.tar\.xz|\.tar\.zst)$')
-        
-        for link in soup.find_all('a'):
-            href = link.get('href')
-            if href and ib_pattern.match(href):
-                logger.info(f"Ditemukan file Image Builder: {href} di {full_base_url}")
+        for entry in await parse_index_async(html):
+            href = entry.href
+            if href and IB_PATTERN.match(href):
+                logger.info(f"Ditemukan file Image Builder: {href} ({entry.size or '?'} byte) di {full_base_url}")
                 return full_base_url + href, href
                 
         logger.warning(f"Tidak ada file Image Builder yang ditemukan di {full_base_url}")
@@ -134,31 +111,68 @@ async def find_imagebuilder_url_and_name(version: str, target: str, subtarget: s
         logger.error(f"Gagal mengakses halaman target {full_base_url}: {e}")
         return None, None
 
+async def fetch_sha256sums(dir_url: str):
+    """Mengambil file `sha256sums` dari direktori rilis dan mengembalikan {nama_file: hash}."""
+    url = dir_url.rstrip('/') + "/sha256sums"
+    try:
+        return parse_sha256sums(await get_text(url, "sha256sums"))
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        logger.warning(f"Gagal mengambil sha256sums dari {url}: {e}")
+        return {}
+
+def _profile_description(titles):
+    """Menggabungkan `titles` profiles.json menjadi satu nama perangkat yang bisa dibaca."""
+    names = []
+    for title in titles or []:
+        name = title.get("title") or " ".join(filter(None, [title.get("vendor"), title.get("model"), title.get("variant")]))
+        if name: names.append(name)
+    return " / ".join(names)
+
+async def fetch_profiles_json(version: str, target: str, subtarget: str, base_url: str):
+    """
+    Mengambil `profiles.json` milik target/subtarget (lewat cache metadata) dan menormalkannya ke
+    bentuk yang sama dengan indeks profil Image Builder, sehingga profil bisa dipilih & divalidasi
+    sebelum Image Builder diunduh. None bila rilis tidak menerbitkan profiles.json.
+    """
+    path_parts = [base_url, "releases", version, "targets", target, subtarget]
+    url = "/".join(filter(None, path_parts)) + "/profiles.json"
+    try:
+        data = json.loads(await get_text(url, "profiles"))
+    except httpx.HTTPStatusError as e:
+        logger.info(f"profiles.json tidak tersedia di {url} ({e.response.status_code}).")
+        return None
+    except (httpx.RequestError, json.JSONDecodeError) as e:
+        logger.warning(f"Gagal mengambil profiles.json dari {url}: {e}")
+        return None
+    profiles = {}
+    for name, info in (data.get("profiles") or {}).items():
+        profiles[name] = {
+            "description": _profile_description(info.get("titles")),
+            "packages": info.get("device_packages", []),
+            "images": [img.get("name") for img in info.get("images", []) if img.get("name")],
+        }
+    logger.info(f"profiles.json {target}/{subtarget}: {len(profiles)} profil.")
+    return {"default_packages": data.get("default_packages", []), "arch_packages": data.get("arch_packages"), "profiles": profiles}
+
+async def get_target_profiles(version: str, target: str, subtarget: str, base_url: str, ib_dir: str = None):
+    """Daftar nama profil: dari Image Builder bila sudah diekstrak, selain itu dari profiles.json."""
+    if ib_dir and os.path.isdir(ib_dir):
+        return await get_device_profiles(ib_dir)
+    metadata = await fetch_profiles_json(version, target, subtarget, base_url)
+    return sorted(metadata["profiles"]) if metadata else None
+
 async def get_device_profiles(ib_dir: str):
-    """Mengambil profil perangkat dari direktori Image Builder yang diekstrak."""
+    """Mengambil profil perangkat dari direktori Image Builder yang diekstrak (lewat indeks profil ter-cache)."""
     if not os.path.isdir(ib_dir):
         logger.error(f"Direktori Image Builder tidak ditemukan: {ib_dir}")
         return None
         
-    profiles = []
-    command = f"make -C {ib_dir} info"
     try:
-        process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            logger.error(f"Gagal menjalankan 'make info': {stderr.decode()}")
-            return None
-            
-        # Logika parsing output 'make info'
-        for line in stdout.decode().splitlines():
-            if ':' in line and not line.startswith(' '):
-                profile_name = line.split(':')[0].strip()
-                if profile_name and 'Default' not in profile_name:
-                    profiles.append(profile_name)
-                    
+        index = await get_profile_index(ib_dir)
+        if index is None: return None
+        profiles = sorted(index["profiles"])
         logger.info(f"Ditemukan {len(profiles)} profil perangkat.")
-        return sorted(profiles)
+        return profiles
         
     except Exception as e:
         logger.error(f"Error saat mengambil profil perangkat: {e}")
@@ -0,0 +1,239 @@
+# core/package_db.py
+
+import asyncio
+import difflib
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from config import PACKAGE_DB_PATH, PACKAGE_DB_TTL
+from .http_client import fetch
+from .openwrt_api import fetch_profiles_json
+from .package_feeds import parse_packages_index, parse_feed_urls, split_depends, split_package_list, local_packages
+
+logger = logging.getLogger(__name__)
+
+# Feed per-arsitektur standar OpenWrt/ImmortalWrt di bawah releases/<versi>/packages/<arch>/.
+ARCH_FEEDS = ("base", "luci", "packages", "routing", "telephony")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    package_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS packages (
+    feed TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT,
+    depends TEXT,
+    filename TEXT,
+    PRIMARY KEY (feed, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_packages_name ON packages (name);
+CREATE TABLE IF NOT EXISTS provides (
+    feed TEXT NOT NULL,
+    name TEXT NOT NULL,
+    package TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_provides_name ON provides (name);
+CREATE TABLE IF NOT EXISTS depends (
+    feed TEXT NOT NULL,
+    package TEXT NOT NULL,
+    dep TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_depends_dep ON depends (dep);
+CREATE INDEX IF NOT EXISTS idx_depends_package ON depends (feed, package);
+"""
+
+
+class PackageDB:
+    """
+    Database paket lokal dari indeks Packages tiap feed (SQLite). Menyimpan hanya nama, versi,
+    dependensi, dan provides, dengan indeks agar validasi daftar paket cukup beberapa query.
+    """
+    def __init__(self, path: str = PACKAGE_DB_PATH, ttl: int = PACKAGE_DB_TTL):
+        self.path = path; self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+        self._feed_locks = {}
+        self._names = {}
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _query(self, sql: str, params=()):
+        with self._lock: return self._db().execute(sql, params).fetchall()
+
+    def store_feed(self, url: str, entries: list):
+        """Mengganti isi satu feed dalam satu transaksi."""
+        with self._lock:
+            conn = self._db(); conn.execute("BEGIN")
+            try:
+                for table in ("packages", "provides", "depends"): conn.execute(f"DELETE FROM {table} WHERE feed = ?", (url,))
+                conn.executemany("INSERT OR IGNORE INTO packages (feed, name, version, depends, filename) VALUES (?, ?, ?, ?, ?)",
+                                 [(url, e["Package"], e.get("Version"), e.get("Depends"), e.get("Filename")) for e in entries])
+                conn.executemany("INSERT INTO provides (feed, name, package) VALUES (?, ?, ?)",
+                                 [(url, p[0], e["Package"]) for e in entries for p in split_depends(e.get("Provides", ""))])
+                conn.executemany("INSERT INTO depends (feed, package, dep) VALUES (?, ?, ?)",
+                                 [(url, e["Package"], alt) for e in entries for group in split_depends(e.get("Depends", "")) for alt in group])
+                conn.execute("INSERT OR REPLACE INTO feeds (url, fetched_at, package_count) VALUES (?, ?, ?)", (url, time.time(), len(entries)))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK"); raise
+        self._names.clear()
+
+    def _is_fresh(self, url: str) -> bool:
+        rows = self._query("SELECT fetched_at FROM feeds WHERE url = ?", (url,))
+        return bool(rows) and time.time() - rows[0][0] < self.ttl
+
+    async def _refresh_feed(self, url: str) -> bool:
+        lock = self._feed_locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            if self._is_fresh(url): return True
+            try:
+                response = await fetch(url.rstrip('/') + "/Packages.gz")
+                text = await asyncio.to_thread(lambda: gzip.decompress(response.content).decode('utf-8', errors='ignore'))
+                entries = await asyncio.to_thread(parse_packages_index, text)
+            except (httpx.HTTPError, OSError, EOFError) as e:
+                logger.warning(f"Indeks paket {url} gagal diperbarui: {e}")
+                return bool(self._query("SELECT 1 FROM feeds WHERE url = ?", (url,)))  # Data lama masih bisa dipakai
+            await asyncio.to_thread(self.store_feed, url, entries)
+            logger.info(f"Database paket: {len(entries)} paket dari {url}.")
+            return True
+
+    async def ensure_feeds(self, urls) -> bool:
+        """Memperbarui feed yang basi secara paralel. True bila semua feed punya data."""
+        results = await asyncio.gather(*(self._refresh_feed(u) for u in urls))
+        return all(results)
+
+    def _lookup(self, feeds, name: str):
+        """Nama paket yang memenuhi `name` (langsung atau lewat Provides) di salah satu `feeds`, atau None."""
+        marks = ",".join("?" * len(feeds))
+        row = self._query(f"SELECT name FROM packages WHERE name = ? AND feed IN ({marks}) LIMIT 1", (name, *feeds))
+        if row: return row[0][0]
+        row = self._query(f"SELECT package FROM provides WHERE name = ? AND feed IN ({marks}) LIMIT 1", (name, *feeds))
+        return row[0][0] if row else None
+
+    def _depends(self, feeds, package: str) -> list:
+        marks = ",".join("?" * len(feeds))
+        row = self._query(f"SELECT depends FROM packages WHERE name = ? AND feed IN ({marks}) LIMIT 1", (package, *feeds))
+        return split_depends(row[0][0]) if row and row[0][0] else []
+
+    def suggest(self, feeds, name: str, limit: int = 3) -> list:
+        """Nama paket yang mirip (untuk salah ketik)."""
+        key = tuple(feeds)
+        if key not in self._names:
+            marks = ",".join("?" * len(feeds))
+            self._names[key] = sorted({r[0] for r in self._query(f"SELECT DISTINCT name FROM packages WHERE feed IN ({marks})", key)})
+        names = self._names[key]
+        prefixed = [n for n in names if n.startswith(name) and n != name][:limit]
+        return (prefixed + [n for n in difflib.get_close_matches(name, names, n=limit, cutoff=0.7) if n not in prefixed])[:limit]
+
+    def check(self, feeds, packages: str) -> dict:
+        """
+        Memeriksa daftar paket (format CUSTOM_PACKAGES) terhadap `feeds`. Mengembalikan
+        {"unknown": {nama: [saran]}, "broken": {paket: [dependensi yang tidak ada]}}.
+        """
+        wanted, removed = split_package_list(packages)
+        unknown, broken, seen = {}, {}, set()
+        queue = [(name, None) for name in sorted(wanted)]
+        while queue:
+            name, parent = queue.pop()
+            if name in removed: continue
+            package = self._lookup(feeds, name)
+            if package is None:
+                if parent is None: unknown[name] = self.suggest(feeds, name)
+                else: broken.setdefault(parent, []).append(name)
+                continue
+            if package in seen: continue
+            seen.add(package)
+            for group in self._depends(feeds, package):
+                choice = next((alt for alt in group if self._lookup(feeds, alt)), None)
+                if choice is None: broken.setdefault(package, []).append(" | ".join(group))
+                else: queue.append((choice, package))
+        return {"unknown": unknown, "broken": broken}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None: self._conn.close(); self._conn = None
+
+
+package_db = PackageDB()
+
+
+def _local_feed_key(ib_dir: str) -> str:
+    return "local:" + os.path.abspath(os.path.join(ib_dir, "packages"))
+
+
+async def feeds_for_config(conf: dict, base_url: str, ib_dir: str = None):
+    """
+    URL feed untuk konfigurasi Build Resmi: dari repositories.conf asli Image Builder bila sudah
+    diekstrak, jika belum diturunkan dari profiles.json (arch_packages). Ditambah CUSTOM_REPOS.
+    None bila feed tidak dapat ditentukan.
+    """
+    version, target, subtarget = conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET")
+    if not (version and target): return None
+    urls, arch = [], None
+    conf_path = os.path.join(ib_dir, "repositories.conf") if ib_dir else None
+    if conf_path and os.path.exists(conf_path + ".orig"): conf_path += ".orig"
+    if conf_path and os.path.exists(conf_path):
+        with open(conf_path, 'r') as f: content = f.read()
+        urls = [url for _, url in parse_feed_urls(content)]
+        match = re.search(r'packages/([\w.-]+)/base', content)
+        if match: arch = match.group(1)
+    if not urls:
+        profiles = await fetch_profiles_json(version, target, subtarget, base_url)
+        arch = (profiles or {}).get("arch_packages")
+        if not arch: return None
+        target_dir = "/".join(filter(None, [base_url, "releases", version, "targets", target, subtarget]))
+        urls = [f"{target_dir}/packages"] + [f"{base_url}/releases/{version}/packages/{arch}/{feed}" for feed in ARCH_FEEDS]
+    arch_key = f"{conf.get('BUILD_SOURCE', 'openwrt')}_{target}_{subtarget or 'default'}"
+    package_arch = arch or (f"{target}/{subtarget}" if subtarget else target)
+    for repo_url in conf.get("CUSTOM_REPOS", {}).get(arch_key, "").splitlines():
+        if repo_url.strip(): urls.append(repo_url.strip().replace("{arch}", package_arch))
+    return urls
+
+
+async def validate_package_set(conf: dict, base_url: str, ib_dir: str = None):
+    """
+    Validasi cepat CUSTOM_PACKAGES sebelum build. Mengembalikan hasil PackageDB.check, atau None
+    bila validasi tidak bisa dilakukan (feed tidak diketahui / gagal diambil) agar build tidak diblokir.
+    """
+    packages = conf.get("CUSTOM_PACKAGES", "")
+    if not packages.strip(): return {"unknown": {}, "broken": {}}
+    try:
+        urls = await feeds_for_config(conf, base_url, ib_dir)
+        if not urls or not await package_db.ensure_feeds(urls): return None
+        if ib_dir and os.path.isdir(os.path.join(ib_dir, "packages")):
+            # .ipk yang diunggah pengguna ikut dihitung sebagai feed lokal
+            local_key = _local_feed_key(ib_dir)
+            await asyncio.to_thread(package_db.store_feed, local_key, local_packages(ib_dir))
+            urls = urls + [local_key]
+        return await asyncio.to_thread(package_db.check, urls, packages)
+    except sqlite3.Error as e:
+        logger.error(f"Database paket error, validasi dilewati: {e}")
+        return None
+
+
+def format_package_problems(result: dict) -> str:
+    """Pesan Markdown untuk hasil validate_package_set; string kosong bila tidak ada masalah."""
+    if not result or not (result["unknown"] or result["broken"]): return ""
+    lines = []
+    for name, suggestions in sorted(result["unknown"].items()):
+        hint = f" (maksud Anda: {', '.join(f'`{s}`' for s in suggestions)}?)" if suggestions else ""
+        lines.append(f"• `{name}` tidak ditemukan{hint}")
+    for package, deps in sorted(result["broken"].items()):
+        lines.append(f"• `{package}` butuh {', '.join(f'`{d}`' for d in deps)} yang tidak tersedia")
+    return "\n".join(lines)
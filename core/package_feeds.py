@@ -0,0 +1,229 @@
+# core/package_feeds.py
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import re
+import time
+
+import httpx
+
+from config import PREFETCH_CONCURRENCY
+from .http_client import fetch
+
+logger = logging.getLogger(__name__)
+
+_SRC_LINE = re.compile(r'^\s*src/gz\s+(\S+)\s+(https?://\S+)', re.MULTILINE)
+_DEP_NAME = re.compile(r'^\s*([^\s(]+)')
+_OPKG_CACHE_ARG = re.compile(r'--cache\s+(\S+)')
+# Field Packages yang disimpan; sisanya (Description, License, ...) tidak diperlukan.
+_FIELDS = ("Package", "Version", "Depends", "Provides", "Filename", "Size", "SHA256sum", "Architecture")
+
+
+def parse_packages_index(text: str) -> list:
+    """Mem-parsing isi file `Packages` opkg menjadi list dict per paket (hanya field yang dipakai)."""
+    packages, current = [], {}
+    for line in text.splitlines():
+        if not line.strip():
+            if current.get("Package"): packages.append(current)
+            current = {}; continue
+        if line[0] in ' \t': continue  # Lanjutan Description
+        key, sep, value = line.partition(':')
+        if sep and key in _FIELDS: current[key] = value.strip()
+    if current.get("Package"): packages.append(current)
+    return packages
+
+
+def split_depends(value: str) -> list:
+    """'libc, a (>= 1) | b, c' -> [['libc'], ['a', 'b'], ['c']] (tiap grup adalah alternatif)."""
+    groups = []
+    for group in (value or "").split(','):
+        names = [m.group(1) for alt in group.split('|') if (m := _DEP_NAME.match(alt))]
+        if names: groups.append(names)
+    return groups
+
+
+def split_package_list(value: str):
+    """'a -b c' -> ({'a', 'c'}, {'b'}): paket diminta dan paket yang dikeluarkan."""
+    wanted, removed = set(), set()
+    for token in (value or "").split():
+        if token.startswith('-'): removed.add(token[1:])
+        else: wanted.add(token)
+    return wanted, removed
+
+
+class FeedIndex:
+    """Indeks paket dari satu atau lebih feed: nama -> entri, serta provides -> nama paket."""
+    def __init__(self):
+        self.packages = {}
+        self.provides = {}
+
+    def add(self, entries, feed_url: str = None, local: bool = False):
+        for entry in entries:
+            name = entry["Package"]
+            if name in self.packages: continue  # Feed yang disebut lebih dulu menang, seperti urutan repositories.conf
+            entry = dict(entry, feed=feed_url, local=local)
+            self.packages[name] = entry
+            for provided in split_depends(entry.get("Provides", "")):
+                self.provides.setdefault(provided[0], []).append(name)
+
+    def find(self, name: str):
+        """Entri untuk `name`, langsung atau lewat Provides (mis. libc, kmod virtual)."""
+        if name in self.packages: return self.packages[name]
+        for provider in self.provides.get(name, []):
+            if provider in self.packages: return self.packages[provider]
+        return None
+
+    def resolve(self, names, removed=()):
+        """
+        Penutupan dependensi dari `names`. Mengembalikan (entri terurut, nama yang tidak ditemukan).
+        Untuk dependensi alternatif `a | b` dipilih yang pertama tersedia.
+        """
+        resolved, missing, queue = {}, set(), list(names)
+        removed = set(removed)
+        while queue:
+            name = queue.pop()
+            if name in removed: continue
+            entry = self.find(name)
+            if entry is None: missing.add(name); continue
+            if entry["Package"] in resolved: continue
+            resolved[entry["Package"]] = entry
+            for group in split_depends(entry.get("Depends", "")):
+                choice = next((alt for alt in group if self.find(alt)), group[0])
+                queue.append(choice)
+        return [resolved[n] for n in sorted(resolved)], missing
+
+
+def parse_feed_urls(content: str) -> list:
+    """Daftar (nama, url) feed http(s) dari isi repositories.conf."""
+    return _SRC_LINE.findall(content)
+
+
+def feed_urls(ib_dir: str) -> list:
+    """Daftar (nama, url) feed dari repositories.conf Image Builder (sudah termasuk proxy/custom repo)."""
+    path = os.path.join(ib_dir, "repositories.conf")
+    if not os.path.exists(path): return []
+    with open(path, 'r') as f: return parse_feed_urls(f.read())
+
+
+async def fetch_feed(url: str) -> list:
+    """Mengunduh dan mem-parsing Packages.gz satu feed."""
+    response = await fetch(url.rstrip('/') + "/Packages.gz")
+    text = await asyncio.to_thread(lambda: gzip.decompress(response.content).decode('utf-8', errors='ignore'))
+    return await asyncio.to_thread(parse_packages_index, text)
+
+
+def local_packages(ib_dir: str) -> list:
+    """Paket .ipk yang sudah ada di direktori `packages/` Image Builder (feed lokal `imagebuilder`)."""
+    entries = []
+    packages_dir = os.path.join(ib_dir, "packages")
+    if not os.path.isdir(packages_dir): return entries
+    index_path = os.path.join(packages_dir, "Packages")
+    if os.path.exists(index_path):
+        # Indeks lokal dari `make package_index` juga memuat Depends
+        with open(index_path, 'r', errors='ignore') as f: entries = parse_packages_index(f.read())
+    known = {e.get("Filename") for e in entries}
+    with os.scandir(packages_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".ipk") and entry.name not in known: entries.append({"Package": entry.name.split('_', 1)[0], "Filename": entry.name})
+    return entries
+
+
+async def load_feed_index(ib_dir: str) -> FeedIndex:
+    """FeedIndex dari paket lokal IB lalu semua feed di repositories.conf (diambil paralel)."""
+    index = FeedIndex()
+    index.add(local_packages(ib_dir), local=True)
+    feeds = feed_urls(ib_dir)
+    results = await asyncio.gather(*(fetch_feed(url) for _, url in feeds), return_exceptions=True)
+    for (name, url), result in zip(feeds, results):
+        if isinstance(result, Exception): logger.warning(f"Indeks feed {name} ({url}) gagal diambil: {result}"); continue
+        index.add(result, feed_url=url)
+    return index
+
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def package_url(entry: dict) -> str:
+    """URL .ipk persis seperti yang dibentuk opkg: `<url src di repositories.conf>/<Filename>`."""
+    return f"{entry['feed']}/{entry['Filename']}"
+
+
+def opkg_cache_path(cache_dir: str, url: str) -> str:
+    """Path entri cache opkg (`--cache`) untuk `url`: seluruh URL dengan '/' diganti ',' (get_cache_location di opkg)."""
+    return os.path.join(cache_dir, url.replace('/', ','))
+
+
+def opkg_cache_dir(ib_dir: str):
+    """Direktori `--cache` opkg yang dipakai Makefile Image Builder, atau None bila IB tidak memakai cache opkg."""
+    path = os.path.join(ib_dir, "Makefile")
+    if not os.path.exists(path): return None
+    with open(path, 'r', errors='ignore') as f: match = _OPKG_CACHE_ARG.search(f.read())
+    if not match: return None
+    value = match.group(1)
+    if value == "$(DL_DIR)": return os.path.join(ib_dir, "dl")  # DL_DIR bawaan IB: $(TOPDIR)/dl
+    return None if '$' in value else os.path.join(ib_dir, value)
+
+
+async def _download_package(entry: dict, dest_dir: str, semaphore: asyncio.Semaphore):
+    """Mengunduh satu .ipk ke cache opkg `dest_dir`, diverifikasi dengan SHA256sum dari indeks. Mengembalikan (byte, durasi)."""
+    url = package_url(entry)
+    async with semaphore:
+        started = time.perf_counter()
+        response = await fetch(url)
+        elapsed = time.perf_counter() - started
+    data = response.content
+    expected = entry.get("SHA256sum")
+    if expected and await asyncio.to_thread(_sha256_bytes, data) != expected:
+        raise ValueError(f"sha256 {entry['Filename']} tidak cocok dengan indeks feed")
+    path = opkg_cache_path(dest_dir, url)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f: f.write(data)
+    os.replace(tmp_path, path)
+    return len(data), elapsed
+
+
+async def prefetch_packages(ib_dir: str, requested: str, profile_packages=(), progress_callback=None, concurrency: int = PREFETCH_CONCURRENCY):
+    """
+    Menyelesaikan penutupan dependensi `requested` (+ paket bawaan profil) dari indeks feed lalu
+    mengunduh .ipk yang belum ada secara paralel ke cache opkg Image Builder (`--cache`, biasanya `dl/`)
+    dengan nama entri yang dicari opkg untuk URL feed di repositories.conf (termasuk URL proxy), sehingga
+    `make image` menyalinnya dari cache alih-alih mengunduh satu per satu. None bila IB tidak memakai cache opkg.
+    Mengembalikan ringkasan {resolved, downloaded, bytes, missing, failed, elapsed, saved}; `saved` adalah
+    selisih total waktu unduhan per file (perkiraan bila berurutan) dengan waktu unduh paralel.
+    """
+    dest_dir = opkg_cache_dir(ib_dir)
+    if not dest_dir:
+        logger.info(f"Prefetch paket dilewati: Makefile {ib_dir} tidak memakai cache opkg (--cache)."); return None
+    started = time.perf_counter()
+    wanted, removed = split_package_list(requested)
+    base_wanted, base_removed = split_package_list(" ".join(profile_packages))
+    index = await load_feed_index(ib_dir)
+    entries, missing = index.resolve(wanted | base_wanted, removed | (base_removed - wanted))
+    os.makedirs(dest_dir, exist_ok=True)
+    todo = [e for e in entries if not e["local"] and e.get("Filename") and e.get("feed")
+            and not os.path.exists(opkg_cache_path(dest_dir, package_url(e)))]
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0; total_bytes = 0; sequential = 0.0; failed = []
+
+    async def download(entry):
+        nonlocal done, total_bytes, sequential
+        try:
+            size, elapsed = await _download_package(entry, dest_dir, semaphore)
+            total_bytes += size; sequential += elapsed
+        except (httpx.HTTPError, ValueError, OSError) as e:
+            failed.append(entry["Package"]); logger.warning(f"Prefetch {entry['Package']} gagal: {e}")
+        done += 1
+        if progress_callback: await progress_callback(done, len(todo))
+
+    download_started = time.perf_counter()
+    await asyncio.gather(*(download(e) for e in todo))
+    parallel = time.perf_counter() - download_started
+    summary = {"resolved": len(entries), "downloaded": len(todo) - len(failed), "bytes": total_bytes, "missing": sorted(missing),
+               "failed": failed, "elapsed": time.perf_counter() - started, "saved": max(0.0, sequential - parallel)}
+    logger.info(f"Prefetch paket {ib_dir}: {summary['resolved']} paket di closure, {summary['downloaded']} diunduh "
+                f"({total_bytes / 1048576:.1f} MB) dalam {parallel:.1f} dtk; berurutan ~{sequential:.1f} dtk (hemat {summary['saved']:.1f} dtk).")
+    return summary
@@ -0,0 +1,113 @@
+# core/profile_index.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from config import PROFILE_INDEX_DIR
+
+logger = logging.getLogger(__name__)
+
+# File yang ikut berubah bila isi Image Builder diganti (diekstrak ulang / versi lain).
+_SIGNATURE_FILES = (".profiles.mk", ".targetinfo", "Makefile")
+
+_memory = {}
+_locks = {}
+
+
+def _index_path(ib_dir: str) -> str:
+    return os.path.join(PROFILE_INDEX_DIR, hashlib.sha1(os.path.abspath(ib_dir).encode()).hexdigest() + ".json")
+
+
+def _signature(ib_dir: str):
+    """Identitas direktori (device+inode) plus mtime file definisi profil."""
+    st = os.stat(ib_dir)
+    signature = [st.st_dev, st.st_ino]
+    for name in _SIGNATURE_FILES:
+        path = os.path.join(ib_dir, name)
+        signature.append(os.stat(path).st_mtime_ns if os.path.exists(path) else 0)
+    return signature
+
+
+def parse_make_info(output: str) -> dict:
+    """Mem-parsing output `make info` menjadi {default_packages, profiles: {nama: {description, packages}}}."""
+    index = {"default_packages": [], "profiles": {}}
+    in_profiles = False; current = None
+    for line in output.splitlines():
+        if not line.strip(): continue
+        if not in_profiles:
+            if line.startswith("Default Packages:"): index["default_packages"] = line.split(':', 1)[1].split()
+            elif line.startswith("Available Profiles:"): in_profiles = True
+            continue
+        if not line.startswith((' ', '\t')) and line.rstrip().endswith(':'):
+            name = line.rstrip()[:-1].strip()
+            # Entri "Default" bukan profil perangkat (sama seperti filter lama di get_device_profiles)
+            current = None
+            if name and 'Default' not in name: current = index["profiles"][name] = {"description": "", "packages": []}
+            continue
+        if current is None: continue
+        text = line.strip()
+        if text.startswith("Packages:"): current["packages"] = text.split(':', 1)[1].split()
+        elif not current["description"] and ':' not in text: current["description"] = text
+    return index
+
+
+def _load(ib_dir: str, signature):
+    entry = _memory.get(ib_dir)
+    if entry is None:
+        path = _index_path(ib_dir)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, 'r') as f: entry = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Indeks profil {path} rusak, diabaikan: {e}")
+            return None
+        _memory[ib_dir] = entry
+    return entry["index"] if entry.get("signature") == signature else None
+
+
+def _store(ib_dir: str, signature, index: dict):
+    entry = _memory[ib_dir] = {"ib_dir": os.path.abspath(ib_dir), "signature": signature, "index": index}
+    try:
+        os.makedirs(PROFILE_INDEX_DIR, exist_ok=True)
+        path = _index_path(ib_dir); tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f: json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        logger.warning(f"Gagal menyimpan indeks profil untuk {ib_dir}: {e}")
+
+
+async def _run_make_info(ib_dir: str):
+    process = await asyncio.create_subprocess_exec("make", "-C", ib_dir, "info", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        logger.error(f"Gagal menjalankan 'make info': {stderr.decode(errors='ignore')}")
+        return None
+    return parse_make_info(stdout.decode(errors='ignore'))
+
+
+async def get_profile_index(ib_dir: str):
+    """
+    Mengembalikan indeks profil untuk `ib_dir`. `make info` hanya dijalankan sekali per
+    Image Builder; indeks otomatis dibangun ulang bila identitas/mtime direktori berubah.
+    """
+    if not os.path.isdir(ib_dir): return None
+    lock = _locks.setdefault(ib_dir, asyncio.Lock())
+    async with lock:
+        signature = _signature(ib_dir)
+        index = _load(ib_dir, signature)
+        if index is not None: return index
+        index = await _run_make_info(ib_dir)
+        if index is None: return None
+        _store(ib_dir, signature, index)
+        logger.info(f"Indeks profil untuk {ib_dir} dibangun: {len(index['profiles'])} profil.")
+        return index
+
+
+def invalidate(ib_dir: str):
+    """Membuang indeks profil milik `ib_dir` (misalnya saat direktori IB dihapus)."""
+    _memory.pop(ib_dir, None)
+    path = _index_path(ib_dir)
+    if os.path.exists(path): os.remove(path)
@@ -0,0 +1,157 @@
+# core/release_index.py
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+import httpx
+
+from config import RELEASE_INDEX_DIR, RELEASE_INDEX_TTL, RELEASE_INDEX_CONCURRENCY
+from .metadata_cache import get_text
+from .index_parser import parse_index_async
+from .openwrt_api import IB_PATTERN, scrape_targets_for_version, scrape_subtargets_for_target, find_imagebuilder_url_and_name, fetch_sha256sums
+
+logger = logging.getLogger(__name__)
+
+# Indeks rilis yang sudah dimuat: {(base_url, version): index}
+_indexes = {}
+_crawls = {}
+
+
+def _index_path(version: str, base_url: str) -> str:
+    host = re.sub(r'[^A-Za-z0-9.-]', '_', base_url.split('://')[-1])
+    return os.path.join(RELEASE_INDEX_DIR, f"{host}-{version}.json")
+
+
+def load_release_index(version: str, base_url: str):
+    """Mengambil indeks rilis dari memori/disk. None bila belum pernah di-crawl."""
+    if not version: return None
+    key = (base_url, version)
+    if key in _indexes: return _indexes[key]
+    path = _index_path(version, base_url)
+    if not os.path.exists(path): return None
+    try:
+        with open(path, 'r') as f: index = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.warning(f"Indeks rilis {path} rusak, diabaikan: {e}")
+        return None
+    _indexes[key] = index
+    return index
+
+
+def _save_release_index(version: str, base_url: str, index: dict):
+    _indexes[(base_url, version)] = index
+    try:
+        os.makedirs(RELEASE_INDEX_DIR, exist_ok=True)
+        path = _index_path(version, base_url); tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f: json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except IOError as e:
+        logger.warning(f"Gagal menyimpan indeks rilis v{version}: {e}")
+
+
+async def _crawl_imagebuilder(version: str, target: str, subtarget: str, base_url: str, semaphore: asyncio.Semaphore):
+    """Mencari Image Builder (nama, ukuran, sha256) untuk satu target/subtarget."""
+    dir_url = "/".join(filter(None, [base_url, "releases", version, "targets", target, subtarget])) + "/"
+    async with semaphore:
+        try:
+            entries = await parse_index_async(await get_text(dir_url, "imagebuilder"))
+        except httpx.HTTPError as e:
+            logger.warning(f"Crawl {dir_url} gagal: {e}")
+            return None
+        entry = next((e for e in entries if e.href and IB_PATTERN.match(e.href)), None)
+        if entry is None: return {}
+        checksums = await fetch_sha256sums(dir_url)
+    return {"name": entry.href, "url": dir_url + entry.href, "size": entry.size, "sha256": checksums.get(entry.href)}
+
+
+async def _crawl_target(version: str, target: str, base_url: str, semaphore: asyncio.Semaphore):
+    try:
+        async with semaphore:
+            subtargets = await scrape_subtargets_for_target(version, target, base_url)
+    except httpx.HTTPError as e:
+        logger.warning(f"Crawl subtarget {target} v{version} gagal: {e}")
+        return None
+    if subtargets is None: return None
+    names = subtargets or [""]
+    results = await asyncio.gather(*(_crawl_imagebuilder(version, target, st, base_url, semaphore) for st in names))
+    if any(r is None for r in results): return None
+    return {st: (ib or None) for st, ib in zip(names, results)}
+
+
+async def crawl_release(version: str, base_url: str, concurrency: int = RELEASE_INDEX_CONCURRENCY):
+    """
+    Meng-crawl seluruh target & subtarget satu rilis secara paralel (dibatasi semaphore)
+    dan menyimpan indeks ringkas URL, ukuran, serta sha256 Image Builder ke disk.
+    Target yang gagal di-crawl diambil dari indeks lama bila ada.
+    """
+    started = time.perf_counter()
+    targets = await scrape_targets_for_version(version, base_url)
+    if not targets:
+        logger.warning(f"Crawl indeks v{version} dibatalkan: daftar target kosong/gagal.")
+        return None
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_crawl_target(version, t, base_url, semaphore) for t in targets))
+    previous = (load_release_index(version, base_url) or {}).get("targets", {})
+    index_targets, failed = {}, 0
+    for target, subtargets in zip(targets, results):
+        if subtargets is None:
+            failed += 1
+            if target in previous: index_targets[target] = previous[target]
+            continue
+        index_targets[target] = subtargets
+    index = {"version": version, "base_url": base_url, "crawled_at": time.time(), "complete": failed == 0, "targets": index_targets}
+    _save_release_index(version, base_url, index)
+    logger.info(f"Indeks rilis v{version} dari {base_url}: {len(index_targets)} target, {failed} gagal, {time.perf_counter() - started:.1f} dtk.")
+    return index
+
+
+async def _background_crawl(version: str, base_url: str):
+    try:
+        await crawl_release(version, base_url)
+    except Exception as e:
+        logger.error(f"Crawl indeks rilis v{version} gagal: {e}", exc_info=True)
+    finally:
+        _crawls.pop((base_url, version), None)
+
+
+def ensure_release_index(version: str, base_url: str):
+    """Menjadwalkan crawl di latar belakang bila indeks belum ada, basi, atau tidak lengkap."""
+    if not version: return None
+    key = (base_url, version)
+    if key in _crawls: return _crawls[key]
+    index = load_release_index(version, base_url)
+    if index and index.get("complete") and time.time() - index.get("crawled_at", 0) < RELEASE_INDEX_TTL: return None
+    _crawls[key] = asyncio.create_task(_background_crawl(version, base_url))
+    return _crawls[key]
+
+
+def index_targets(version: str, base_url: str):
+    """Daftar target dari indeks rilis, atau None bila indeks belum tersedia."""
+    index = load_release_index(version, base_url)
+    return sorted(index["targets"]) if index and index.get("targets") else None
+
+
+def index_subtargets(version: str, target: str, base_url: str):
+    """Daftar subtarget dari indeks rilis ([] bila target tanpa subtarget), atau None bila tidak diketahui."""
+    index = load_release_index(version, base_url)
+    subtargets = index["targets"].get(target) if index else None
+    if subtargets is None: return None
+    return sorted(st for st in subtargets if st)
+
+
+def index_imagebuilder(version: str, target: str, subtarget: str, base_url: str):
+    """Info Image Builder {name, url, size, sha256} dari indeks rilis, atau None."""
+    index = load_release_index(version, base_url)
+    subtargets = index["targets"].get(target) if index else None
+    return subtargets.get(subtarget or "") if subtargets else None
+
+
+async def lookup_imagebuilder(version: str, target: str, subtarget: str, base_url: str):
+    """Seperti find_imagebuilder_url_and_name, tetapi membaca indeks rilis terlebih dahulu."""
+    ib = index_imagebuilder(version, target, subtarget, base_url)
+    if ib: return ib["url"], ib["name"]
+    return await find_imagebuilder_url_and_name(version, target, subtarget, base_url)
@@ -1,34 +1,350 @@
 # core/uploader.py
 
 import asyncio
+import contextlib
+import hashlib
+import io
 import logging
 import os
 import time
-from telethon import TelegramClient, errors
-from telegram.error import RetryAfter, BadRequest
+from telethon import TelegramClient, errors, helpers
+from telethon.network import MTProtoSender
+from telethon.tl import functions, types
 
 import config
+from .edit_scheduler import edit_scheduler
 
 logger = logging.getLogger(__name__)
 
-async def upload_file_for_forwarding(file_path: str, destination_id, status_message) -> 'Message' or None:
-    # Buat instance client di dalam fungsi async untuk stabilitas
-    client = TelegramClient('telegram_user_session', config.API_ID, config.API_HASH)
-    
+PART_SIZE = 512 * 1024        # Ukuran part MTProto maksimum
+PART_RETRIES = 3
+FLOOD_WAIT_RETRIES = 3        # Flood wait dihitung terpisah dari PART_RETRIES
+FLOOD_WAIT_LIMIT = 60         # Flood wait lebih lama dari ini tidak ditunggu di dalam worker
+
+
+async def _send_part(sender, request, part_index: int):
+    """Mengirim satu part dengan retry. Selalu berakhir dengan sukses atau exception, tidak pernah diam-diam."""
+    attempt = flood_waits = 0
+    while True:
+        try:
+            if await sender.send(request): return
+            raise RuntimeError(f"Server menolak part {part_index}.")
+        except errors.FloodWaitError as e:
+            flood_waits += 1
+            if flood_waits > FLOOD_WAIT_RETRIES or e.seconds > FLOOD_WAIT_LIMIT: raise
+            logger.warning(f"Flood wait {e.seconds} dtk saat mengunggah part {part_index} ({flood_waits}/{FLOOD_WAIT_RETRIES}).")
+            await asyncio.sleep(e.seconds)
+        except (ConnectionError, asyncio.TimeoutError, errors.RPCError, RuntimeError) as e:
+            attempt += 1
+            if attempt >= PART_RETRIES: raise
+            logger.warning(f"Part {part_index} gagal (percobaan {attempt}): {e}")
+            await asyncio.sleep(attempt)
+
+
+class _ClientSender:
+    """Memakai koneksi utama client sebagai satu 'sender' bila upload paralel dinonaktifkan."""
+    def __init__(self, client: TelegramClient):
+        self._client = client
+
+    async def send(self, request):
+        return await self._client(request)
+
+
+async def upload_parts(file_path: str, senders, part_size: int = PART_SIZE, read_ahead: int = config.UPLOAD_READ_AHEAD, progress_callback=None,
+                       offset: int = 0, length: int = None, file_name: str = None, digests=()):
+    """
+    Mengunggah file sebagai part `SaveBigFilePart` lewat beberapa sender paralel.
+
+    Satu pembaca mengisi antrean berukuran `read_ahead` part (memori maksimum kira-kira
+    (read_ahead + jumlah sender) x part_size), tiap sender mengambil part berikutnya yang
+    tersedia, dan progres dijumlahkan dari semua sender. Dengan `offset`/`length` hanya
+    potongan file yang diunggah (untuk split), dan tiap objek hashlib di `digests` ikut diisi saat membaca.
+    Mengembalikan :tl:`InputFileBig`.
+    """
+    file_size = os.path.getsize(file_path) - offset if length is None else length
+    part_count = max(1, -(-file_size // part_size))
+    file_id = helpers.generate_random_long()
+    queue = asyncio.Queue(maxsize=read_ahead)
+    uploaded = 0
+
+    def read_part(f, size):
+        data = f.read(size)
+        for digest in digests: digest.update(data)
+        return data
+
+    async def reader():
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            for part_index in range(part_count):
+                size = min(part_size, file_size - part_index * part_size)
+                await queue.put((part_index, await asyncio.to_thread(read_part, f, size)))
+        for _ in senders: await queue.put(None)
+
+    async def worker(sender):
+        nonlocal uploaded
+        while (item := await queue.get()) is not None:
+            part_index, data = item
+            await _send_part(sender, functions.upload.SaveBigFilePartRequest(file_id, part_index, part_count, data), part_index)
+            uploaded += len(data)
+            if progress_callback: await helpers._maybe_await(progress_callback(uploaded, file_size))
+
+    tasks = [asyncio.create_task(reader())] + [asyncio.create_task(worker(sender)) for sender in senders]
     try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception(): raise task.exception()
+    finally:
+        for task in tasks: task.cancel()
+    return types.InputFileBig(file_id, part_count, file_name or os.path.basename(file_path))
+
+
+def split_layout(file_size: int, max_size: int, part_size: int = PART_SIZE):
+    """Membagi file menjadi potongan berukuran hampir sama (kelipatan part_size) yang masing-masing <= max_size."""
+    max_size = max_size // part_size * part_size  # Dibulatkan ke bawah agar pembulatan ke atas di bawah tidak melewati batas
+    if max_size <= 0: raise ValueError(f"Batas ukuran potongan lebih kecil dari satu part ({part_size} byte).")
+    count = -(-file_size // max_size)
+    piece_size = -(-file_size // count)
+    piece_size = -(-piece_size // part_size) * part_size
+    return [(offset, min(piece_size, file_size - offset)) for offset in range(0, file_size, piece_size)]
+
+
+class UploaderService:
+    """
+    Satu client Telethon yang hidup selama bot berjalan.
+
+    Koneksi & autentikasi hanya dilakukan sekali (bukan per upload), client disambung ulang
+    otomatis bila terputus, dan sender DC yang sudah diekspor Telethon ikut dipakai ulang
+    karena client tidak pernah dibuang. Jumlah upload bersamaan dibatasi semaphore.
+    """
+    def __init__(self, session: str = config.TELETHON_SESSION, max_concurrent: int = config.UPLOAD_CONCURRENCY):
+        self.session = session
+        self.max_concurrent = max_concurrent
+        self._client = None
+        self._part_senders = []
+        self._sender_users = 0          # Jumlah upload yang sedang memakai _part_senders
+        self._senders_broken = False    # Ditutup begitu tidak ada lagi upload yang memakainya
+        self._senders_lock = asyncio.Lock()  # Upload bersamaan tidak boleh membuat sender ganda
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.active_uploads = 0
+        self.stats = {"connects": 0, "uploads": 0, "failures": 0}
+
+    @property
+    def is_connected(self):
+        return self._client is not None and self._client.is_connected()
+
+    def status_line(self):
+        state = "terhubung" if self.is_connected else "tidak terhubung"
+        return f"Uploader: {state}, upload aktif {self.active_uploads}/{self.max_concurrent}, total {self.stats['uploads']} (gagal {self.stats['failures']}), koneksi {self.stats['connects']}x"
+
+    async def get_client(self, timeout: float = 30.0) -> TelegramClient:
+        """Mengembalikan client yang sudah terhubung & login, menyambung ulang bila perlu."""
+        if self.is_connected: return self._client
+        async with self._connect_lock:
+            if self.is_connected: return self._client
+            if self._client is None:
+                self._client = TelegramClient(self.session, config.API_ID, config.API_HASH)
+            logger.info("Telethon: Menghubungkan client uploader...")
+            await asyncio.wait_for(self._client.start(), timeout=timeout)
+            self.stats["connects"] += 1
+            logger.info("Koneksi Telethon berhasil dibuat.")
+            return self._client
+
+    async def warm_up(self):
+        """Menyambungkan client di latar belakang saat bot start, hanya jika sesi sudah pernah dibuat."""
+        if not os.path.exists(f"{self.session}.session"): return
+        try: await self.get_client()
+        except Exception as e: logger.warning(f"Pemanasan client Telethon gagal, akan dicoba lagi saat upload: {e}")
+
+    async def _get_part_senders(self, client: TelegramClient, count: int):
+        """Sender tambahan ke DC utama (memakai auth key sesi yang sama), dibuat sekali lalu dipakai ulang."""
+        self._part_senders = [sender for sender in self._part_senders if sender.is_connected()]
+        if len(self._part_senders) < count:
+            dc = await client._get_dc(client.session.dc_id)
+            while len(self._part_senders) < count:
+                sender = MTProtoSender(client.session.auth_key, loggers=client._log)
+                await sender.connect(client._connection(dc.ip_address, dc.port, dc.id, loggers=client._log, proxy=client._proxy, local_addr=client._local_addr))
+                self._part_senders.append(sender)
+            logger.info(f"Telethon: {count} koneksi upload paralel siap ke DC {dc.id}.")
+        return self._part_senders[:count]
+
+    @contextlib.asynccontextmanager
+    async def _leased_part_senders(self, client: TelegramClient, count: int):
+        """Meminjam sender paralel; sender baru benar-benar ditutup setelah semua peminjam selesai."""
+        self._sender_users += 1  # Dihitung sebelum await agar _close_part_senders menunda penutupan
         try:
-            if str(destination_id).lower() == 'me':
-                target_entity = 'me'
-                dest_name = "Saved Messages"
-            else:
-                target_entity = int(destination_id)
-                dest_name = f"grup/channel ({destination_id})"
+            async with self._senders_lock: senders = await self._get_part_senders(client, count)
+            yield senders
+        finally:
+            self._sender_users -= 1
+            if self._senders_broken and self._sender_users == 0: await self._close_part_senders()
+
+    async def _close_part_senders(self):
+        if self._sender_users > 0:
+            # Masih dipakai upload lain: tandai saja, ditutup oleh peminjam terakhir
+            self._senders_broken = True; return
+        self._senders_broken = False
+        for sender in self._part_senders:
+            try: await sender.disconnect()
+            except Exception as e: logger.warning(f"Gagal menutup sender upload: {e}")
+        self._part_senders = []
+
+    async def _send_parallel(self, client: TelegramClient, entity, file_path: str, progress_callback=None, **kwargs):
+        async with self._leased_part_senders(client, config.UPLOAD_CONNECTIONS) as senders:
+            started = time.perf_counter()
+            input_file = await upload_parts(file_path, senders, progress_callback=progress_callback)
+        elapsed = time.perf_counter() - started; size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        logger.info(f"Upload paralel {os.path.basename(file_path)}: {size_mb:.1f} MB dalam {elapsed:.1f} dtk ({size_mb / max(elapsed, 0.001):.1f} MB/s, {len(senders)} koneksi).")
+        return await client.send_file(entity=entity, file=input_file, force_document=True, **kwargs)
+
+    async def reset(self):
+        """Memutus koneksi yang rusak agar upload berikutnya menyambung ulang."""
+        await self._close_part_senders()
+        async with self._connect_lock:
+            if self._client is not None and self._client.is_connected():
+                try: await self._client.disconnect()
+                except Exception as e: logger.warning(f"Gagal memutus client Telethon: {e}")
+
+    async def stop(self):
+        await self.reset()
+        self._client = None
+        logger.info("Koneksi Telethon ditutup.")
+
+    async def send_file(self, entity, file_path: str, **kwargs):
+        """Upload lewat client bersama; koneksi yang putus di tengah jalan disambung ulang & dicoba sekali lagi."""
+        async with self._slots:
+            self.active_uploads += 1
+            try:
+                for attempt in (1, 2):
+                    client = await self.get_client()
+                    try:
+                        message = None
+                        if config.UPLOAD_CONNECTIONS > 1 and os.path.getsize(file_path) >= config.PARALLEL_UPLOAD_THRESHOLD:
+                            try: message = await self._send_parallel(client, entity, file_path, **kwargs)
+                            except (ConnectionError, OSError, errors.RPCError, RuntimeError) as e:
+                                logger.warning(f"Upload paralel gagal ({e}), memakai upload biasa.")
+                                await self._close_part_senders()
+                        if message is None: message = await client.send_file(entity=entity, file=file_path, **kwargs)
+                        self.stats["uploads"] += 1
+                        return message
+                    except (ConnectionError, OSError) as e:
+                        if attempt == 2: raise
+                        logger.warning(f"Koneksi Telethon terputus saat upload ({e}), menyambung ulang...")
+                        await self.reset()
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+            finally:
+                self.active_uploads -= 1
+
+    async def upload_only(self, file_path: str, progress_callback=None):
+        """Mengunggah isi file tanpa mengirim pesan; hasilnya (InputFile) dipakai untuk album."""
+        async with self._slots:
+            self.active_uploads += 1
+            try:
+                client = await self.get_client()
+                if config.UPLOAD_CONNECTIONS > 1 and os.path.getsize(file_path) >= config.PARALLEL_UPLOAD_THRESHOLD:
+                    async with self._leased_part_senders(client, config.UPLOAD_CONNECTIONS) as senders:
+                        return await upload_parts(file_path, senders, progress_callback=progress_callback)
+                return await client.upload_file(file_path, progress_callback=progress_callback)
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+            finally:
+                self.active_uploads -= 1
+
+    async def get_media(self, chat_id, message_ids):
+        """Mengambil media dari pesan yang sudah ada di tujuan leech (None untuk pesan yang sudah hilang)."""
+        client = await self.get_client()
+        messages = await client.get_messages(chat_id, ids=list(message_ids))
+        return [message.media if message else None for message in messages]
+
+    async def send_album(self, entity, files, captions):
+        """Mengirim hingga 10 dokumen (InputFile / media yang sudah ada) sebagai satu album."""
+        client = await self.get_client()
+        messages = await client.send_file(entity=entity, file=list(files), caption=list(captions), force_document=True)
+        self.stats["uploads"] += len(messages)
+        return messages
+
+    async def _delete_pieces(self, client: TelegramClient, entity, messages):
+        """Menghapus potongan yang sudah terkirim agar tujuan tidak berisi file setengah jadi."""
+        if not messages: return
+        try: await client.delete_messages(entity, [m.id for m in messages])
+        except Exception as e: logger.warning(f"Gagal menghapus {len(messages)} potongan yang sudah terkirim: {e}")
+
+    async def send_file_split(self, entity, file_path: str, max_size: int, caption: str = "", progress_callback=None):
+        """
+        Mengunggah file yang melebihi batas ukuran Telegram sebagai beberapa potongan langsung
+        dari file aslinya (tanpa salinan kedua di disk). Tiap potongan dikirim begitu selesai
+        diunggah, lalu manifest sha256 untuk penggabungan dikirim terakhir. Mengembalikan list pesan.
+        Potongan yang gagal dicoba ulang; bila tetap gagal, potongan yang sudah terkirim dihapus lalu error dilempar.
+        """
+        file_name = os.path.basename(file_path); total = os.path.getsize(file_path)
+        layout = split_layout(total, max_size)
+        async with self._slots:
+            self.active_uploads += 1
+            try:
+                client = await self.get_client()
+                leased = self._leased_part_senders(client, config.UPLOAD_CONNECTIONS) if config.UPLOAD_CONNECTIONS > 1 else contextlib.nullcontext([_ClientSender(client)])
+                async with leased as senders:
+                    messages, manifest, full_digest = [], [], hashlib.sha256()
+                    for index, (offset, length) in enumerate(layout, start=1):
+                        piece_name = f"{file_name}.part{index:03d}"; digest_before = full_digest.copy()
+
+                        async def piece_progress(current, _total, base=offset):
+                            if progress_callback: await helpers._maybe_await(progress_callback(base + current, total))
+
+                        for attempt in range(1, PART_RETRIES + 1):
+                            digest = hashlib.sha256(); full_digest = digest_before.copy()  # Digest diulang dari awal potongan saat retry
+                            try:
+                                input_file = await upload_parts(file_path, senders, progress_callback=piece_progress, offset=offset, length=length, file_name=piece_name, digests=(digest, full_digest))
+                                messages.append(await client.send_file(entity=entity, file=input_file, force_document=True, caption=f"{caption} ({index}/{len(layout)})"))
+                                break
+                            except (ConnectionError, OSError, asyncio.TimeoutError, errors.RPCError, RuntimeError) as e:
+                                if attempt < PART_RETRIES and not isinstance(e, errors.FloodWaitError):
+                                    logger.warning(f"Potongan {piece_name} gagal (percobaan {attempt}), dicoba ulang: {e}"); await asyncio.sleep(attempt); continue
+                                await self._delete_pieces(client, entity, messages)
+                                raise RuntimeError(f"Potongan {index}/{len(layout)} gagal: {e}. "
+                                                   f"{len(messages)} potongan yang sudah terkirim dihapus, kirim ulang file ini.") from e
+                        manifest.append(f"{digest.hexdigest()}  {piece_name}")
+                        logger.info(f"Potongan {piece_name} ({length / (1024 * 1024):.0f} MB) terkirim.")
+                    pieces = " ".join(f"{file_name}.part{i:03d}" for i in range(1, len(layout) + 1))
+                    manifest_text = (f"# {file_name}: {total} byte, {len(layout)} potongan\n"
+                                     f"# Gabungkan: cat {pieces} > {file_name}\n"
+                                     f"# Periksa:   sha256sum -c {file_name}.sha256\n"
+                                     + "\n".join(manifest) + f"\n{full_digest.hexdigest()}  {file_name}\n")
+                    manifest_file = io.BytesIO(manifest_text.encode()); manifest_file.name = f"{file_name}.sha256"
+                    try: messages.append(await client.send_file(entity=entity, file=manifest_file, force_document=True, caption=f"Manifest {file_name}"))
+                    except Exception:
+                        await self._delete_pieces(client, entity, messages); raise
+                self.stats["uploads"] += 1
+                return messages
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+            finally:
+                self.active_uploads -= 1
+
+
+uploader_service = UploaderService()
+
+def resolve_destination(destination_id):
+    """'me' atau ID grup/channel -> (entity Telethon, nama untuk log). ValueError bila tidak valid."""
+    if str(destination_id).lower() == 'me': return 'me', "Saved Messages"
+    return int(destination_id), f"grup/channel ({destination_id})"
+
+
+async def upload_file_for_forwarding(file_path: str, destination_id, status_message) -> list or None:
+    """Mengunggah artefak ke tujuan leech. Mengembalikan list pesan (lebih dari satu bila file harus dipecah)."""
+    try:
+        try:
+            target_entity, dest_name = resolve_destination(destination_id)
         except ValueError:
             logger.error(f"Destination ID '{destination_id}' tidak valid. Harus 'me' atau integer.")
-            await status_message.edit_text(f"❌ ID Tujuan Leech tidak valid: {destination_id}")
+            await edit_scheduler.edit_now(status_message, f"❌ ID Tujuan Leech tidak valid: {destination_id}")
             return None
 
-        logger.info(f"Telethon: Menghubungkan untuk mengunggah ke {dest_name}...")
+        logger.info(f"Telethon: Mengunggah ke {dest_name}...")
         
         last_update_time = 0
         file_name = os.path.basename(file_path)
@@ -38,54 +354,50 @@ async def upload_file_for_forwarding(file_path: str, destination_id, status_mess
             current_time = time.time()
             if current_time - last_update_time < 2.0: # Batasi update setiap 2 detik
                 return
-            
+            last_update_time = current_time
             progress_percent = round((current / total) * 100, 1)
-            try:
-                # Edit pesan status yang sudah ada dengan progres
-                await status_message.edit_text(f"📤 Mengunggah `{file_name}`: {progress_percent}%", parse_mode='Markdown')
-                last_update_time = current_time
-            except (RetryAfter, BadRequest):
-                # Jika kena rate limit, tunggu sebentar
-                await asyncio.sleep(5)
-            except Exception:
-                # Abaikan error lain pada progress, yang penting upload jalan terus
-                pass
+            # Edit digabung & dijadwalkan terpusat agar upload tidak pernah ikut tertahan flood-wait
+            edit_scheduler.request_edit(status_message, f"📤 Mengunggah `{file_name}`: {progress_percent}%", parse_mode='Markdown')
 
-        logger.info("Mencoba koneksi Telethon dengan timeout 30 detik...")
+        if uploader_service.active_uploads >= uploader_service.max_concurrent:
+            await edit_scheduler.edit_now(status_message, f"⏳ Menunggu antrean upload untuk `{file_name}`...", parse_mode='Markdown')
         try:
-            # Menggunakan client.start() dengan timeout, lebih andal daripada async with
-            await asyncio.wait_for(client.start(), timeout=30.0)
-            logger.info("Koneksi Telethon berhasil dibuat.")
-            
-            uploaded_message = await client.send_file(
-                entity=target_entity,
-                file=file_path,
-                caption=f"Build artifact: {file_name}",
-                progress_callback=progress_callback
-            )
+            started = time.perf_counter()
+            if os.path.getsize(file_path) > config.TELEGRAM_MAX_FILE_SIZE:
+                await edit_scheduler.edit_now(status_message, f"✂️ `{file_name}` melebihi batas Telegram, dikirim dalam beberapa potongan...", parse_mode='Markdown')
+                uploaded_messages = await uploader_service.send_file_split(
+                    target_entity,
+                    file_path,
+                    config.TELEGRAM_MAX_FILE_SIZE,
+                    caption=f"Build artifact: {file_name}",
+                    progress_callback=progress_callback
+                )
+            else:
+                uploaded_messages = [await uploader_service.send_file(
+                    target_entity,
+                    file_path,
+                    caption=f"Build artifact: {file_name}",
+                    progress_callback=progress_callback
+                )]
             
-            logger.info(f"Telethon: File berhasil diunggah ke {dest_name}.")
-            await status_message.edit_text(f"✅ Berhasil diunggah. Meneruskan...", parse_mode='Markdown')
-            return uploaded_message
+            logger.info(f"Telethon: File berhasil diunggah ke {dest_name} dalam {time.perf_counter() - started:.1f} dtk.")
+            await edit_scheduler.edit_now(status_message, f"✅ Berhasil diunggah. Meneruskan...", parse_mode='Markdown')
+            return uploaded_messages
 
         except asyncio.TimeoutError:
             logger.error("Koneksi Telethon timeout setelah 30 detik.")
-            await status_message.edit_text("❌ Gagal terhubung ke Telegram (timeout). Periksa jaringan server Anda.")
+            await edit_scheduler.edit_now(status_message, "❌ Gagal terhubung ke Telegram (timeout). Periksa jaringan server Anda.")
             return None
         except errors.rpcerrorlist.PhoneNumberInvalidError:
             logger.error("Nomor telepon untuk sesi Telethon tidak valid.")
-            await status_message.edit_text("❌ Sesi Telethon gagal: Nomor telepon tidak valid.")
+            await edit_scheduler.edit_now(status_message, "❌ Sesi Telethon gagal: Nomor telepon tidak valid.")
             return None
         except Exception as e:
             logger.error(f"Terjadi error tak terduga saat koneksi atau upload Telethon: {e}", exc_info=True)
-            await status_message.edit_text(f"❌ Error Telethon: {e}")
+            await edit_scheduler.edit_now(status_message, f"❌ Error Telethon: {e}")
             return None
-        finally:
-            if client.is_connected():
-                await client.disconnect()
-                logger.info("Koneksi Telethon ditutup.")
 
     except Exception as e:
         logger.error(f"Error tak terduga di dalam upload_file_for_forwarding: {e}", exc_info=True)
-        await status_message.edit_text(f"❌ Terjadi kesalahan kritis pada fungsi uploader.")
+        await edit_scheduler.edit_now(status_message, f"❌ Terjadi kesalahan kritis pada fungsi uploader.")
         return None
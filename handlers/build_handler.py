@@ -8,7 +8,9 @@ from telegram.ext import ContextTypes, ConversationHandler
 from .constants import *
 from .utils import restricted, send_temporary_message
 from core.build_manager import build_manager
-from core.openwrt_api import get_device_profiles, find_imagebuilder_url_and_name
+from core.openwrt_api import get_target_profiles
+from core.release_index import index_imagebuilder, lookup_imagebuilder
+from core.package_db import validate_package_set, format_package_problems
 from config import OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL
 
 logger = logging.getLogger(__name__)
@@ -36,26 +38,36 @@ async def _display_preflight_check(update: Update, context: ContextTypes.DEFAULT
     if mode == 'official':
         conf = config
         source = conf.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
-        _, ib_filename = await find_imagebuilder_url_and_name(conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET"), base_url)
+        _, ib_filename = await lookup_imagebuilder(conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET"), base_url)
+        ib_info = index_imagebuilder(conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET"), base_url)
         
         is_valid = True
-        if ib_filename and os.path.isdir(ib_filename.replace(".tar.xz", "").replace(".tar.zst", "")):
-            ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", "")
-            valid_profiles = await get_device_profiles(ib_dir)
-            if conf.get("DEVICE_PROFILE") not in valid_profiles:
-                is_valid = False
-                text = f"⚠️ **Profil `{conf.get('DEVICE_PROFILE')}` tidak valid!**\n\nPilih profil yang benar dari daftar di bawah untuk melanjutkan:"
-                keyboard = [[InlineKeyboardButton(p, callback_data=f"build_fix_profile_{p}")] for p in valid_profiles[:20]]
-                keyboard.append([InlineKeyboardButton("❌ Batal", callback_data="build_cancel")])
-                await query.edit_message_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                return AWAITING_PROFILE_FIX
+        ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", "") if ib_filename else None
+        valid_profiles = await get_target_profiles(conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET"), base_url, ib_dir)
+        if valid_profiles and conf.get("DEVICE_PROFILE") not in valid_profiles:
+            is_valid = False
+            text = f"⚠️ **Profil `{conf.get('DEVICE_PROFILE')}` tidak valid!**\n\nPilih profil yang benar dari daftar di bawah untuk melanjutkan:"
+            keyboard = [[InlineKeyboardButton(p, callback_data=f"build_fix_profile_{p}")] for p in valid_profiles[:20]]
+            keyboard.append([InlineKeyboardButton("❌ Batal", callback_data="build_cancel")])
+            await query.edit_message_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
+            return AWAITING_PROFILE_FIX
         
         if is_valid:
             text += "Bot akan memulai proses build dengan pengaturan berikut:\n\n"
             text += f"*Sumber:* `{conf.get('BUILD_SOURCE', 'N/A').title()}`\n"
             text += f"*Versi:* `{conf.get('VERSION', 'N/A')}`\n"
             text += f"*Profil:* `{conf.get('DEVICE_PROFILE', 'N/A')}`\n"
+            if ib_info and ib_info.get("size") and not os.path.isdir(ib_dir):
+                text += f"*Unduhan IB:* `{ib_info['size'] / (1024 * 1024):.0f} MB`\n"
             text += f"*Paket:* `{conf.get('CUSTOM_PACKAGES', 'N/A')[:50]}...`\n"
+            problems = format_package_problems(await validate_package_set(conf, base_url, ib_dir))
+            if problems:
+                text += f"\n❌ *Daftar paket tidak bisa dipenuhi:*\n{problems}\n"
+                keyboard = [
+                    [InlineKeyboardButton("✏️ Ubah Pengaturan", callback_data=f"build_goto_settings_{mode}")],
+                    [InlineKeyboardButton("⚠️ Tetap Build", callback_data=f"build_confirm_{mode}")],
+                    [InlineKeyboardButton("❌ Batal", callback_data="build_cancel")]
+                ]
     elif mode == 'amlogic':
         conf = config
         text += "Bot akan memulai proses Amlogic Remake dengan pengaturan berikut:\n\n"
@@ -82,13 +94,6 @@ async def _display_preflight_check(update: Update, context: ContextTypes.DEFAULT
 async def start_build_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Titik masuk untuk percakapan /build."""
     await update.message.delete()
-    
-    if build_manager.is_starting_build or build_manager.status not in ["Idle", "Success", "Failed", "Cancelled"]:
-        await send_temporary_message(context, update.effective_chat.id, "❌ Harap selesaikan atau batalkan permintaan build sebelumnya.")
-        return ConversationHandler.END
-    
-    # Kunci sistem
-    build_manager.is_starting_build = True
 
     keyboard = [
         [InlineKeyboardButton("🔧 Build Resmi", callback_data="build_mode_official")],
@@ -97,8 +102,10 @@ async def start_build_conversation(update: Update, context: ContextTypes.DEFAULT
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
+    active_jobs = build_manager.active_jobs()
+    queue_info = f"\n\nℹ️ Saat ini ada {len(active_jobs)} job aktif/antre. Build baru akan masuk antrean." if active_jobs else ""
     await update.message.reply_text(
-        "Pilih mode build yang ingin Anda jalankan:",
+        f"Pilih mode build yang ingin Anda jalankan:{queue_info}",
         reply_markup=reply_markup
     )
     return SELECT_BUILD_MODE
@@ -132,14 +139,13 @@ async def confirm_build_handler(update: Update, context: ContextTypes.DEFAULT_TY
         try: await context.bot.delete_message(chat_id=chat_id, message_id=panel_id)
         except Exception: pass
 
-    context.application.job_queue.run_once(
-        lambda ctx: build_manager.run_build_task(ctx, chat_id, build_config, mode),
-        0,
-        name=f"build_job_{chat_id}"
+    job = build_manager.submit_build(context, chat_id, update.effective_user.id, build_config, mode)
+    position = build_manager.queue_position(job.id)
+    await query.edit_message_text(
+        f"✅ Job `{job.id}` masuk antrean (posisi {position}).\n"
+        f"Gunakan `/status` untuk memantau atau `/cancel {job.id}` untuk membatalkan.",
+        parse_mode='Markdown'
     )
-    
-    # Buka kunci setelah job berhasil dimulai
-    build_manager.is_starting_build = False
     return ConversationHandler.END
 
 @restricted
@@ -170,8 +176,6 @@ async def request_settings_change_handler(update: Update, context: ContextTypes.
         "Silakan jalankan `/settings` untuk mengubah konfigurasi, lalu mulai `/build` kembali.",
         reply_markup=None
     )
-    # Buka kunci saat dibatalkan
-    build_manager.is_starting_build = False
     return ConversationHandler.END
 
 @restricted
@@ -181,6 +185,4 @@ async def cancel_build_conversation(update: Update, context: ContextTypes.DEFAUL
     await query.answer()
     await query.edit_message_text("Permintaan build dibatalkan.")
     context.user_data.pop('build_mode', None)
-    # Buka kunci saat dibatalkan
-    build_manager.is_starting_build = False
     return ConversationHandler.END
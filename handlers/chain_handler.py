@@ -9,7 +9,7 @@ from .constants import *
 from .utils import restricted, send_temporary_message
 from core.build_manager import build_manager
 from .settings_handler import start_settings_conversation, get_config, save_config # Impor fungsi yang relevan
-from core.history_manager import load_history
+from core.history_manager import history_repo
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +57,7 @@ async def start_chain_build(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except (ValueError, IndexError):
         await query.edit_message_text("❌ Error: Build ID tidak valid."); return ConversationHandler.END
 
-    history = load_history()
-    source_build = next((item for item in history if item['id'] == build_id), None)
+    source_build = history_repo.get(build_id)
     if not source_build:
         await query.edit_message_text("❌ Error: Build sumber tidak ditemukan di histori."); return ConversationHandler.END
         
@@ -102,11 +101,11 @@ async def confirm_chain_build(update: Update, context: ContextTypes.DEFAULT_TYPE
         try: await context.bot.delete_message(chat_id=chat_id, message_id=panel_id)
         except Exception: pass
 
-    # Jalankan tugas build dengan config yang sudah disuntik path lokal
-    context.application.job_queue.run_once(
-        lambda ctx: build_manager.run_build_task(ctx, chat_id, build_config, 'amlogic'),
-        0,
-        name=f"build_job_{chat_id}"
+    # Masukkan build ke antrean dengan config yang sudah disuntik path lokal
+    job = build_manager.submit_build(context, chat_id, update.effective_user.id, build_config, 'amlogic')
+    await query.edit_message_text(
+        f"✅ Job Amlogic Remake `{job.id}` masuk antrean (posisi {build_manager.queue_position(job.id)}).",
+        parse_mode='Markdown'
     )
     
     context.user_data.pop('local_rootfs_path', None)
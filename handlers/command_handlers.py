@@ -10,6 +10,11 @@ from telegram.helpers import escape_markdown
 
 from config import BUILD_LOG_PATH
 from core.build_manager import build_manager
+from core.history_manager import find_build_entry, latest_build_entry, get_build_log
+from core.edit_scheduler import edit_scheduler
+from core.http_client import latency_summary
+from core.uploader import uploader_service
+from core.feed_proxy import feed_proxy
 from .utils import restricted, send_temporary_message
 
 logger = logging.getLogger(__name__)
@@ -97,8 +102,21 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         safe_value = escape_markdown(str(value) or 'Default', version=2)
         status_text += f"*{safe_key}*: `{safe_value}`\n"
         
-    safe_build_status = escape_markdown(build_manager.status, version=2)
-    status_text += f"\n*Build Status*: `{safe_build_status}`"
+    status_text += "\n*Build Status*:\n"
+    active_jobs = build_manager.active_jobs()
+    if not active_jobs:
+        status_text += "`Idle`\n"
+    for job in active_jobs:
+        position = build_manager.queue_position(job.id)
+        job_status = f"Antrean #{position}" if position else job.status
+        safe_desc = escape_markdown(job.describe(), version=2)
+        status_text += f"• `{job.id}` {safe_desc}: `{escape_markdown(job_status, version=2)}`\n"
+    status_text += escape_markdown(f"Worker: {build_manager.max_workers}, antre: {len(build_manager.queued_jobs())}", version=2)
+    status_text += "\n" + escape_markdown(edit_scheduler.status_line(), version=2)
+    status_text += "\n" + escape_markdown(uploader_service.status_line(), version=2)
+    status_text += "\n" + escape_markdown(feed_proxy.status_line(), version=2)
+    http_summary = latency_summary()
+    if http_summary: status_text += "\n\n*Latensi HTTP*:\n" + escape_markdown(http_summary, version=2)
 
     sent_message = await context.bot.send_message(
         chat_id=chat_id,
@@ -108,28 +126,69 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.chat_data['status_panel_id'] = sent_message.message_id
     logger.info(f"Panel status baru dibuat dengan ID: {sent_message.message_id}")
 
+async def send_build_log(context: ContextTypes.DEFAULT_TYPE, chat_id: int, log_path: str, caption: str = None):
+    """Mengirim file log build (.log / .log.zst) sebagai dokumen."""
+    if not log_path or not os.path.exists(log_path):
+        await send_temporary_message(context, chat_id, "File log tidak ditemukan (mungkin sudah dirotasi).")
+        return
+    with open(log_path, 'rb') as f:
+        await context.bot.send_document(chat_id=chat_id, document=f, filename=os.path.basename(log_path), caption=caption)
+
+async def _send_live_tail(context: ContextTypes.DEFAULT_TYPE, chat_id: int, job):
+    tail = job.log.tail() if job.log else ""
+    if not tail.strip():
+        await send_temporary_message(context, chat_id, f"Job {job.id} belum menghasilkan output.")
+        return
+    await context.bot.send_document(
+        chat_id=chat_id, document=tail.encode('utf-8'), filename=f"build-{job.id}-tail.log",
+        caption=f"📜 Ekor log live job {job.id} ({job.status})"
+    )
+
 @restricted
 async def getlog_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """`/getlog [job_id|build_id]`: ekor log live untuk job berjalan, atau log lengkap dari arsip."""
     if update.message:
         await update.message.delete()
-    if build_manager.status == "Building...":
-        await send_temporary_message(context, update.effective_chat.id, "⚙️ Proses build sedang berjalan. Silakan coba lagi setelah selesai.")
-        return
-    
-    if os.path.exists(BUILD_LOG_PATH):
-        await context.bot.send_document(chat_id=update.effective_chat.id, document=open(BUILD_LOG_PATH, 'rb'))
-    else:
-        await send_temporary_message(context, update.effective_chat.id, "File log tidak ditemukan.")
+    chat_id = update.effective_chat.id
+    target_id = context.args[0].strip() if context.args else None
+
+    job = build_manager.get_job(target_id) if target_id else build_manager.latest_job(chat_id)
+    if job and job.is_active:
+        await _send_live_tail(context, chat_id, job); return
+    if job and os.path.exists(job.log_path):
+        await send_build_log(context, chat_id, job.log_path, caption=f"📜 Log lengkap job {job.id} ({job.status})"); return
+
+    record = get_build_log(target_id) if target_id else get_build_log(chat_id=chat_id)
+    if record and os.path.exists(record['log_file']):
+        # Tercatat untuk semua job selesai, termasuk yang gagal/dibatalkan dan sebelum restart
+        await send_build_log(context, chat_id, record['log_file'], caption=f"📜 Log job {record['job_id']} ({record['status']})"); return
+    entry = find_build_entry(target_id) if target_id else latest_build_entry(with_log=True)
+    if entry and entry.get('log_file'):
+        await send_build_log(context, chat_id, entry['log_file'], caption=f"📜 Log build {entry.get('job_id', entry['id'])}"); return
+    if not target_id and os.path.exists(BUILD_LOG_PATH):
+        await send_build_log(context, chat_id, BUILD_LOG_PATH); return
+    await send_temporary_message(context, chat_id, "File log tidak ditemukan.")
 
 @restricted
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Membatalkan job build: `/cancel <job_id>`, atau tanpa argumen jika hanya ada satu job aktif."""
     if update.message:
         await update.message.delete()
-    if build_manager.status != "Building...":
-        await send_temporary_message(context, update.effective_chat.id, "Tidak ada proses build yang sedang berjalan untuk dibatalkan.")
-        return
-    was_cancelled = await build_manager.cancel_current_build()
+    chat_id = update.effective_chat.id
+    if context.args:
+        job_id = context.args[0].strip()
+    else:
+        active_jobs = build_manager.active_jobs(chat_id)
+        if not active_jobs:
+            await send_temporary_message(context, chat_id, "Tidak ada proses build yang sedang berjalan untuk dibatalkan.")
+            return
+        if len(active_jobs) > 1:
+            job_list = "\n".join(f"- `{job.id}` {escape_markdown(job.describe())} ({escape_markdown(job.status)})" for job in active_jobs)
+            await send_temporary_message(context, chat_id, f"Ada beberapa job aktif. Gunakan `/cancel <job_id>`:\n{job_list}", parse_mode='Markdown')
+            return
+        job_id = active_jobs[0].id
+    was_cancelled = await build_manager.cancel_job(job_id)
     if was_cancelled:
-        await send_temporary_message(context, update.effective_chat.id, "✅ Mengirim sinyal pembatalan ke proses build...")
+        await send_temporary_message(context, chat_id, f"✅ Mengirim sinyal pembatalan ke job {job_id}...")
     else:
-        await send_temporary_message(context, update.effective_chat.id, " Gagal membatalkan. Mungkin proses sudah selesai atau macet.")
+        await send_temporary_message(context, chat_id, f" Gagal membatalkan job {job_id}. Mungkin job tidak ada atau sudah selesai.")
@@ -13,9 +13,10 @@ from core.openwrt_api import (
     scrape_openwrt_versions,
     scrape_targets_for_version,
     scrape_subtargets_for_target,
-    get_device_profiles,
-    find_imagebuilder_url_and_name
+    get_target_profiles
 )
+from core.release_index import ensure_release_index, index_targets, index_subtargets, lookup_imagebuilder
+from core.package_db import validate_package_set, format_package_problems
 from config import OPENWRT_DOWNLOAD_URL, IMMORTALWRT_DOWNLOAD_URL
 
 logger = logging.getLogger(__name__)
@@ -169,14 +170,16 @@ async def official_menu_router(update: Update, context: ContextTypes.DEFAULT_TYP
     elif route == 'target':
         version = bot_config.get("VERSION")
         if not version: await prompt_message.edit_text("Versi belum diatur!"); await asyncio.sleep(2); return await display_official_settings_menu(update, context)
-        targets = await scrape_targets_for_version(version, base_url)
+        ensure_release_index(version, base_url)
+        targets = index_targets(version, base_url) or await scrape_targets_for_version(version, base_url)
         keyboard = await create_paginated_keyboard(targets, 0, "official_tselect_", 3, "back_to_official_menu"); await prompt_message.edit_text(f"Pilih Target untuk v{version} (Hal 1):", reply_markup=keyboard); return SELECT_TARGET
     elif route == 'profile':
-        _, ib_filename = await find_imagebuilder_url_and_name(bot_config.get("VERSION"), bot_config.get("TARGET"), bot_config.get("SUBTARGET"), base_url)
-        if not ib_filename or not os.path.isdir(ib_filename.replace(".tar.xz", "").replace(".tar.zst", "")):
-            await prompt_message.delete(); await send_temporary_message(context, query.message.chat_id, "Image Builder belum diunduh. Jalankan `/build` mode 'Resmi' sekali."); return ConversationHandler.END
-        ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", ""); context.user_data['current_ib_dir'] = ib_dir
-        profiles = await get_device_profiles(ib_dir)
+        _, ib_filename = await lookup_imagebuilder(bot_config.get("VERSION"), bot_config.get("TARGET"), bot_config.get("SUBTARGET"), base_url)
+        ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", "") if ib_filename else None
+        profiles = await get_target_profiles(bot_config.get("VERSION"), bot_config.get("TARGET"), bot_config.get("SUBTARGET"), base_url, ib_dir)
+        if not profiles:
+            await prompt_message.delete(); await send_temporary_message(context, query.message.chat_id, "Daftar profil tidak tersedia untuk target ini. Jalankan `/build` mode 'Resmi' sekali agar Image Builder diunduh."); return ConversationHandler.END
+        context.user_data['current_profiles'] = profiles
         keyboard = await create_paginated_keyboard(profiles, 0, "official_pselect_", back_callback="back_to_official_menu"); await prompt_message.edit_text("Pilih Profil Perangkat (Hal 1):", reply_markup=keyboard); return SELECT_PROFILE
     elif route == 'packages':
         await prompt_message.edit_text("Tempel daftar paket untuk Build Resmi:"); return AWAITING_PACKAGES
@@ -217,6 +220,8 @@ async def select_version_major_handler(update: Update, context: ContextTypes.DEF
 async def select_version_minor_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query; await query.answer(); config = get_config(context)
     config['official']['VERSION'] = query.data.replace("official_vminor_", ""); save_config(context, config)
+    source = config['official'].get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
+    ensure_release_index(config['official']['VERSION'], base_url)
     return await display_official_settings_menu(update, context)
 
 @restricted
@@ -225,11 +230,12 @@ async def select_target_handler(update: Update, context: ContextTypes.DEFAULT_TY
     bot_config = config.get('official', {}); data = query.data; version = bot_config.get("VERSION")
     source = bot_config.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
     if data.startswith("official_tselect_page_"):
-        page = int(data.split('_')[-1]); targets = await scrape_targets_for_version(version, base_url)
+        page = int(data.split('_')[-1]); targets = index_targets(version, base_url) or await scrape_targets_for_version(version, base_url)
         keyboard = await create_paginated_keyboard(targets, page, "official_tselect_", 3, "back_to_official_menu")
         await query.edit_message_text(f"Pilih Target untuk v{version} (Halaman {page + 1}):", reply_markup=keyboard); return SELECT_TARGET
     selected_target = data.replace("official_tselect_", ""); config['official']['TARGET'] = selected_target
-    subtargets = await scrape_subtargets_for_target(version, selected_target, base_url)
+    subtargets = index_subtargets(version, selected_target, base_url)
+    if subtargets is None: subtargets = await scrape_subtargets_for_target(version, selected_target, base_url)
     if not subtargets:
         config['official']['SUBTARGET'] = ""; save_config(context, config)
         await query.edit_message_text(f"✅ Target diatur ke: *{selected_target}* (tidak ada subtarget).", parse_mode='Markdown'); await asyncio.sleep(1)
@@ -250,13 +256,12 @@ async def select_subtarget_handler(update: Update, context: ContextTypes.DEFAULT
 async def select_profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query; await query.answer(); config = get_config(context); data = query.data
     if data.startswith("official_pselect_page_"):
-        page = int(data.split('_')[-1]); ib_dir = context.user_data.get('current_ib_dir')
-        if not ib_dir: return await start_settings_conversation(update, context)
-        profiles = await get_device_profiles(ib_dir)
+        page = int(data.split('_')[-1]); profiles = context.user_data.get('current_profiles')
+        if not profiles: return await start_settings_conversation(update, context)
         keyboard = await create_paginated_keyboard(profiles, page, "official_pselect_", back_callback="back_to_official_menu")
         await query.edit_message_text(f"Pilih Profil Perangkat (Halaman {page + 1}):", reply_markup=keyboard); return SELECT_PROFILE
     profile = data.replace("official_pselect_", ""); config['official']['DEVICE_PROFILE'] = profile
-    save_config(context, config); context.user_data.pop('current_ib_dir', None)
+    save_config(context, config); context.user_data.pop('current_profiles', None)
     await query.edit_message_text(f"✅ Profil diatur ke: *{profile}*", parse_mode='Markdown'); await asyncio.sleep(1)
     return await display_official_settings_menu(update, context)
 
@@ -273,7 +278,19 @@ async def _return_from_message_handler(update: Update, context: ContextTypes.DEF
 
 @restricted
 async def receive_official_packages(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    config = get_config(context); config['official']['CUSTOM_PACKAGES'] = ' '.join(update.message.text.split()); save_config(context, config)
+    config = get_config(context); packages = ' '.join(update.message.text.split())
+    # Daftar yang sama dikirim ulang setelah ditolak = pengguna memilih tetap menyimpan
+    if packages != context.user_data.pop('rejected_packages', None):
+        conf = dict(config['official'], CUSTOM_PACKAGES=packages); source = conf.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
+        _, ib_filename = await lookup_imagebuilder(conf.get("VERSION"), conf.get("TARGET"), conf.get("SUBTARGET"), base_url)
+        ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", "") if ib_filename else None
+        problems = format_package_problems(await validate_package_set(conf, base_url, ib_dir))
+        if problems:
+            context.user_data['rejected_packages'] = packages
+            await update.message.delete(); await _delete_old_menu(context)
+            prompt_message = await context.bot.send_message(update.effective_chat.id, f"❌ Daftar paket tidak bisa dipenuhi:\n{problems}\n\nKirim daftar yang sudah diperbaiki, atau kirim ulang daftar yang sama untuk tetap menyimpan.", parse_mode='Markdown')
+            await _save_menu_message_id(prompt_message, context); return AWAITING_PACKAGES
+    config['official']['CUSTOM_PACKAGES'] = packages; save_config(context, config)
     return await _return_from_message_handler(update, context, 'official')
 
 @restricted
@@ -384,7 +401,7 @@ async def handle_uci_script_upload(update: Update, context: ContextTypes.DEFAULT
     if not document or not document.file_name.endswith('.sh'):
         await send_temporary_message(context, update.effective_chat.id, "File tidak valid. Harap kirim skrip `.sh`."); return await _return_from_message_handler(update, context, 'customization')
     bot_config = get_config(context).get('official', {}); source = bot_config.get("BUILD_SOURCE", "openwrt"); base_url = IMMORTALWRT_DOWNLOAD_URL if source == 'immortalwrt' else OPENWRT_DOWNLOAD_URL
-    _, ib_filename = await find_imagebuilder_url_and_name(bot_config.get("VERSION"), bot_config.get("TARGET"), bot_config.get("SUBTARGET"), base_url)
+    _, ib_filename = await lookup_imagebuilder(bot_config.get("VERSION"), bot_config.get("TARGET"), bot_config.get("SUBTARGET"), base_url)
     if not ib_filename:
         await send_temporary_message(context, update.effective_chat.id, "❌ Tidak dapat menentukan direktori Image Builder."); return await _return_from_message_handler(update, context, 'customization')
     ib_dir = ib_filename.replace(".tar.xz", "").replace(".tar.zst", ""); uci_path = os.path.join(ib_dir, "files", "etc", "uci-defaults")
@@ -20,8 +20,13 @@ from telegram.ext import (
 
 import config
 from core.build_manager import build_manager, FILES_PER_PAGE
+from core.http_client import init_http_clients, close_http_clients
+from core.uploader import uploader_service
+from core.feed_proxy import feed_proxy
+from core.package_db import package_db
 from core.history_manager import (
-    load_history, 
+    history_repo,
+    close_history_db,
     remove_build_entry,
     remove_ib_directory_and_entries
 )
@@ -29,6 +34,7 @@ from handlers.command_handlers import (
     start_command, 
     status_command, 
     getlog_command,
+    send_build_log,
     cancel_command as general_cancel_command 
 )
 from handlers.constants import *
@@ -64,16 +70,15 @@ async def cleanup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _show_history_page(update, context, page=0, mode='cleanup')
 
 async def _show_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int, mode: str):
-    history = load_history()
+    start_index = page * ITEMS_PER_PAGE_HISTORY; end_index = start_index + ITEMS_PER_PAGE_HISTORY
+    history = history_repo.page(start_index, ITEMS_PER_PAGE_HISTORY); total_entries = history_repo.count()
     if mode == 'arsip': text = f"📖 **Arsip Build (Halaman {page + 1})**\n\nPilih build untuk melihat file."
     else: text = f"🗑️ **Kelola Arsip (Halaman {page + 1})**\n\nPilih build untuk dihapus satu per satu."
     keyboard = []
     if not history:
         text = "Arsip build Anda masih kosong."
     else:
-        start_index = page * ITEMS_PER_PAGE_HISTORY; end_index = start_index + ITEMS_PER_PAGE_HISTORY
-        paginated_history = history[start_index:end_index]
-        for entry in paginated_history:
+        for entry in history:
             dt_object = datetime.fromtimestamp(entry['timestamp']); date_str = dt_object.strftime('%d-%b-%Y %H:%M')
             if entry.get('build_mode') == 'amlogic': profile_str = f"Amlogic {entry.get('BOARD', 'N/A')}"
             else: profile_str = entry.get('profile', 'N/A').replace('_', ' ').title()
@@ -81,7 +86,7 @@ async def _show_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
             keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
         nav_row = []
         if page > 0: nav_row.append(InlineKeyboardButton("« Sebelumnya", callback_data=f"{mode}_page_{page - 1}"))
-        if end_index < len(history): nav_row.append(InlineKeyboardButton("Berikutnya »", callback_data=f"{mode}_page_{page + 1}"))
+        if end_index < total_entries: nav_row.append(InlineKeyboardButton("Berikutnya »", callback_data=f"{mode}_page_{page + 1}"))
         if nav_row: keyboard.append(nav_row)
     if mode == 'cleanup': keyboard.append([InlineKeyboardButton("💥 HAPUS SEMUA DATA BUILD 💥", callback_data="cleanup_all_start")])
     keyboard.append([InlineKeyboardButton("Tutup", callback_data="action_close")])
@@ -93,8 +98,7 @@ async def _show_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
 async def history_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer(); data = query.data.split('_'); mode, action = data[0], data[1]
     if action == "page": await _show_history_page(update, context, page=int(data[2]), mode=mode); return
-    build_id = data[2]; history = load_history()
-    selected_build = next((item for item in history if item['id'] == build_id), None)
+    build_id = data[2]; selected_build = history_repo.get(build_id)
     if not selected_build: await query.edit_message_text("❌ Error: Build tidak ditemukan."); return
     if mode == 'arsip': await _show_archive_files_page(update, context, build_id, page=0)
     elif mode == 'cleanup':
@@ -102,25 +106,24 @@ async def history_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.edit_message_text("Pilih aksi untuk build ini:", reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def _show_archive_files_page(update: Update, context: ContextTypes.DEFAULT_TYPE, build_id: str, page: int):
-    query = update.callback_query; history = load_history()
-    selected_build = next((item for item in history if item['id'] == build_id), None)
+    query = update.callback_query; selected_build = history_repo.get(build_id)
     if not selected_build: await query.edit_message_text("❌ Error: Build tidak ditemukan."); return
-    firmware_files_dict = selected_build.get('firmware_files', {}); firmware_filenames = sorted(list(firmware_files_dict.keys()))
+    firmware_filenames = history_repo.sorted_filenames(build_id)
     total_files = len(firmware_filenames); total_pages = -(-total_files // FILES_PER_PAGE) if FILES_PER_PAGE > 0 else 1
     start_index = page * FILES_PER_PAGE; end_index = start_index + FILES_PER_PAGE
     paginated_filenames = firmware_filenames[start_index:end_index]
     keyboard = []
-    for filename in paginated_filenames:
-        try:
-            global_index = list(firmware_files_dict.keys()).index(filename)
-            keyboard.append([InlineKeyboardButton(f"📥 {filename}", callback_data=f"arsip_dl_{build_id}_{global_index}")])
-        except ValueError: continue
+    for global_index, filename in enumerate(paginated_filenames, start=start_index):
+        keyboard.append([InlineKeyboardButton(f"📥 {filename}", callback_data=f"arsip_dl_{build_id}_{global_index}")])
     nav_row = []
     if page > 0: nav_row.append(InlineKeyboardButton("«", callback_data=f"arsip_files_page_{build_id}_{page - 1}"))
     if end_index < total_files: nav_row.append(InlineKeyboardButton("»", callback_data=f"arsip_files_page_{build_id}_{page + 1}"))
     if nav_row: keyboard.append(nav_row)
     if "rootfs" in str(selected_build.get('firmware_files', {}).values()) and selected_build.get('build_mode') == 'official':
         keyboard.append([InlineKeyboardButton("💽 Gunakan untuk Amlogic Remake", callback_data=f"arsip_remake_{build_id}")])
+    if total_files > 1: keyboard.append([InlineKeyboardButton("📦 Kirim Semua", callback_data=f"upload_all_{build_id}")])
+    if selected_build.get('log_file'):
+        keyboard.append([InlineKeyboardButton("📜 Log Build", callback_data=f"arsip_log_{build_id}")])
     keyboard.append([InlineKeyboardButton("« Kembali ke Arsip", callback_data="arsip_page_0")])
     text = f"Pilih file dari arsip (Halaman {page + 1}/{total_pages}):"
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
@@ -137,20 +140,27 @@ async def archive_download_callback(update: Update, context: ContextTypes.DEFAUL
     try:
         _, _, build_id, file_index_str = query.data.split('_', 2); file_index = int(file_index_str)
     except ValueError: await send_temporary_message(context, update.effective_chat.id, "❌ Error: Data tombol tidak valid."); return
-    history = load_history(); selected_build = next((item for item in history if item['id'] == build_id), None)
+    selected_build = history_repo.get(build_id)
     if not selected_build: await query.edit_message_text("❌ Error: Build tidak ditemukan."); return
-    firmware_dict = selected_build.get('firmware_files', {})
-    if not firmware_dict or file_index >= len(list(firmware_dict.keys())): await query.edit_message_text("❌ Error: Indeks file tidak valid."); return
-    filename = sorted(list(firmware_dict.keys()))[file_index]; file_path = firmware_dict[filename]
+    firmware_dict = selected_build.get('firmware_files', {}); firmware_filenames = history_repo.sorted_filenames(build_id)
+    if not firmware_dict or file_index >= len(firmware_filenames): await query.edit_message_text("❌ Error: Indeks file tidak valid."); return
+    filename = firmware_filenames[file_index]; file_path = firmware_dict[filename]
     if not os.path.exists(file_path): await query.edit_message_text(f"❌ Error: File fisik `{filename}` tidak ditemukan."); return
     edited_message = await query.edit_message_text(f"Mempersiapkan pengunduhan `{filename}`...", parse_mode='Markdown')
-    await build_manager.perform_upload(context, update.effective_chat.id, file_path, edited_message)
+    await build_manager.perform_upload(context, update.effective_chat.id, file_path, edited_message, build_id=build_id)
+
+async def archive_log_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query; await query.answer()
+    build_id = query.data.replace('arsip_log_', '', 1)
+    selected_build = history_repo.get(build_id)
+    if not selected_build: await query.edit_message_text("❌ Error: Build tidak ditemukan."); return
+    await send_build_log(context, update.effective_chat.id, selected_build.get('log_file'), caption=f"📜 Log build {selected_build.get('job_id', build_id)}")
 
 async def cleanup_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer(); _, action, build_id = query.data.split('_')
     if action == 'del-res': text_to_send = "✅ Hasil compile dan catatan dihapus." if remove_build_entry(build_id) else "❌ Gagal menghapus entri."
     elif action == 'del-all':
-        history = load_history(); selected_build = next((item for item in history if item['id'] == build_id), None)
+        selected_build = history_repo.get(build_id)
         if selected_build and selected_build.get('ib_dir'):
             text_to_send = "✅ Direktori IB dan arsip terkait dihapus." if remove_ib_directory_and_entries(selected_build['ib_dir']) else "❌ Gagal hapus direktori."
         else: text_to_send = "❌ Gagal mendapatkan path direktori."
@@ -160,40 +170,42 @@ async def handle_upload_selection(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query; await query.answer()
     try:
         data_part = query.data.replace('upload_choice_', ''); build_id, file_index_str = data_part.rsplit('_', 1)
-        file_index = int(file_index_str); history = load_history()
-        selected_build = next((item for item in history if item['id'] == build_id), None)
+        file_index = int(file_index_str); selected_build = history_repo.get(build_id)
         if not selected_build: await query.message.edit_message_text("❌ Error: Catatan build tidak ditemukan."); return
         firmware_dict = selected_build.get('firmware_files', {})
-        firmware_paths = sorted(list(firmware_dict.values()))
+        firmware_paths = history_repo.sorted_file_paths(build_id)
         if not firmware_dict or file_index >= len(firmware_paths): await query.message.edit_message_text("❌ Error: Indeks file tidak valid."); return
         selected_file_path = firmware_paths[file_index]
         if not os.path.exists(selected_file_path): await query.message.edit_message_text("❌ Error: File fisik tidak ditemukan."); return
-        await build_manager.perform_upload(context, update.effective_chat.id, selected_file_path, query.message)
+        await build_manager.perform_upload(context, update.effective_chat.id, selected_file_path, query.message, build_id=build_id)
     except Exception as e:
         logger.error(f"Error tak terduga di handle_upload_selection: {e}", exc_info=True)
         if query.message: await query.message.edit_text("❌ Terjadi kesalahan tak terduga.")
 
+async def handle_upload_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query; await query.answer()
+    build_id = query.data.replace('upload_all_', '', 1)
+    status_message = await query.message.reply_text("📦 Menyiapkan upload semua file...")
+    await build_manager.perform_upload_all(context, update.effective_chat.id, build_id, status_message)
+
 async def handle_build_file_pagination(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer()
     try: _, build_id, page_str = query.data.split('_', 2); page = int(page_str)
     except ValueError: await query.edit_message_text("❌ Error: Data paginasi tidak valid."); return
-    history = load_history()
-    selected_build = next((item for item in history if item['id'] == build_id), None)
+    selected_build = history_repo.get(build_id)
     if not selected_build: await query.edit_message_text("❌ Error: Catatan build tidak ditemukan."); return
-    firmware_files = sorted(list(selected_build.get('firmware_files', {}).values()))
+    firmware_files = history_repo.sorted_file_paths(build_id)
     total_files = len(firmware_files); total_pages = -(-total_files // FILES_PER_PAGE) if FILES_PER_PAGE > 0 else 1
     start_index = page * FILES_PER_PAGE; end_index = start_index + FILES_PER_PAGE
     paginated_files = firmware_files[start_index:end_index]
     keyboard = []
-    for file_path in paginated_files:
-        try:
-            global_index = firmware_files.index(file_path)
-            keyboard.append([InlineKeyboardButton(os.path.basename(file_path), callback_data=f"upload_choice_{build_id}_{global_index}")])
-        except ValueError: continue
+    for global_index, file_path in enumerate(paginated_files, start=start_index):
+        keyboard.append([InlineKeyboardButton(os.path.basename(file_path), callback_data=f"upload_choice_{build_id}_{global_index}")])
     nav_row = []
     if page > 0: nav_row.append(InlineKeyboardButton("«", callback_data=f"build_page_{build_id}_{page - 1}"))
     if end_index < total_files: nav_row.append(InlineKeyboardButton("»", callback_data=f"build_page_{build_id}_{page + 1}"))
     if nav_row: keyboard.append(nav_row)
+    if total_files > 1: keyboard.append([InlineKeyboardButton("📦 Upload Semua", callback_data=f"upload_all_{build_id}")])
     if selected_build.get('build_mode') == 'official' and any("rootfs" in f for f in firmware_files):
         keyboard.append([InlineKeyboardButton("➡️ Lanjutkan ke Amlogic Remake", callback_data=f"chain_relic_{build_id}")])
     await query.edit_message_text(f"✅ **Build Selesai!** (Halaman {page + 1}/{total_pages})\n\nDisimpan ke `/arsip`.\n👇 Pilih file untuk diunggah:", reply_markup=InlineKeyboardMarkup(keyboard))
@@ -272,17 +284,28 @@ async def main() -> None:
     
     application.add_handler(CommandHandler("start", start_command)); application.add_handler(CommandHandler("status", status_command)); application.add_handler(CommandHandler("getlog", getlog_command)); application.add_handler(CommandHandler("cancel", general_cancel_command)); application.add_handler(CommandHandler("arsip", archive_command)); application.add_handler(CommandHandler("cleanup", cleanup_command))
     application.add_handler(CallbackQueryHandler(handle_upload_selection, pattern="^upload_choice_"))
+    application.add_handler(CallbackQueryHandler(handle_upload_all, pattern="^upload_all_"))
     application.add_handler(CallbackQueryHandler(handle_build_file_pagination, pattern="^build_page_"))
     application.add_handler(CallbackQueryHandler(handle_archive_file_pagination, pattern="^arsip_files_page_"))
     application.add_handler(CallbackQueryHandler(history_menu_callback, pattern="^(arsip|cleanup)_select_"))
     application.add_handler(CallbackQueryHandler(history_menu_callback, pattern="^(arsip|cleanup)_page_"))
     application.add_handler(CallbackQueryHandler(archive_download_callback, pattern="^arsip_dl_"))
+    application.add_handler(CallbackQueryHandler(archive_log_callback, pattern="^arsip_log_"))
     application.add_handler(CallbackQueryHandler(cleanup_action_callback, pattern="^cleanup_del-"))
     application.add_handler(CallbackQueryHandler(close_message_callback, pattern="^action_close$"))
     
-    logger.info("Bot dengan arsitektur final siap dijalankan..."); await application.initialize(); await application.start(); await application.updater.start_polling(); logger.info("Bot telah dimulai dan sedang polling.")
+    logger.info("Bot dengan arsitektur final siap dijalankan..."); await application.initialize(); await init_http_clients()
+    if config.FEED_PROXY_ENABLED: await feed_proxy.start()
+    await application.start(); await application.updater.start_polling(); application.create_task(uploader_service.warm_up()); logger.info("Bot telah dimulai dan sedang polling.")
     
-    while True: await asyncio.sleep(3600)
+    try:
+        while True: await asyncio.sleep(3600)
+    finally:
+        await close_http_clients()
+        await uploader_service.stop()
+        await feed_proxy.stop()
+        close_history_db()
+        package_db.close()
 
 if __name__ == "__main__":
     try: asyncio.run(main())
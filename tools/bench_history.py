@@ -0,0 +1,78 @@
+# tools/bench_history.py
+#
+# Benchmark penyimpanan histori build: SQLite (core.history_manager) vs scan list JSON lama.
+#
+#   python3 tools/bench_history.py            # 100.000 entri
+#   python3 tools/bench_history.py 500000
+#
+# Database dibuat di direktori sementara, histori asli tidak disentuh.
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import history_manager
+
+ROUNDS = 1000
+TARGETS = ["ramips/mt7621", "x86/64", "mediatek/filogic", "ath79/generic", "armsr/armv8"]
+
+
+def make_entries(count):
+    now = int(time.time()) - count
+    for i in range(count):
+        target, subtarget = random.choice(TARGETS).split('/')
+        yield {
+            "id": str(uuid.uuid4()), "job_id": uuid.uuid4().hex[:8], "timestamp": now + i, "build_mode": "official",
+            "version": "23.05.3", "target": target, "subtarget": subtarget, "profile": f"device_{i % 500}",
+            "ib_dir": f"openwrt-imagebuilder-23.05.3-{target}-{subtarget}.Linux-x86_64",
+            "firmware_files": {f"fw-{i}.bin": f"/tmp/fw-{i}.bin"},
+        }
+
+
+def per_call(func, rounds=ROUNDS):
+    return timeit.timeit(func, number=rounds) / rounds * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = list(make_entries(count))
+        json_path = os.path.join(tmp, "history.json")
+        with open(json_path, 'w') as f: json.dump(entries[::-1], f)
+        history_manager.HISTORY_DB_PATH = os.path.join(tmp, "history.db")
+        history_manager.HISTORY_JSON_PATH = json_path
+
+        started = time.perf_counter(); total = history_manager.count_history()
+        print(f"Migrasi {total} entri dari JSON: {time.perf_counter() - started:.2f} dtk")
+
+        sample = random.sample(entries, 50)
+        ids = iter(e["id"] for e in sample * (ROUNDS // len(sample) + 1))
+        print(f"find_build_entry (id):       {per_call(lambda: history_manager.find_build_entry(next(ids))):.3f} ms")
+        job_ids = iter(e["job_id"] for e in sample * (ROUNDS // len(sample) + 1))
+        print(f"find_build_entry (job_id):   {per_call(lambda: history_manager.find_build_entry(next(job_ids))):.3f} ms")
+        print(f"list_history halaman 1:      {per_call(lambda: history_manager.list_history(0, 5)):.3f} ms")
+        print(f"list_history halaman akhir:  {per_call(lambda: history_manager.list_history(count - 5, 5), 100):.3f} ms")
+        print(f"count_history:               {per_call(history_manager.count_history, 100):.3f} ms")
+        print(f"find_entries(profile=...):   {per_call(lambda: history_manager.find_entries(profile='device_42'), 100):.3f} ms")
+
+        with open(json_path + ".bak", 'r') as f: legacy = json.load(f)
+        target_id = sample[0]["id"]
+        load = per_call(lambda: json.load(open(json_path + ".bak")), 3)
+        scan = per_call(lambda: next(e for e in legacy if e["id"] == target_id), 20)
+        print(f"JSON lama: load_history {load:.1f} ms + scan linear {scan:.3f} ms per lookup")
+
+        started = time.perf_counter()
+        for entry in make_entries(1000): history_manager._insert(history_manager._connect(), entry)
+        print(f"Insert (autocommit, WAL):    {(time.perf_counter() - started):.3f} ms per entri")
+        history_manager.close_history_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# tools/bench_index_parser.py
+#
+# Micro-benchmark parser daftar direktori: core.index_parser vs BeautifulSoup+lxml.
+#
+#   python3 tools/bench_index_parser.py                      # ambil listing asli dari downloads.openwrt.org
+#   python3 tools/bench_index_parser.py listing1.html ...    # pakai listing yang sudah disimpan
+#
+# BeautifulSoup hanya dibutuhkan untuk pembanding (pip install beautifulsoup4 lxml).
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.index_parser import parse_index
+
+DEFAULT_URLS = [
+    "https://downloads.openwrt.org/releases/",
+    "https://downloads.openwrt.org/releases/23.05.3/targets/",
+    "https://downloads.openwrt.org/releases/23.05.3/targets/ramips/mt7621/",
+    "https://downloads.openwrt.org/releases/23.05.3/targets/x86/64/",
+]
+ROUNDS = 50
+
+
+def load_pages(args):
+    if args:
+        for path in args:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f: yield os.path.basename(path), f.read()
+        return
+    import httpx
+    with httpx.Client(timeout=30.0, follow_redirects=True) as client:
+        for url in DEFAULT_URLS:
+            yield url, client.get(url).text
+
+
+def bs4_hrefs(page):
+    from bs4 import BeautifulSoup
+    return [a.get('href') for a in BeautifulSoup(page, 'lxml').find_all('a') if a.get('href')]
+
+
+def main():
+    try:
+        import bs4  # noqa: F401
+        have_bs4 = True
+    except ImportError:
+        have_bs4 = False
+        print("BeautifulSoup tidak terpasang, hanya mengukur parser baru.")
+    for name, page in load_pages(sys.argv[1:]):
+        ours = timeit.timeit(lambda: parse_index(page), number=ROUNDS) / ROUNDS
+        line = f"{name} ({len(page) / 1024:.0f} KB, {len(parse_index(page))} link): index_parser {ours * 1000:.2f} ms"
+        if have_bs4:
+            theirs = timeit.timeit(lambda: bs4_hrefs(page), number=ROUNDS) / ROUNDS
+            same = [e.href for e in parse_index(page)] == bs4_hrefs(page)
+            line += f", bs4+lxml {theirs * 1000:.2f} ms, {theirs / ours:.1f}x lebih cepat, href sama: {same}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
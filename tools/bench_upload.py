@@ -0,0 +1,68 @@
+# tools/bench_upload.py
+#
+# Benchmark engine upload paralel (core.uploader.upload_parts) terhadap sender tiruan lokal.
+# Tiap sender tiruan meniru satu koneksi MTProto: latensi per request + bandwidth per koneksi,
+# sehingga terlihat berapa MB/s yang didapat dengan 1 vs banyak koneksi tanpa menyentuh Telegram.
+#
+#   python3 tools/bench_upload.py                          # file 64 MB, 20 ms RTT, 4 MB/s per koneksi
+#   python3 tools/bench_upload.py --size 256 --rtt 80 --bandwidth 2 --connections 1 2 4 8
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.uploader import upload_parts, PART_SIZE
+
+
+class FakeSender:
+    """Pengganti MTProtoSender: satu request per waktu, biaya = RTT + ukuran / bandwidth."""
+    def __init__(self, rtt: float, bandwidth: float):
+        self.rtt = rtt; self.bandwidth = bandwidth; self.parts = set()
+        self._lock = asyncio.Lock()
+
+    async def send(self, request):
+        async with self._lock:
+            await asyncio.sleep(self.rtt + len(request.bytes) / self.bandwidth)
+        self.parts.add(request.file_part)
+        return True
+
+
+async def run(path: str, size: int, connections: int, rtt: float, bandwidth: float, read_ahead: int):
+    senders = [FakeSender(rtt, bandwidth) for _ in range(connections)]
+    tracemalloc.start(); started = time.perf_counter()
+    result = await upload_parts(path, senders, read_ahead=read_ahead)
+    elapsed = time.perf_counter() - started; _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    received = set().union(*(s.parts for s in senders))
+    assert received == set(range(result.parts)), "ada part yang hilang"
+    print(f"{connections:>2} koneksi: {elapsed:6.2f} dtk, {size / elapsed / 1024 / 1024:6.1f} MB/s, puncak memori {peak / 1024 / 1024:5.1f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=64, help="ukuran file uji (MB)")
+    parser.add_argument("--rtt", type=float, default=20, help="latensi per request (ms)")
+    parser.add_argument("--bandwidth", type=float, default=4, help="bandwidth per koneksi (MB/s)")
+    parser.add_argument("--read-ahead", type=int, default=8, help="jumlah part yang dibaca di depan")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    size = args.size * 1024 * 1024
+    with tempfile.NamedTemporaryFile(suffix=".img") as f:
+        for _ in range(args.size): f.write(os.urandom(1024 * 1024))
+        f.flush()
+        print(f"File {args.size} MB, part {PART_SIZE // 1024} KB, RTT {args.rtt:.0f} ms, {args.bandwidth} MB/s per koneksi")
+        baseline = None
+        for connections in args.connections:
+            elapsed = asyncio.run(run(f.name, size, connections, args.rtt / 1000, args.bandwidth * 1024 * 1024, args.read_ahead))
+            baseline = baseline or elapsed
+            if elapsed != baseline: print(f"    {baseline / elapsed:.1f}x dibanding {args.connections[0]} koneksi")
+
+
+if __name__ == "__main__":
+    main()